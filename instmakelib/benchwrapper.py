@@ -0,0 +1,122 @@
+# Copyright (c) 2012 by Cisco Systems, Inc.
+"""
+Measure how much time instmake adds to each job of a build.
+
+A small job is run many times, first with /bin/sh, as make would run it
+without instmake, then with instmake as the shell, as make would run it
+under instmake, with a log, the jobserver and the collector set up as in
+a build. The difference is the latency that instmake adds to a job. The
+overhead that instmake recorded for the jobs (see OVERHEAD_FIELDS in
+instmake_log) shows where that time goes.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from instmakelib import instmake_build
+from instmakelib import instmake_log
+
+DEFAULT_NUM_JOBS = 200
+
+# The job that is run; it does as little as possible.
+JOB_CMDLINE = "true"
+
+def run_jobs(cmdv, num_jobs):
+    """Run a command num_jobs times, one after the other. Returns
+    the wall time of each run."""
+    times = []
+    for i in range(num_jobs):
+        start = time.time()
+        rc = os.spawnv(os.P_WAIT, cmdv[0], cmdv)
+        times.append(time.time() - start)
+        if rc != 0:
+            sys.exit("%s failed with exit status %s" % (" ".join(cmdv), rc))
+    return times
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) / 2]
+
+def ms(seconds):
+    return "%9.3f ms" % (seconds * 1000.0,)
+
+def read_overhead(log_file_name):
+    """Returns the overhead dictionaries of the records in a log."""
+    overheads = []
+    log = instmake_log.LogFile(log_file_name)
+    while 1:
+        try:
+            rec = log.read_record()
+        except EOFError:
+            log.close()
+            break
+        if rec.overhead != None:
+            overheads.append(rec.overhead)
+    return overheads
+
+def bench(script, log_file_env_var, num_jobs, use_collector):
+    """Run the benchmark and print the results."""
+    tmp_dir = tempfile.mkdtemp(prefix="instmake-bench.")
+    try:
+        log_file_name = os.path.join(tmp_dir, "bench.imlog")
+        fd = os.open(log_file_name, os.O_CREAT|os.O_WRONLY, 0644)
+        instmake_log.WriteLatestHeader(fd, log_file_name, None, "", [])
+        os.close(fd)
+
+        # The jobs without instmake
+        baseline = run_jobs(["/bin/sh", "-c", JOB_CMDLINE], num_jobs)
+
+        # The jobs with instmake, as in a build
+        os.environ[log_file_env_var] = log_file_name
+        instmake_build.initialize_environment([], 0, [], 1, "", None)
+        jobserver = instmake_build.InstmakeJobServer()
+        if use_collector:
+            collector = instmake_build.start_collector(log_file_name)
+        else:
+            collector = None
+        app_inst_dir = instmake_build.make_app_inst_dir()
+
+        try:
+            wrapped = run_jobs([script, "-c", JOB_CMDLINE], num_jobs)
+        finally:
+            if app_inst_dir:
+                instmake_build.remove_app_inst_dir(app_inst_dir)
+            if collector:
+                collector.Finish()
+            jobserver.Close()
+            del os.environ[log_file_env_var]
+
+        overheads = read_overhead(log_file_name)
+    finally:
+        shutil.rmtree(tmp_dir, True)
+
+    print "%d jobs of '%s', one at a time:" % (num_jobs, JOB_CMDLINE)
+    print
+    print "%-24s %12s %12s %12s" % ("PER JOB", "MEAN", "MEDIAN", "MIN")
+    for (name, times) in (("/bin/sh", baseline), ("instmake", wrapped)):
+        print "%-24s %12s %12s %12s" % (name,
+                ms(sum(times) / len(times)), ms(median(times)),
+                ms(min(times)))
+    print "%-24s %12s %12s %12s" % ("Added by instmake",
+            ms((sum(wrapped) - sum(baseline)) / num_jobs),
+            ms(median(wrapped) - median(baseline)),
+            ms(min(wrapped) - min(baseline)))
+
+    if len(overheads) != num_jobs:
+        print
+        print "Expected %d records in the log, found %d." % (num_jobs,
+                len(overheads))
+        return
+
+    print
+    print "Overhead recorded by instmake, per job:"
+    for name in instmake_log.OVERHEAD_FIELDS:
+        values = [overhead[name] for overhead in overheads
+                if overhead[name] != None]
+        if values:
+            print "%-24s %12s %12s %12s" % (name,
+                ms(sum(values) / len(values)), ms(median(values)),
+                ms(min(values)))
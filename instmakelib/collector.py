@@ -0,0 +1,395 @@
+# Copyright (c) 2010-2012 by Cisco Systems, Inc.
+"""
+Collect the records of a build in one process, which writes them to
+the log.
+
+Without the collector, each instmake appends its own record to the log,
+holding the instmake jobserver's single token so that the records don't
+interleave. With many jobs, or with a log on NFS, that token becomes a
+lock that the jobs wait for. Instead, the top-level instmake forks a
+collector, which listens on a Unix-domain socket. Each instmake sends its
+record to the socket and goes on; the collector writes the records to
+the log in batches.
+
+Each record is sent as a frame: its length (see FRAME_FORMAT), then the
+pickled record. A frame of length 0 tells the collector to finish.
+
+If the collector can't be reached, connect() returns None (or
+send_record() returns False), and the caller writes the record to the
+log itself.
+
+Once send_record() returns True, the record is the collector's to
+write; the job does not wait for it to be written. If the collector
+dies before it writes the records that it has (up to FLUSH_SIZE bytes,
+or FLUSH_INTERVAL seconds, of records), they are lost. So that this is
+not silent, the collector keeps the number of records that it has
+received and written in a status file, and Collector.Finish() reports
+the records that were lost, and how the collector exited.
+"""
+
+import errno
+import os
+import signal
+import struct
+import sys
+import time
+
+# Every instmake connects to the collector, so it uses the low-level
+# module; "socket" also imports the SSL library, which is slow. The
+# collector itself imports socket, select and tempfile when it starts.
+import _socket
+
+# The path of the collector's socket
+SOCKET_ENV_VAR = "INSTMAKE_COLLECTOR"
+
+SOCKET_NAME = "collector.sock"
+
+# The collector's status file, in the socket's directory, holds the
+# number of records received and the number written to the log.
+STATUS_NAME = "collector.status"
+STATUS_FORMAT = "<II"
+STATUS_SIZE = struct.calcsize(STATUS_FORMAT)
+
+# The longest path that a Unix-domain socket address can hold, safely.
+MAX_SOCKET_PATH = 100
+
+FRAME_FORMAT = "<I"
+FRAME_SIZE = struct.calcsize(FRAME_FORMAT)
+
+# The collector writes the records when it has this many bytes of
+# records, or when it has had records for this many seconds.
+FLUSH_SIZE = 1024 * 1024
+FLUSH_INTERVAL = 1.0
+
+RECV_SIZE = 64 * 1024
+
+
+def connect():
+    """Connect to the collector. Returns the socket, or None if
+    there is no collector to connect to."""
+    path = os.environ.get(SOCKET_ENV_VAR)
+    if not path:
+        return None
+
+    try:
+        sock = _socket.socket(_socket.AF_UNIX, _socket.SOCK_STREAM)
+    except _socket.error:
+        return None
+
+    try:
+        sock.connect(path)
+    except _socket.error:
+        sock.close()
+        return None
+
+    return sock
+
+
+def send_record(sock, data_text):
+    """Send a pickled record to the collector on a socket from
+    connect(), and close the socket. Returns True if it was sent."""
+    try:
+        try:
+            sock.sendall(struct.pack(FRAME_FORMAT, len(data_text)) + \
+                    data_text)
+        finally:
+            sock.close()
+    except _socket.error:
+        # The collector drops a partial record, so the caller can
+        # write the record itself.
+        return False
+
+    return True
+
+
+def split_frames(text):
+    """Returns the records in the frames of the text, and whether there
+    was a frame telling the collector to finish. A partial frame at
+    the end is dropped."""
+    records = []
+    finish = False
+    i = 0
+    while len(text) - i >= FRAME_SIZE:
+        (size,) = struct.unpack(FRAME_FORMAT, text[i:i + FRAME_SIZE])
+        i += FRAME_SIZE
+        if size == 0:
+            finish = True
+            continue
+        if len(text) - i < size:
+            break
+        records.append(text[i:i + size])
+        i += size
+    return records, finish
+
+
+class Collector:
+    """The top-level instmake's handle on the collector process.
+    'write_lock' is the jobserver client whose token is held while
+    writing to the log, as instmakes that can't reach the collector
+    write to the log themselves."""
+
+    def __init__(self, log_file_name, write_lock):
+        self.log_file_name = log_file_name
+        self.write_lock = write_lock
+        self.pid = None
+        self.tmp_dir = None
+        self.path = None
+        self.status_path = None
+
+    def Start(self):
+        """Start the collector process. Returns False if it
+        can't be started."""
+        import socket
+        import tempfile
+        try:
+            self.tmp_dir = tempfile.mkdtemp(prefix="instmake.")
+        except (IOError, OSError):
+            return False
+
+        self.path = os.path.join(self.tmp_dir, SOCKET_NAME)
+        self.status_path = os.path.join(self.tmp_dir, STATUS_NAME)
+        if len(self.path) > MAX_SOCKET_PATH:
+            self.RemoveSocket()
+            return False
+
+        try:
+            listen_sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            listen_sock.bind(self.path)
+            listen_sock.listen(socket.SOMAXCONN)
+        except socket.error:
+            self.RemoveSocket()
+            return False
+
+        try:
+            self.pid = os.fork()
+        except OSError:
+            listen_sock.close()
+            self.RemoveSocket()
+            return False
+
+        if self.pid == 0:
+            # The collector must not return into the caller.
+            rc = 0
+            try:
+                try:
+                    self.Serve(listen_sock)
+                except:
+                    print >> sys.stderr, "instmake: collector failed:", \
+                            sys.exc_info()[1]
+                    rc = 1
+            finally:
+                os._exit(rc)
+
+        listen_sock.close()
+        os.environ[SOCKET_ENV_VAR] = self.path
+        return True
+
+    def Finish(self):
+        """Tell the collector to finish, and wait for it to write
+        the last records. Returns the number of records that the
+        collector received but did not write to the log, or None
+        if it is not known."""
+        import socket
+        del os.environ[SOCKET_ENV_VAR]
+        try:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.connect(self.path)
+            sock.sendall(struct.pack(FRAME_FORMAT, 0))
+            sock.close()
+        except socket.error, err:
+            print >> sys.stderr, "instmake: can't reach collector:", err
+            try:
+                os.kill(self.pid, signal.SIGTERM)
+            except OSError:
+                pass
+
+        status = None
+        while 1:
+            try:
+                (pid, status) = os.waitpid(self.pid, 0)
+                break
+            except OSError, err:
+                if err.errno != errno.EINTR:
+                    break
+            except KeyboardInterrupt:
+                # Let the collector finish writing the log.
+                pass
+
+        num_lost = self.CheckLost(status)
+        self.RemoveSocket()
+        return num_lost
+
+    def ReadStatus(self):
+        """Returns (records received, records written) from the
+        collector's status file, or None if it can't be read."""
+        try:
+            fh = open(self.status_path, "rb")
+            try:
+                text = fh.read(STATUS_SIZE)
+            finally:
+                fh.close()
+        except IOError:
+            return None
+        if len(text) != STATUS_SIZE:
+            return None
+        return struct.unpack(STATUS_FORMAT, text)
+
+    def CheckLost(self, status):
+        """Report how the collector exited, if it failed, and the
+        records that it did not write. Returns the number of records
+        that were not written, or None if it is not known."""
+        if status != None and status != 0:
+            if os.WIFSIGNALED(status):
+                how = "was killed by signal %d" % (os.WTERMSIG(status),)
+            else:
+                how = "exited with %d" % (os.WEXITSTATUS(status),)
+            print >> sys.stderr, "instmake: the collector %s." % (how,)
+
+        counts = self.ReadStatus()
+        if counts == None:
+            print >> sys.stderr, "instmake: can't read the collector's " \
+                    "status; records may be missing from %s." % \
+                    (self.log_file_name,)
+            return None
+
+        (num_received, num_written) = counts
+        num_lost = num_received - num_written
+        if num_lost > 0:
+            print >> sys.stderr, "instmake: %d of the %d records sent to " \
+                    "the collector were not written to %s." % (num_lost,
+                    num_received, self.log_file_name)
+        return num_lost
+
+    def RemoveSocket(self):
+        for path in (self.path, self.status_path):
+            if path and os.path.exists(path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        if self.tmp_dir:
+            try:
+                os.rmdir(self.tmp_dir)
+            except OSError:
+                pass
+
+    def Serve(self, listen_sock):
+        """The collector process."""
+        import select
+        import socket
+        # An interrupted build still writes the records of the jobs
+        # that were interrupted; keep collecting them.
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        parent_pid = os.getppid()
+
+        self.fd = os.open(self.log_file_name, os.O_WRONLY|os.O_APPEND)
+
+        self.status_fd = os.open(self.status_path,
+                os.O_WRONLY|os.O_CREAT|os.O_TRUNC, 0600)
+        self.num_received = 0
+        self.num_written = 0
+        self.WriteStatus()
+
+        # Key = socket, Value = the data received so far
+        conns = {}
+
+        self.pending = []
+        self.pending_size = 0
+        self.pending_since = None
+        finishing = False
+
+        while 1:
+            if finishing and not conns:
+                # Anybody still waiting to connect?
+                (readable, w, x) = select.select([listen_sock], [], [], 0)
+                if not readable:
+                    break
+
+            (readable, w, x) = select.select([listen_sock] + conns.keys(),
+                    [], [], FLUSH_INTERVAL)
+
+            for sock in readable:
+                if sock is listen_sock:
+                    try:
+                        (conn, addr) = listen_sock.accept()
+                    except socket.error:
+                        continue
+                    conns[conn] = []
+                    continue
+
+                try:
+                    data = sock.recv(RECV_SIZE)
+                except socket.error:
+                    # The sender will write the record itself.
+                    del conns[sock]
+                    sock.close()
+                    continue
+
+                if data:
+                    conns[sock].append(data)
+                    continue
+
+                (records, finish) = split_frames("".join(conns[sock]))
+                del conns[sock]
+                sock.close()
+                if finish:
+                    finishing = True
+                for record in records:
+                    self.AddRecord(record)
+                if records:
+                    self.WriteStatus()
+
+            # If the top-level instmake is gone, nobody will
+            # tell us to finish.
+            if os.getppid() != parent_pid:
+                finishing = True
+
+            if self.pending and (finishing or \
+                    self.pending_size >= FLUSH_SIZE or \
+                    time.time() - self.pending_since >= FLUSH_INTERVAL):
+                self.Flush()
+
+        self.Flush()
+        os.close(self.fd)
+        os.close(self.status_fd)
+        listen_sock.close()
+
+    def AddRecord(self, record):
+        if not self.pending:
+            self.pending_since = time.time()
+        self.pending.append(record)
+        self.pending_size += len(record)
+        self.num_received += 1
+
+    def WriteStatus(self):
+        """Write the numbers of records received and written to the
+        status file, for Finish()."""
+        os.lseek(self.status_fd, 0, 0)
+        os.write(self.status_fd, struct.pack(STATUS_FORMAT,
+            self.num_received, self.num_written))
+
+    def Flush(self):
+        """Write the pending records to the log."""
+        if not self.pending:
+            return
+
+        text = "".join(self.pending)
+        num_records = len(self.pending)
+        self.pending = []
+        self.pending_size = 0
+
+        self.write_lock.TakeToken()
+        try:
+            while text:
+                try:
+                    num_written = os.write(self.fd, text)
+                except OSError, err:
+                    print >> sys.stderr, "instmake: collector can't " \
+                            "write to %s: %s" % (self.log_file_name, err)
+                    return
+                text = text[num_written:]
+        finally:
+            self.write_lock.PutToken()
+
+        self.num_written += num_records
+        self.WriteStatus()
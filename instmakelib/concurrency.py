@@ -3,6 +3,7 @@
 Keep track of concurrent processes.
 """
 
+import bisect
 import sys
 from instmakelib import instmake_log as LOG
 from instmakelib import pidtree
@@ -251,3 +252,162 @@ class Concurrency:
 
     def Rec(self, pid):
         return self.recs_by_pid[pid]
+
+
+class IncrementalConcurrency:
+    """Keeps track of concurrent processes as the records are added,
+    one at a time, as when reading a log that a build is still writing.
+    Instead of a LinearMap of the records, it keeps the change in the
+    number of jobs running at each start and end time, which costs
+    the same for each record, however many records there are. The
+    number of jobs running in each slice of time, and the time spent
+    at each number of jobs, are computed from the changes when they
+    are asked for, and kept until more records are added. It doesn't
+    keep the IDs or the tools of the jobs.
+
+    A job's record is written when the job finishes, so the records
+    of a make's children come before the make's record. A job is a
+    'make' if a record that came before it has its PID as the PPID."""
+
+    def __init__(self, proc_mode):
+        assert proc_mode in (ALL, NON_MAKE, ONLY_MAKE), proc_mode
+        self.proc_mode = proc_mode
+        self.ppids = {}
+        self.top_rec = None
+        self.num_jobs = 0
+
+        # The number of records with no PPID after the first one,
+        # which the report prints a warning for (see PrintWarnings).
+        self.num_extra_tops = 0
+
+        # The change in the number of jobs running at each time.
+        # Key = time, Value = jobs started - jobs ended
+        self.deltas = {}
+
+        # Computed from the deltas by Sweep(): the boundaries of the
+        # time slices, in order, where counts[i] is the number of jobs
+        # running from times[i] to times[i + 1], and the time spent
+        # with N jobs running, for each N. None until they are needed.
+        self.times = None
+        self.counts = None
+        self.durations = None
+
+    def AddRec(self, rec):
+        is_make = self.ppids.has_key(rec.pid)
+
+        if rec.ppid == None:
+            if self.top_rec:
+                self.num_extra_tops += 1
+            self.top_rec = rec
+        else:
+            self.ppids[rec.ppid] = None
+
+        start = rec.times_start[rec.REAL_TIME]
+        length = rec.diff_times[rec.REAL_TIME]
+
+        if (self.proc_mode == NON_MAKE and is_make) or \
+                (self.proc_mode == ONLY_MAKE and not is_make):
+            # Not counted, but the build was running.
+            self.Change(start, 0)
+            self.Change(start + length, 0)
+        else:
+            self.Add(start, length)
+
+    def PrintWarnings(self):
+        """Print the warnings about the records that were added; the
+        report prints them after its own header."""
+        for i in range(self.num_extra_tops):
+            print "Found another record with no PPID."
+
+    def Change(self, t, num_jobs):
+        """Change the number of jobs running from time t on."""
+        self.deltas[t] = self.deltas.get(t, 0) + num_jobs
+        self.times = None
+
+    def Add(self, start, length):
+        """Add a job that ran from 'start' for 'length' seconds."""
+        self.num_jobs += 1
+        self.Change(start, 1)
+        self.Change(start + length, -1)
+
+    def Sweep(self):
+        """Compute the time slices and the durations from the deltas,
+        if records were added since they were last computed."""
+        if self.times != None:
+            return
+
+        times = self.deltas.keys()
+        times.sort()
+        counts = []
+        durations = [0.0]
+        num = 0
+        for k in range(len(times) - 1):
+            num += self.deltas[times[k]]
+            counts.append(num)
+            if len(durations) <= num:
+                durations.extend([0.0] * (num + 1 - len(durations)))
+            durations[num] += times[k + 1] - times[k]
+
+        self.times = times
+        self.counts = counts
+        self.durations = durations
+
+    def NumJobs(self):
+        """The number of jobs that were counted."""
+        return self.num_jobs
+
+    def TopRecord(self):
+        return self.top_rec
+
+    def Span(self):
+        """Returns the first and last times of the records, or None
+        if there are no records."""
+        self.Sweep()
+        if self.times:
+            return self.times[0], self.times[-1]
+        else:
+            return None
+
+    def TotalTime(self):
+        self.Sweep()
+        if self.times:
+            return self.times[-1] - self.times[0]
+        else:
+            return 0.0
+
+    def Results(self):
+        """Returns (jobslot, % of time) for each number of jobs
+        running, as Concurrency.Results() does."""
+        # As in Concurrency, only non-make jobs can have 0 running.
+        if self.proc_mode == NON_MAKE:
+            jobslot_start = 0
+        else:
+            jobslot_start = 1
+
+        tot_time = self.TotalTime()
+        results = []
+        for jobslot in range(jobslot_start, len(self.durations)):
+            if tot_time > 0:
+                pct_duration = self.durations[jobslot] * 100 / tot_time
+            else:
+                pct_duration = 0.0
+            results.append((jobslot, pct_duration))
+        return results
+
+    def Average(self, start, end):
+        """Returns the average number of jobs running between
+        'start' and 'end'."""
+        if end <= start:
+            return 0.0
+
+        self.Sweep()
+        times = self.times
+        counts = self.counts
+        total = 0.0
+        k = max(bisect.bisect_right(times, start) - 1, 0)
+        while k < len(counts) and times[k] < end:
+            overlap = min(times[k + 1], end) - max(times[k], start)
+            if overlap > 0:
+                total += counts[k] * overlap
+            k += 1
+        return total / (end - start)
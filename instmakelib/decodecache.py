@@ -0,0 +1,315 @@
+# Copyright (c) 2010 by Cisco Systems, Inc.
+"""
+A persistent cache of decoded log records.
+
+Decoding a record (finding the tool name, parsing the audit data into
+the input/output/execed file lists, etc.) costs much more than reading
+it, and it gives the same answer every time for the same log and the
+same plugins. When the cache is turned on, the first full reading of a
+log saves the decoded records in the cache directory, and later readings
+of the log use them instead of decoding the log again.
+
+A cache entry is identified by the path, size and modification time of
+the log, and by the source of the code that decodes the records: the
+instmakelib modules, the toolname plugins, and the audit plugin of the
+log. Changing any of these simply causes a new entry to be made; the
+old ones are removed by Prune().
+
+An entry is a pickle stream:
+
+    version string, log path, log size, log mtime, source hash,
+        record version     (one tuple)
+    the state of each record, in log order
+    None, to mark the end
+"""
+
+import cPickle as pickle
+import glob
+import hashlib
+import os
+import sys
+import tempfile
+import time
+import types
+
+from instmakelib import instmake_log as LOG
+
+CACHE_VERSION_1 = "INSTMAKE DECODED CACHE VERSION 1"
+
+DEFAULT_CACHE_DIR = "~/.instmake-cache"
+
+CACHE_SUFFIX = ".imcache"
+TMP_PREFIX = "tmp-"
+
+# Unfinished entries older than this (in seconds) are removed by Prune().
+TMP_MAX_AGE = 24 * 60 * 60
+
+
+def module_source(mod):
+    """Return the source code of a module, or its name if the
+    source can't be read."""
+    file_name = getattr(mod, "__file__", None)
+    if file_name:
+        if file_name[-4:] in (".pyc", ".pyo"):
+            file_name = file_name[:-1]
+        try:
+            fh = open(file_name, "rb")
+            try:
+                return fh.read()
+            finally:
+                fh.close()
+        except IOError:
+            pass
+    return mod.__name__
+
+
+def source_hash(log):
+    """Returns a hash of the code that decodes the records of a log."""
+    digest = hashlib.sha1()
+
+    lib_dir = os.path.dirname(os.path.abspath(LOG.__file__))
+    for file_name in sorted(glob.glob(os.path.join(lib_dir, "*.py"))):
+        fh = open(file_name, "rb")
+        digest.update(fh.read())
+        fh.close()
+
+    modules = list(LOG.toolname_manager.plugins)
+    if log.audit_plugin:
+        modules.append(log.audit_plugin)
+    # The old clearaudit records are parsed by this plugin, whatever
+    # the log header says.
+    modules.append(LOG.audit_clearaudit)
+
+    for mod in modules:
+        digest.update(mod.__name__)
+        digest.update(module_source(mod))
+
+    return digest.hexdigest()
+
+
+def log_identity(log_file_name):
+    """Returns (path, size, mtime) of a log, or None if it
+    can't be stat'ed."""
+    path = os.path.abspath(log_file_name)
+    try:
+        stat_info = os.stat(path)
+    except OSError:
+        return None
+    return (path, stat_info.st_size, stat_info.st_mtime)
+
+
+class DecodedCache:
+    """The cache entry for one LogFile. If the entry exists, the
+    records are read from it with read_record(). Otherwise the records
+    that the LogFile decodes are given to add_record(), and the entry
+    is saved when finish() is called at the end of the log."""
+
+    def __init__(self, cache_dir, log):
+        self.cache_dir = os.path.expanduser(cache_dir)
+        self.log = log
+        self.fh = None
+        self.tmp_file_name = None
+        self.reading = False
+
+        identity = log_identity(log.log_file_name)
+        if identity == None:
+            return
+
+        self.header = (CACHE_VERSION_1,) + identity + \
+                (source_hash(log), log.RecordVersion())
+        self.file_name = os.path.join(self.cache_dir,
+                hashlib.sha1(repr(self.header)).hexdigest() + CACHE_SUFFIX)
+
+        if not self.OpenEntry():
+            self.StartEntry()
+
+    def OpenEntry(self):
+        """Open an existing entry. Returns True on success."""
+        try:
+            fh = open(self.file_name, "rb")
+        except IOError:
+            return False
+
+        try:
+            header = pickle.load(fh)
+        except (EOFError, ValueError, pickle.UnpicklingError):
+            fh.close()
+            return False
+
+        if header != self.header:
+            fh.close()
+            return False
+
+        # Mark the entry as recently used, for Prune()
+        try:
+            os.utime(self.file_name, None)
+        except OSError:
+            pass
+
+        self.fh = fh
+        self.reading = True
+        return True
+
+    def StartEntry(self):
+        """Start writing a new entry. If it can't be written, the
+        log is read without the cache."""
+        try:
+            if not os.path.isdir(self.cache_dir):
+                os.makedirs(self.cache_dir)
+            (fd, self.tmp_file_name) = tempfile.mkstemp(CACHE_SUFFIX,
+                    TMP_PREFIX, self.cache_dir)
+            self.fh = os.fdopen(fd, "wb")
+            pickle.dump(self.header, self.fh, 2)
+        except (IOError, OSError), err:
+            print >> sys.stderr, "Not using the decoded-record cache:", err
+            self.Abort()
+            return
+
+        self.reading = False
+
+    def Reading(self):
+        """Are the records read from the cache?"""
+        return self.fh != None and self.reading
+
+    def Writing(self):
+        """Are the records being saved to the cache?"""
+        return self.fh != None and not self.reading
+
+    def read_record(self):
+        """Returns the next record, or raises EOFError."""
+        try:
+            state = pickle.load(self.fh)
+        except (EOFError, ValueError, pickle.UnpicklingError):
+            sys.exit("The decoded-record cache %s is corrupt; remove it." \
+                    % (self.file_name,))
+
+        if state == None:
+            raise EOFError
+
+        # Don't run __init__; the state has everything it would compute.
+        rec = types.InstanceType(self.log.RecordClass, state)
+        rec.InternStrings(self.log.strings)
+        return rec
+
+    def add_record(self, rec):
+        """Save a decoded record. The state of a record includes
+        all of its lazily-computed attributes."""
+        try:
+            pickle.dump(rec.__getstate__(), self.fh, 2)
+        except (IOError, OSError), err:
+            print >> sys.stderr, "Not using the decoded-record cache:", err
+            self.Abort()
+
+    def finish(self):
+        """All the records have been added; save the entry."""
+        # Don't save records from a log that was written to while
+        # it was read.
+        if log_identity(self.log.log_file_name) != self.header[1:4]:
+            self.Abort()
+            return
+
+        try:
+            pickle.dump(None, self.fh, 2)
+            self.fh.close()
+            self.fh = None
+            os.rename(self.tmp_file_name, self.file_name)
+            self.tmp_file_name = None
+        except (IOError, OSError), err:
+            print >> sys.stderr, "Not using the decoded-record cache:", err
+            self.Abort()
+
+    def Abort(self):
+        """Stop writing, and remove the unfinished entry."""
+        if self.fh:
+            self.fh.close()
+            self.fh = None
+        if self.tmp_file_name:
+            try:
+                os.unlink(self.tmp_file_name)
+            except OSError:
+                pass
+            self.tmp_file_name = None
+
+    def close(self):
+        if self.Writing():
+            self.Abort()
+        elif self.fh:
+            self.fh.close()
+            self.fh = None
+
+
+def read_entry_header(file_name):
+    """Returns the header tuple of a cache entry, or None."""
+    try:
+        fh = open(file_name, "rb")
+    except IOError:
+        return None
+
+    try:
+        try:
+            header = pickle.load(fh)
+        except (EOFError, ValueError, pickle.UnpicklingError):
+            return None
+    finally:
+        fh.close()
+
+    if type(header) != types.TupleType or len(header) != 6 or \
+            header[0] != CACHE_VERSION_1:
+        return None
+
+    return header
+
+
+def Prune(cache_dir):
+    """Remove the cache entries that can't be used again: those whose
+    log no longer exists or has changed, those superseded by a newer
+    entry for the same log (made after a plugin changed), and unfinished
+    entries that were left behind. Returns the number of files removed."""
+    cache_dir = os.path.expanduser(cache_dir)
+    if not os.path.isdir(cache_dir):
+        return 0
+
+    remove = []
+
+    # Key = log path, Value = [(mtime of entry, entry file name), ...]
+    entries_by_log = {}
+
+    now = time.time()
+    for file_name in glob.glob(os.path.join(cache_dir, "*" + CACHE_SUFFIX)):
+        try:
+            entry_mtime = os.path.getmtime(file_name)
+        except OSError:
+            continue
+
+        if os.path.basename(file_name).startswith(TMP_PREFIX):
+            if now - entry_mtime > TMP_MAX_AGE:
+                remove.append(file_name)
+            continue
+
+        header = read_entry_header(file_name)
+        if header == None:
+            remove.append(file_name)
+            continue
+
+        (version, path, size, mtime, src_hash, record_version) = header
+        if log_identity(path) != (path, size, mtime):
+            remove.append(file_name)
+            continue
+
+        entries_by_log.setdefault(path, []).append((entry_mtime, file_name))
+
+    # Keep the most recently used entry of each log.
+    for entries in entries_by_log.values():
+        entries.sort()
+        remove.extend([file_name for (entry_mtime, file_name)
+            in entries[:-1]])
+
+    num_removed = 0
+    for file_name in remove:
+        try:
+            os.unlink(file_name)
+            num_removed += 1
+        except OSError, err:
+            print >> sys.stderr, "Cannot remove %s: %s" % (file_name, err)
+
+    return num_removed
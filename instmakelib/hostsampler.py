@@ -0,0 +1,215 @@
+# Copyright (c) 2012 by Cisco Systems, Inc.
+"""
+Sample the state of the host during a build.
+
+A build can be slow because of the machine it runs on: other load,
+memory pressure, I/O wait, or CPUs running at a low frequency. With
+"instmake --host-samples=SECONDS", the top-level instmake forks a
+sampler process, which reads /proc at that interval and writes each
+sample to the log, as a record is written (through the collector, if
+there is one). See HOST_SAMPLE_KEYS in instmake_log for what a sample
+holds, and the "host" report for how the samples are used.
+"""
+
+import errno
+import fcntl
+import os
+import select
+import signal
+import sys
+import time
+
+from instmakelib import instmake_build
+from instmakelib import instmake_log as LOG
+
+
+def read_proc_file(file_name):
+    """Returns the text of a file, or None if it can't be read."""
+    try:
+        fh = open(file_name)
+        try:
+            return fh.read()
+        finally:
+            fh.close()
+    except (IOError, OSError):
+        return None
+
+def read_loadavg():
+    text = read_proc_file("/proc/loadavg")
+    if text == None:
+        return None
+    try:
+        return tuple([float(field) for field in text.split()[:3]])
+    except ValueError:
+        return None
+
+def read_cpu():
+    """Returns the number of CPUs, and the jiffies in each of the
+    CPU_STATES for all the CPUs together."""
+    text = read_proc_file("/proc/stat")
+    if text == None:
+        return None, None
+
+    ncpus = 0
+    states = None
+    for line in text.split("\n"):
+        fields = line.split()
+        if not fields or not fields[0].startswith("cpu"):
+            continue
+        if fields[0] == "cpu":
+            # Old kernels have fewer fields.
+            values = [int(field)
+                    for field in fields[1:len(LOG.CPU_STATES) + 1]]
+            values.extend([0] * (len(LOG.CPU_STATES) - len(values)))
+            states = dict(zip(LOG.CPU_STATES, values))
+        else:
+            ncpus += 1
+
+    return (ncpus or None), states
+
+def read_meminfo():
+    text = read_proc_file("/proc/meminfo")
+    if text == None:
+        return None
+
+    meminfo = {}
+    for line in text.split("\n"):
+        fields = line.replace(":", " ").split()
+        if len(fields) >= 2 and fields[0] in LOG.MEMINFO_FIELDS:
+            meminfo[fields[0]] = int(fields[1])
+    return meminfo
+
+def read_pressure():
+    """Returns the stall totals from /proc/pressure, or None if the
+    kernel doesn't have pressure stall information."""
+    pressure = {}
+    for resource in LOG.PRESSURE_RESOURCES:
+        text = read_proc_file(os.path.join("/proc/pressure", resource))
+        if text == None:
+            continue
+
+        # some avg10=0.00 avg60=0.00 avg300=0.00 total=12345
+        totals = {}
+        for line in text.split("\n"):
+            fields = line.split()
+            if not fields:
+                continue
+            for field in fields[1:]:
+                if field.startswith("total="):
+                    totals[fields[0]] = int(field[len("total="):])
+        pressure[resource] = totals
+
+    return pressure or None
+
+def read_cpu_mhz():
+    text = read_proc_file("/proc/cpuinfo")
+    if text == None:
+        return None
+
+    mhz = []
+    for line in text.split("\n"):
+        if line.startswith("cpu MHz"):
+            try:
+                mhz.append(float(line.split(":")[1]))
+            except (IndexError, ValueError):
+                pass
+    if mhz:
+        return sum(mhz) / len(mhz)
+    else:
+        return None
+
+def take_sample():
+    """Returns a host sample."""
+    (ncpus, cpu) = read_cpu()
+    return {
+        "time" : time.time(),
+        "ncpus" : ncpus,
+        "loadavg" : read_loadavg(),
+        "cpu" : cpu,
+        "meminfo" : read_meminfo(),
+        "pressure" : read_pressure(),
+        "cpu_mhz" : read_cpu_mhz(),
+    }
+
+
+class HostSampler:
+    """The top-level instmake's handle on the sampler process."""
+
+    def __init__(self, log_file_name, interval):
+        self.log_file_name = log_file_name
+        self.interval = interval
+        self.pid = None
+        self.stop_fd = None
+
+    def Start(self):
+        """Start the sampler process. Returns False if it
+        can't be started."""
+        try:
+            (read_fd, write_fd) = os.pipe()
+        except OSError:
+            return False
+
+        try:
+            self.pid = os.fork()
+        except OSError:
+            os.close(read_fd)
+            os.close(write_fd)
+            return False
+
+        if self.pid == 0:
+            # The sampler must not return into the caller.
+            rc = 0
+            try:
+                try:
+                    os.close(write_fd)
+                    self.Run(read_fd)
+                except:
+                    print >> sys.stderr, "instmake: host sampler failed:", \
+                            sys.exc_info()[1]
+                    rc = 1
+            finally:
+                os._exit(rc)
+
+        # The jobs must not hold the pipe open.
+        os.close(read_fd)
+        flags = fcntl.fcntl(write_fd, fcntl.F_GETFD)
+        fcntl.fcntl(write_fd, fcntl.F_SETFD, flags | fcntl.FD_CLOEXEC)
+        self.stop_fd = write_fd
+        return True
+
+    def Finish(self):
+        """Stop the sampler, after it takes its last sample."""
+        # Closing the pipe tells the sampler to stop.
+        os.close(self.stop_fd)
+
+        while 1:
+            try:
+                os.waitpid(self.pid, 0)
+                break
+            except OSError, err:
+                if err.errno != errno.EINTR:
+                    break
+            except KeyboardInterrupt:
+                # Let the sampler finish writing its sample.
+                pass
+
+    def Run(self, stop_fd):
+        """The sampler process. It samples until the top-level instmake
+        closes the other end of the pipe, or exits."""
+        # Don't stop in the middle of writing a sample.
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+        next_time = time.time()
+        while 1:
+            instmake_build.write_host_sample(self.log_file_name,
+                    take_sample())
+
+            next_time += self.interval
+            timeout = max(next_time - time.time(), 0)
+            (readable, w, x) = select.select([stop_fd], [], [], timeout)
+            if readable:
+                break
+
+        # The last sample, for the end of the build
+        instmake_build.write_host_sample(self.log_file_name, take_sample())
+        os.close(stop_fd)
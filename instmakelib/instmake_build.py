@@ -2,16 +2,23 @@
 """
 Routines for the "build" portion of instmake; i.e., when instmake
 is running a build an recording instrumentation data.
+
+This module is imported by every instmake that make runs as its
+SHELL, so it only imports what a job needs in the common case, without
+an audit plugin. Python is started for every job, and modules like
+tempfile, json and socket take longer to import than a small job takes
+to run. Anything else is imported where it is used. The "--bench-wrapper"
+option of instmake measures the time instmake adds to each job.
 """
 import sys
 import os
+import errno
 import time
 import cPickle as pickle
 import signal
-import tempfile
-import json
 
 from instmakelib import jobserver
+from instmakelib import collector
 
 # Global constants
 PID_ENV_VAR = "INSTMAKE_PID"
@@ -42,12 +49,45 @@ OPTION_OPEN_FDS = "F"
 # to write its own additional fields
 APP_INST_ENV_VAR = "INSTMAKE_APP_INST_FILE"
 
+# The directory in which the APP_INST_ENV_VAR files of a build are named.
+# They are made only by the tools that write them.
+APP_INST_DIR_ENV_VAR = "INSTMAKE_APP_INST_DIR"
+
 # Env var for instrumentation depth
 # The value is \d/\d, where the first number is the current
 # Make level (depth), and the second number is how far we should
 # instrument
 INST_DEPTH_ENV_VAR = "INSTMAKE_DEPTH"
 
+# The interval, in seconds, at which each instmake samples the
+# processes of its job (see jobsampler), if it is set.
+JOB_SAMPLES_ENV_VAR = "INSTMAKE_JOB_SAMPLES"
+
+# From log version 20, the dictionaries that are about the same in every
+# record (the recorded environment variables and make variables, and the
+# environment that the env audit plugin records) are stored once in the
+# log, as snapshots, which the records refer to. A snapshot is stored in
+# the log as a list: [key, dictionary], where the key is a hash of the
+# dictionary. The first instmake to write a snapshot writes it right
+# before its record, and then makes a file named SNAPSHOT_PREFIX + key in
+# the build's app-inst directory, so the other instmakes don't write it
+# again. In a record, a reference to a snapshot is the tuple
+# (SNAPSHOT_TAG, key, extra), where 'extra' is a dictionary of the
+# entries that are not in the snapshot, as they change from job to job.
+SNAPSHOT_TAG = "\0snapshot"
+SNAPSHOT_PREFIX = "snapshot."
+
+# The environment variables that change from job to job, which
+# are not put in the snapshots.
+VOLATILE_ENV_VARS = [ PID_ENV_VAR, MAKE_SHELL_PPID_ENV_VAR, APP_INST_ENV_VAR,
+    "JMAKE_CURRENT_MAKE_TARGET", "JMAKE_CURRENT_MAKEFILE_FILENAME",
+    "JMAKE_CURRENT_MAKEFILE_LINENO", "DBGMAKE_TARGET", "DBGMAKE_FILENM",
+    "DBGMAKE_LINENO" ]
+
+# The snapshots that the next record refers to, but that have not
+# been written yet: (key, snapshot, file name)
+pending_snapshots = []
+
 class InstmakeJobServerClient(jobserver.JobServerClient):
     env_var = "INSTMAKE_JS_FLAGS"
 
@@ -63,6 +103,19 @@ class InstmakeJobServer(InstmakeJobServerClient):
         # isn't insantiating the class for no reason
         pass
 
+def start_collector(log_file_name):
+    """Start the process that collects the records from the
+    instmakes and writes them to the log. The InstmakeJobServer must
+    already exist. Returns a collector.Collector, or None if the
+    collector can't be started, in which case each instmake writes
+    its own record."""
+    rec_collector = collector.Collector(log_file_name,
+            InstmakeJobServerClient())
+    if rec_collector.Start():
+        return rec_collector
+    else:
+        return None
+
 
 def get_shell_string():
     myself = os.path.abspath(sys.argv[0])
@@ -70,7 +123,7 @@ def get_shell_string():
 
 def initialize_environment(record_env_vars,
     record_open_fds, stop_cmd_contains, run_instrumentation,
-    audit_env_options, inst_depth):
+    audit_env_options, inst_depth, job_sample_interval=None):
 
     # Set the appropriate environment variables.
     if run_instrumentation:
@@ -97,6 +150,10 @@ def initialize_environment(record_env_vars,
     if run_instrumentation and record_open_fds:
         os.environ[OPTIONS_ENV_VAR] += OPTION_OPEN_FDS
 
+    # Sample the processes of each job?
+    if run_instrumentation and job_sample_interval:
+        os.environ[JOB_SAMPLES_ENV_VAR] = repr(job_sample_interval)
+
     # Stop conditions
     if stop_cmd_contains:
         os.environ[STOP_CMD_CONTAINS_ENV_VAR] = pickle.dumps(stop_cmd_contains)
@@ -149,11 +206,61 @@ def fdwrite(fd, text):
     return
 
 
+def snapshot_key(dictionary):
+    import hashlib
+    items = dictionary.items()
+    items.sort()
+    return hashlib.md5(pickle.dumps(items, 1)).hexdigest()
+
+def make_snapshot_ref(dictionary, volatile_keys=()):
+    """Returns what to store in a record for a dictionary that is about
+    the same in every record: a reference to a snapshot of it, without
+    the volatile_keys, or the dictionary itself if there are no
+    snapshots in this build. See SNAPSHOT_TAG."""
+    snapshot_dir = os.environ.get(APP_INST_DIR_ENV_VAR)
+    if not snapshot_dir or not dictionary:
+        return dictionary
+
+    snapshot = {}
+    extra = {}
+    for (key, value) in dictionary.items():
+        if key in volatile_keys:
+            extra[key] = value
+        else:
+            snapshot[key] = value
+
+    key = snapshot_key(snapshot)
+    file_name = os.path.join(snapshot_dir, SNAPSHOT_PREFIX + key)
+    if not os.path.exists(file_name):
+        for pending in pending_snapshots:
+            if pending[0] == key:
+                break
+        else:
+            pending_snapshots.append((key, snapshot, file_name))
+    return (SNAPSHOT_TAG, key, extra)
+
+def snapshots_written():
+    """The pending snapshots were written to the log with the record;
+    tell the other instmakes."""
+    for (key, snapshot, file_name) in pending_snapshots:
+        try:
+            os.close(os.open(file_name, os.O_WRONLY|os.O_CREAT, 0644))
+        except OSError:
+            pass
+    del pending_snapshots[:]
+
+# The index of the overhead in a record (see LogRecord_17 in instmake_log)
+OVERHEAD = 16
+
 def write_record(log_file_name, ppid, pid, cretval, times1, times2,
     command_line, audit_data, makefile_filenm, makefile_lineno,
-    app_inst_filename):
+    app_inst, rusage=None, overhead=None, job_samples=None):
     """Write a record to the instmake log, using data passed to us, and
-    other data we can find by ourself."""
+    other data we can find by ourself. 'app_inst' is the data from
+    read_app_inst(). 'overhead', if given, is
+    (startup, setup, finish_start): the durations of the first phases
+    of instmake's own work, and the time it started to finish the job.
+    'job_samples' is from JobSampler.Samples()."""
 
     # Record open file descriptors? Do this now before we open the
     # instmake log, which would open another file descriptor.
@@ -162,14 +269,6 @@ def write_record(log_file_name, ppid, pid, cretval, times1, times2,
         if OPTION_OPEN_FDS in os.environ[OPTIONS_ENV_VAR]:
             open_fds = find_open_fds()
 
-    try:
-        fd = os.open(log_file_name, os.O_WRONLY|os.O_APPEND)
-    except OSError, err:
-        # Report the logging problem, but don't fail the build.
-        print >> sys.stderr, "instmake: Failed to open %s: %s" % \
-                (log_file_name, err)
-        return
-
     # jmake variables
     make_target = os.environ.get("JMAKE_CURRENT_MAKE_TARGET", None)
     if not makefile_filenm:
@@ -219,30 +318,79 @@ def write_record(log_file_name, ppid, pid, cretval, times1, times2,
             else:
                 env_var_vals[env_var] = None
 
-    # Read any extra instrumention data
-    app_inst = None
-    if app_inst_filename != None:
-        try:
-            app_inst_fh = open(app_inst_filename)
-            try:
-                text = app_inst_fh.read()
-                app_inst = json.loads(text)
-            except (IOError, ValueError):
-                pass
-            app_inst_fh.close()
-        except IOError:
-            pass
+    env_var_vals = make_snapshot_ref(env_var_vals, VOLATILE_ENV_VARS)
+    make_vars = make_snapshot_ref(make_vars)
 
-    # This is the record we'll save
-    data = (ppid, pid, cwd, cretval, times1, times2,
+    # This is the record we'll save. Its overhead is filled in below.
+    data = [ppid, pid, cwd, cretval, times1, times2,
             command_line, make_target, makefile_filenm,
             makefile_lineno, audit_data,
             env_var_vals, open_fds, make_vars,
-            app_inst)
+            app_inst, rusage, None, job_samples]
+
+    # Get ready to write the record: connect to the collector, or if
+    # there is none, open the log and take the jobserver token. How
+    # long we wait for that is part of the overhead.
+    wait_start = time.time()
+    log = None
+    sock = collector.connect()
+    if sock == None:
+        log = open_log(log_file_name, data)
+        if log == None:
+            return
+    wait_end = time.time()
+
+    if overhead:
+        (startup, setup, finish_start) = overhead
+        # See OVERHEAD_FIELDS in instmake_log
+        data[OVERHEAD] = (startup, setup, wait_start - finish_start,
+                wait_end - wait_start)
+
+    data_text = pickle.dumps(tuple(data), 1) # 1 = dump as binary
+
+    # The new snapshots go right before the record.
+    if pending_snapshots:
+        data_text = "".join([pickle.dumps([key, snapshot], 1)
+            for (key, snapshot, file_name) in pending_snapshots]) + data_text
+
+    if sock:
+        if collector.send_record(sock, data_text):
+            snapshots_written()
+            return
+        # The collector is gone; write the record ourselves.
+        log = open_log(log_file_name, data)
+        if log == None:
+            return
+
+    if append_to_log(log, data_text, data):
+        snapshots_written()
+
+
+def write_host_sample(log_file_name, sample):
+    """Write a host sample (see hostsampler) to the log, as a
+    record is written."""
+    data_text = pickle.dumps(sample, 1) # 1 = dump as binary
+
+    sock = collector.connect()
+    if sock and collector.send_record(sock, data_text):
+        return
 
-    data_text = pickle.dumps(data, 1) # 1 = dump as binary
+    log = open_log(log_file_name, sample)
+    if log:
+        append_to_log(log, data_text, sample)
+
+
+def open_log(log_file_name, data):
+    """Open the log and take the jobserver token, to append a record
+    to the log. Returns (fd, jobclient), or None on failure."""
+    try:
+        fd = os.open(log_file_name, os.O_WRONLY|os.O_APPEND)
+    except OSError, err:
+        # Report the logging problem, but don't fail the build.
+        print >> sys.stderr, "instmake: Failed to open %s: %s" % \
+                (log_file_name, err)
+        return None
 
-    # Write the record.
     try:
         jobclient = InstmakeJobServerClient()
     except jobserver.JobServerNotAvailable:
@@ -252,9 +400,20 @@ def write_record(log_file_name, ppid, pid, cretval, times1, times2,
         print >> sys.stderr, "instmake: can't write to log because " \
                 "instmake-jobserver is not available. Not logged:", \
                 data
-        return
+        try:
+            os.close(fd)
+        except OSError:
+            pass
+        return None
 
     jobclient.TakeToken()
+    return (fd, jobclient)
+
+
+def append_to_log(log, data_text, data):
+    """Append a record to the log opened by open_log(), and
+    give back the token. Returns True if it was written."""
+    (fd, jobclient) = log
     try:
         fdwrite(fd, data_text)
     except OSError, err:
@@ -267,7 +426,7 @@ def write_record(log_file_name, ppid, pid, cretval, times1, times2,
         print >> sys.stderr, "instmake: can't write to log due to", \
                 err, ". Not logged:", \
                 data
-        return
+        return False
 
     jobclient.PutToken()
 
@@ -276,6 +435,147 @@ def write_record(log_file_name, ppid, pid, cretval, times1, times2,
         os.close(fd)
     except OSError, err:
         pass
+    return True
+
+
+def make_app_inst_dir():
+    """Make the directory for the extra-instrumentation files of a
+    build, for the top-level instmake. Returns its name, or None if it
+    can't be made, in which case each instmake makes its own file."""
+    import tempfile
+    try:
+        app_inst_dir = tempfile.mkdtemp(prefix="instmake-appinst.")
+    except (IOError, OSError), err:
+        print >> sys.stderr, "instmake: can't make a directory for " \
+                "app-inst files:", err
+        return None
+
+    os.environ[APP_INST_DIR_ENV_VAR] = app_inst_dir
+    return app_inst_dir
+
+def remove_app_inst_dir(app_inst_dir):
+    """Remove the directory from make_app_inst_dir(), with any files
+    that were left in it."""
+    import shutil
+    del os.environ[APP_INST_DIR_ENV_VAR]
+    shutil.rmtree(app_inst_dir, True)
+
+def make_app_inst_file(pid):
+    """Returns (fd, file name) of the extra-instrumentation file for
+    a job. In a build, the file is named in the build's app-inst
+    directory, but is not made, as few tools write to it; the fd
+    is None. Otherwise, the file is made, like tempfile.mkstemp(),
+    but without importing tempfile, which is slow to import."""
+    app_inst_dir = os.environ.get(APP_INST_DIR_ENV_VAR)
+    if app_inst_dir:
+        # The time keeps the file of an instmake that died from
+        # being used by a later instmake with the same PID.
+        return (None, os.path.join(app_inst_dir,
+            "%s.%.6f" % (pid, time.time())))
+
+    tmp_dir = os.environ.get("TMPDIR") or "/tmp"
+    prefix = os.path.join(tmp_dir, "instmake." + pid + ".")
+    i = 0
+    while 1:
+        file_name = prefix + str(i)
+        try:
+            fd = os.open(file_name, os.O_RDWR|os.O_CREAT|os.O_EXCL, 0600)
+            return (fd, file_name)
+        except OSError, err:
+            if err.errno != errno.EEXIST:
+                # Let tempfile find a directory that can be used.
+                import tempfile
+                return tempfile.mkstemp(prefix="instmake." + pid + ".")
+        i += 1
+
+def read_app_inst(file_name):
+    """Read the extra-instrumentation data that a tool wrote to its
+    file. Returns (data, found), where found says if the file
+    exists."""
+    try:
+        fh = open(file_name)
+    except IOError:
+        return (None, False)
+
+    app_inst = None
+    try:
+        text = fh.read()
+        # Few tools write to the file.
+        if text:
+            import json
+            app_inst = json.loads(text)
+    except (IOError, ValueError):
+        pass
+    fh.close()
+    return (app_inst, True)
+
+def process_age():
+    """Returns how long ago, in seconds, this process started, or None
+    if that can't be found. It is read from /proc, so it has the
+    resolution of clock ticks."""
+    try:
+        fh = open("/proc/self/stat")
+        stat_text = fh.read()
+        fh.close()
+        fh = open("/proc/uptime")
+        uptime_text = fh.read()
+        fh.close()
+
+        # The process name, in parentheses, may have spaces in it.
+        # starttime is the 22nd field; the name is the 2nd.
+        fields = stat_text[stat_text.rindex(")") + 2:].split()
+        start_ticks = int(fields[22 - 3])
+        uptime = float(uptime_text.split()[0])
+        return max(uptime - start_ticks / float(os.sysconf("SC_CLK_TCK")),
+                0.0)
+    except (IOError, OSError, ValueError, IndexError):
+        return None
+
+def child_main(log_file_name, args):
+    """The entry point of an instmake that is run by the build, as
+    its SHELL. 'args' are the arguments after the instmake script's
+    name. Exits with the exit status of the job."""
+
+    # We must be a child instmake. But how were we called?
+    if len(args) == 0:
+
+        # Clearmake sends a command to the shell by piping it in
+        # instead of passing it on the command-line via '-c'.
+        # Check if there is input on stdin, but don't hang!
+        import select
+        (i_fds, o_fds, e_fds) = select.select([sys.stdin], [], [], 0.001)
+        if i_fds:
+            cmd = sys.stdin.readline()
+            if cmd[-1] == "\n":
+                cmd = cmd[:-1]
+            rc = invoke_child(log_file_name, ["-c", cmd])
+            sys.exit(rc)
+        else:
+            sys.exit("instmake: invoked by build, but without arguments.")
+
+    # Were we invoked to run a command?
+    if args[0] == "-c":
+        rc = invoke_child(log_file_name, args)
+        sys.exit(rc)
+
+    # Were we invoked to add a record to the log?
+    elif args[0] == "-r":
+        add_record(log_file_name, args[1:])
+
+    # Is the build getting tricky and trying to run
+    # a known shell script via: $(SHELL) script?
+    # We can only assume so; try to run it.
+    else:
+        # We have to allow for the fact that the script we are
+        # running doesn't have execute permissions set.
+        # If $(SHELL) were /bin/sh, then /bin/sh doesn't
+        # care about execute permissions. The easiest way
+        # to do this is pretend that $(SHELL) indeed was /bin/sh
+        # and run /bin/sh directly. As this is the default SHELL
+        # in 'make' anyway, this is safe.
+        argv = ["/bin/sh"] + args
+        rc = invoke_child(log_file_name, argv)
+        sys.exit(rc)
 
 def invoke_child(log_file_name, cli_args):
     # If there is a limit to the depth we instrument,
@@ -319,6 +619,10 @@ def invoke_child_logger(log_file_name, cli_args):
     are the args that should start with the command to run,
     that is, that don't start with "instmake"."""
 
+    # The time it took to start Python and instmake, for the overhead.
+    setup_start = time.time()
+    startup = process_age()
+
     # Create names in the local namespace for module
     # functions that we need to call between the two
     # time-recordings. We want to minimize the amount
@@ -327,7 +631,7 @@ def invoke_child_logger(log_file_name, cli_args):
     # process.
     times = os.times
     get_wall_clock = time.time
-    wait = os.wait
+    wait4 = os.wait4
     execvp = os.execvp
     fork = os.fork
     kill = os.kill
@@ -341,9 +645,8 @@ def invoke_child_logger(log_file_name, cli_args):
     pid = make_pid()
 
     # An extra instrumentation file that the instrumented
-    # tool can write to.
-    (app_inst_fd, app_inst_filename) = \
-            tempfile.mkstemp(prefix="instmake." + pid + ".")
+    # tool can write to. It may not exist until the tool writes to it.
+    (app_inst_fd, app_inst_filename) = make_app_inst_file(pid)
 
     # Audit?
     auditor = None
@@ -357,6 +660,17 @@ def invoke_child_logger(log_file_name, cli_args):
         audit_plugin = rtimport.rtimport(plugin_mod_name)
         auditor = audit_plugin.Auditor(audit_env_options)
 
+    # Sample the job's processes while it runs?
+    job_sampler = None
+    if os.environ.has_key(JOB_SAMPLES_ENV_VAR):
+        from instmakelib import jobsampler
+        try:
+            job_sampler = jobsampler.JobSampler(
+                    float(os.environ[JOB_SAMPLES_ENV_VAR]))
+        except ValueError:
+            # Corrupt data. Ignore it.
+            pass
+
     # Check for an argument other than our own name
     if len(cli_args) >= 1:
         # Makes calls us as if we are /bin/sh, so we see: ['-c', 'cmdline to run']
@@ -393,7 +707,11 @@ def invoke_child_logger(log_file_name, cli_args):
         cpid = fork()
         if cpid:
             try:
-                cexit = wait()[1]
+                if job_sampler:
+                    (wpid, cexit, rusage) = job_sampler.Wait(cpid,
+                            wall_clock_1)
+                else:
+                    (wpid, cexit, rusage) = wait4(cpid, 0)
             except KeyboardInterrupt:
                 # Send the signal to the children first, so their instmakes,
                 # if any are sub-makes, can write their records.
@@ -404,6 +722,7 @@ def invoke_child_logger(log_file_name, cli_args):
                 # make returns 2 on interrupt, so we set our cexit value to
                 # 2 shifted over 16 bytes.
                 cexit = 0x0200
+                rusage = None
             # Record end time
             times2 = times()
             wall_clock_2 = get_wall_clock()
@@ -421,6 +740,7 @@ def invoke_child_logger(log_file_name, cli_args):
         wall_clock_1 = get_wall_clock()
         wall_clock_2 = wall_clock_1
         cexit = 0
+        rusage = None
 
     # Convert the exit-value to a return-value by ignoring the signal
     # information.
@@ -437,23 +757,41 @@ def invoke_child_logger(log_file_name, cli_args):
     #   CHILD_SYS_TIME = 3
     #   ELAPSED_REAL_TIME = 4
     new_times1 = (times1[2], times1[3], wall_clock_1)
-    new_times2 = (times2[2], times2[3], wall_clock_2)
+    if rusage:
+        # The child's own resource usage has its CPU times to the
+        # microsecond, while times() counts clock ticks.
+        new_times2 = (times1[2] + rusage.ru_utime,
+                times1[3] + rusage.ru_stime, wall_clock_2)
+        rusage = tuple(rusage)
+    else:
+        new_times2 = (times2[2], times2[3], wall_clock_2)
+
+    if job_sampler:
+        job_samples = job_sampler.Samples()
+    else:
+        job_samples = None
+
+    # Read any extra instrumention data, and get rid of the
+    # extra-instrumentation file handle and file
+    (app_inst, app_inst_found) = read_app_inst(app_inst_filename)
+    if app_inst_fd != None:
+        try:
+            os.close(app_inst_fd)
+        except OSError:
+            pass
+
+    if app_inst_found:
+        try:
+            os.remove(app_inst_filename)
+        except OSError:
+            pass
 
     # Save the data to the log.
     write_record(log_file_name, ppid, pid, cretval,
         new_times1, new_times2, recorded_args, audit_data, None, None,
-        app_inst_filename)
-
-    # Get rid of the extra-instrumentation file handle and file
-    try:
-        os.close(app_inst_fd)
-    except OSError:
-        pass
-
-    try:
-        os.remove(app_inst_filename)
-    except OSError:
-        pass
+        app_inst, rusage,
+        (startup, wall_clock_1 - setup_start, wall_clock_2),
+        job_samples)
 
     # Is there a stop condition which matches this command?
     if os.environ.has_key(STOP_CMD_CONTAINS_ENV_VAR):
@@ -536,8 +874,13 @@ def add_record(log_file_name, args):
     if times2 == None:
         times2 = times1
 
+    if app_inst_filename != None:
+        (app_inst, app_inst_found) = read_app_inst(app_inst_filename)
+    else:
+        app_inst = None
+
     write_record(log_file_name, ppid, pid, retval, times1, times2, cmdline,
-        None, makefile_filenm, makefile_lineno, app_inst_filename)
+        None, makefile_filenm, makefile_lineno, app_inst)
 
     # Return the child-process's return value.
     sys.exit(retval)
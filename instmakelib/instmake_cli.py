@@ -6,6 +6,12 @@ import getopt
 from instmakelib import imlib
 from instmakelib import instmake_log
 from instmakelib import instmake_build
+from instmakelib import reportstream
+from instmakelib import decodecache
+from instmakelib import benchwrapper
+from instmakelib import livelog
+from instmakelib import hostsampler
+from instmakelib import jsonconfig
 import os
 
 
@@ -18,6 +24,10 @@ SHOW_CSV = "csv"
 BUILD = "build"
 HELP = "help"
 SHOW_LOG_HEADER = "show-log-header"
+WRITE_INDEX = "index"
+PRUNE_CACHE = "prune-cache"
+COMPACT = "compact"
+BENCH_WRAPPER = "bench-wrapper"
 
 # Global constants
 REPORT_PLUGIN_PREFIX = "report"
@@ -66,19 +76,28 @@ def usage(plugin_dirs):
     print "\tinstmake [-L log_file|--vws=prefix|--logs=prefix] [--force]"
     print "\t\t[--noinst] [--inst-depth LEVEL] [-a audit-plugin[,options]]"
     print "\t\t[-o make_output_file] [-e env-var] [--fd]"
-    print "\t\t[--stop-cmd-contains text]"
-    print "\t\tmake ..."
+    print "\t\t[--stop-cmd-contains text] [--no-index] [--no-collector]"
+    print "\t\t[--host-samples=SECONDS] [--job-samples=SECONDS] make ..."
     print
     print "   REPORT:"
     print "\tinstmake [-P plugin_dir] [-L log_file] [-L log_file] [-d|--default]"
     print "\t\t[--vws=prefix] [--logs=prefix] [-p|--print print-plugin]"
+    print "\t\t[--jobs N] [--cache|--cache-dir=DIR|--no-cache]"
     print" \t\t[-s|--stats report-name] [%s] [options]" %  (HELP_OPTION,)
+    print "\tinstmake [-P plugin_dir] [-L log_file] [-p|--print print-plugin]"
+    print "\t\t--live [--refresh=SECONDS] [-s|--stats report-name] [options]"
+    print "\tinstmake [-P plugin_dir] [-L log_file] [-p|--print print-plugin]"
+    print "\t\t[-s|--stats report-name[:option...],report-name[:option...]...]"
     print
     print "   MISCELLANEOUS:"
     print "\tinstmake [-L log_file|--vws=prefix|--logs=prefix] [-t|--text]"
     print "\tinstmake [-L log_file|--vws=prefix|--logs=prefix] [-c|--csv]"
     print "\tinstmake [-L log_file|--vws=prefix|--logs=prefix] [--log-version]"
     print "\tinstmake [-L log_file|--vws=prefix|--logs=prefix] [--log-header]"
+    print "\tinstmake [-L log_file|--vws=prefix|--logs=prefix] [--index]"
+    print "\tinstmake [--cache-dir=DIR] [--prune-cache]"
+    print "\tinstmake [--force] [--no-index] --compact in_log_file out_log_file"
+    print "\tinstmake [--no-collector] --bench-wrapper [num_jobs]"
     print "\tinstmake [-P plugin_dir] [-h|--help]"
     print
     print " The following options can be repeated as many times as necessary:"
@@ -158,13 +177,8 @@ def start_plugins_for_reading(plugin_dirs):
     instmake_log.SetPlugins(plugins)
     return plugins
 
-def run_report(report_name, printer_name, log_file_names, plugin_dirs,
-        report_args, assumed_default_logfile):
-    """Run a report, given a few values."""
-    
-    plugins = start_plugins_for_reading(plugin_dirs)
-
-    # Load the report plugin
+def load_report(plugins, report_name, report_args):
+    """Load a report plugin. Handles the report's --help option."""
     try:
         mod = plugins.LoadPlugin(REPORT_PLUGIN_PREFIX, report_name)
     except ImportError, err:
@@ -179,7 +193,10 @@ def run_report(report_name, printer_name, log_file_names, plugin_dirs,
         mod.usage()
         sys.exit(0)
 
-    # Load the print plugin
+    return mod
+
+def start_printer(plugins, printer_name):
+    """Load the print plugin and let it print its header."""
     try:
         printer = plugins.LoadPlugin(PRINT_PLUGIN_PREFIX, printer_name)
     except ImportError, err:
@@ -193,6 +210,28 @@ def run_report(report_name, printer_name, log_file_names, plugin_dirs,
         sys.exit("No such print-plugin: %s" % (printer_name,))
 
     instmake_log.SetPrinterPlugin(printer)
+    return printer
+
+def check_log_files(log_file_names):
+    """Check that the log files exist."""
+    for file_name in log_file_names:
+        if not os.path.exists(file_name):
+            sys.exit("%s does not exist." % (file_name,))
+
+        if not os.path.isfile(file_name):
+            sys.exit("%s is not a file." % (file_name,))
+
+def run_report(report_name, printer_name, log_file_names, plugin_dirs,
+        report_args, assumed_default_logfile):
+    """Run a report, given a few values."""
+    
+    plugins = start_plugins_for_reading(plugin_dirs)
+
+    # Load the report plugin
+    mod = load_report(plugins, report_name, report_args)
+
+    # Load the print plugin
+    printer = start_printer(plugins, printer_name)
 
     # Some reports don't like for us to assume a default log file.
     if assumed_default_logfile:
@@ -203,13 +242,7 @@ def run_report(report_name, printer_name, log_file_names, plugin_dirs,
                         os.path.expanduser(imlib.DEFAULT_LOG_FILE)
                 log_file_names = []
 
-    # Check that the log files exist.
-    for file_name in log_file_names:
-        if not os.path.exists(file_name):
-            sys.exit("%s does not exist." % (file_name,))
-
-        if not os.path.isfile(file_name):
-            sys.exit("%s is not a file." % (file_name,))
+    check_log_files(log_file_names)
 
     # Run the report
     try:
@@ -220,6 +253,116 @@ def run_report(report_name, printer_name, log_file_names, plugin_dirs,
     # Let the print plugin print a header
     printer.PrintFooter()
 
+def run_live_report(report_name, printer_name, log_file_names, plugin_dirs,
+        report_args, refresh):
+    """Run a report on a log while the build writes it."""
+    if len(log_file_names) != 1:
+        sys.exit("--live uses only one log file.")
+
+    plugins = start_plugins_for_reading(plugin_dirs)
+
+    mod = load_report(plugins, report_name, report_args)
+    if not hasattr(mod, "make_live_consumer"):
+        sys.exit("The '%s' report can't be run with --live." % (report_name,))
+
+    consumer = mod.make_live_consumer(log_file_names[0], report_args)
+
+    printer = start_printer(plugins, printer_name)
+
+    try:
+        livelog.run_live(log_file_names[0], consumer, refresh)
+    except KeyboardInterrupt:
+        sys.exit("Instmake report interrupted by user.")
+
+    printer.PrintFooter()
+
+def parse_report_list(text):
+    """Parse a list of reports, "REPORT[:ARG...],REPORT[:ARG...]",
+    into a list of (report_name, report_args)."""
+    reports = []
+    for item in text.split(","):
+        fields = item.split(":")
+        if not fields[0]:
+            sys.exit("Missing report name in '%s'" % (text,))
+        reports.append((fields[0], fields[1:]))
+    return reports
+
+def run_reports(report_list, printer_name, log_file_names, plugin_dirs):
+    """Run several reports, reading the log once."""
+    if len(log_file_names) != 1:
+        sys.exit("Multiple reports use one log file.")
+
+    plugins = start_plugins_for_reading(plugin_dirs)
+
+    reports = []
+    for (report_name, report_args) in report_list:
+        mod = load_report(plugins, report_name, report_args)
+        reports.append((report_name, mod, report_args))
+
+    printer = start_printer(plugins, printer_name)
+
+    check_log_files(log_file_names)
+
+    try:
+        reportstream.run_reports(log_file_names[0], reports)
+    except KeyboardInterrupt:
+        sys.exit("Instmake report interrupted by user.")
+
+    printer.PrintFooter()
+
+def allow_old_log_headers():
+    """Instmake recoreds are plain Python data types (lists, tuples,
+    dictionaries, strings), but the LogHeader_1 that was added
+    is a Python object, for which a class is neeeded. This was a
+    mistake!
+    In pre-open-source instmake logs, unpickle() will try to
+    import 'instmake_log', but that won't work because in open-source
+    instmake, 'instmake_log' has been moved to the instmakelib directory.
+    To allow the open-source version of instmake to read instmake logs
+    from before it was released to open source, we add the instmakelib
+    directory to sys.path."""
+    instmake_lib_path = os.path.dirname(__file__)
+    sys.path.append(instmake_lib_path)
+
+def compact_log(in_file_name, out_file_name, plugin_dirs, force,
+        write_index_after):
+    """Rewrite a log as a compact log."""
+    check_log_files([in_file_name])
+
+    if os.path.exists(out_file_name) and not force:
+        sys.exit("%s already exists. Use --force to overwrite it." % \
+                (out_file_name,))
+
+    allow_old_log_headers()
+    start_plugins_for_reading(plugin_dirs)
+
+    try:
+        num_records = instmake_log.write_compact_log(in_file_name,
+                out_file_name)
+    except (IOError, OSError), err:
+        sys.exit("Failed to write %s: %s" % (out_file_name, err))
+
+    print "Wrote %d records to %s" % (num_records, out_file_name)
+
+    if write_index_after:
+        write_index(out_file_name, plugin_dirs, 0)
+
+def write_index(log_file_name, plugin_dirs, verbose):
+    """Write the sidecar index for a log. Returns 1 on success, 0
+    on failure."""
+    start_plugins_for_reading(plugin_dirs)
+    try:
+        num_records = instmake_log.WriteIndex(log_file_name)
+    except (IOError, OSError), err:
+        print >> sys.stderr, "instmake: failed to write index for %s: %s" % \
+                (log_file_name, err)
+        return 0
+
+    if verbose:
+        print "Indexed %d records in %s" % (num_records,
+                instmake_log.index_file_name(log_file_name))
+    return 1
+
 def start_top(log_file_env_var, config, site_dir):
     """Starting the top-most instmake. Decide which major
     function to run: begin a new database, append to a database,
@@ -246,6 +389,17 @@ def start_top(log_file_env_var, config, site_dir):
     audit_env_options = ""
     audit_cli_options = []
     assumed_default_logfile = 0
+    index_after_build = 1
+    use_collector = 1
+    decode_jobs = 1
+    live = 0
+    live_refresh = livelog.DEFAULT_REFRESH
+    host_sample_interval = None
+    job_sample_interval = None
+    if config.get(jsonconfig.CONFIG_DECODED_CACHE):
+        cache_dir = config[jsonconfig.CONFIG_DECODED_CACHE]
+    else:
+        cache_dir = None
 
     ################################
     # Parse the command-line options
@@ -253,7 +407,11 @@ def start_top(log_file_env_var, config, site_dir):
     longopts = ["text", "stats", "default", "log-version", "log-header",
             "csv", "help",
         "force", "print", "vws=", "fd",
-        "stop-cmd-contains=", "noinst", "inst-depth=", "logs="]
+        "stop-cmd-contains=", "noinst", "inst-depth=", "logs=",
+        "index", "no-index", "jobs=", "cache", "cache-dir=", "no-cache",
+        "prune-cache", "compact", "no-collector", "bench-wrapper",
+        "live", "refresh=", "host-samples=",
+        "job-samples="]
 
     imlib.SetConfig(config)
 
@@ -319,6 +477,81 @@ def start_top(log_file_env_var, config, site_dir):
                 usage(plugin_dirs)
             mode = STATS
 
+        elif opt == "--index":
+            if mode != NO_MODE:
+                usage(plugin_dirs)
+            mode = WRITE_INDEX
+
+        elif opt == "--no-index":
+            index_after_build = 0
+
+        elif opt == "--no-collector":
+            use_collector = 0
+
+        elif opt == "--jobs":
+            try:
+                decode_jobs = int(arg)
+            except ValueError:
+                sys.exit("--jobs argument must be an integer")
+
+            if decode_jobs < 1:
+                sys.exit("--jobs N must be >= 1")
+
+        elif opt == "--cache":
+            if not cache_dir:
+                cache_dir = decodecache.DEFAULT_CACHE_DIR
+
+        elif opt == "--cache-dir":
+            cache_dir = arg
+
+        elif opt == "--no-cache":
+            cache_dir = None
+
+        elif opt == "--prune-cache":
+            if mode != NO_MODE:
+                usage(plugin_dirs)
+            mode = PRUNE_CACHE
+
+        elif opt == "--compact":
+            if mode != NO_MODE:
+                usage(plugin_dirs)
+            mode = COMPACT
+
+        elif opt == "--bench-wrapper":
+            if mode != NO_MODE:
+                usage(plugin_dirs)
+            mode = BENCH_WRAPPER
+
+        elif opt == "--live":
+            live = 1
+
+        elif opt == "--refresh":
+            try:
+                live_refresh = float(arg)
+            except ValueError:
+                sys.exit("--refresh argument must be a number")
+
+            if live_refresh <= 0:
+                sys.exit("--refresh SECONDS must be > 0")
+
+        elif opt == "--host-samples":
+            try:
+                host_sample_interval = float(arg)
+            except ValueError:
+                sys.exit("--host-samples argument must be a number")
+
+            if host_sample_interval <= 0:
+                sys.exit("--host-samples SECONDS must be > 0")
+
+        elif opt == "--job-samples":
+            try:
+                job_sample_interval = float(arg)
+            except ValueError:
+                sys.exit("--job-samples argument must be a number")
+
+            if job_sample_interval <= 0:
+                sys.exit("--job-samples SECONDS must be > 0")
+
         elif opt == "--force":
             force_logfile_overwrite = 1
 
@@ -412,6 +645,32 @@ def start_top(log_file_env_var, config, site_dir):
     if (mode == SHOW_LOG_HEADER) and args:
         usage(plugin_dirs)
 
+    # Index mode can't have any additional arguments
+    if (mode == WRITE_INDEX) and args:
+        usage(plugin_dirs)
+
+    # Prune-cache mode can't have any additional arguments
+    if (mode == PRUNE_CACHE) and args:
+        usage(plugin_dirs)
+
+    # Compact mode needs the input and output logs
+    if (mode == COMPACT) and len(args) != 2:
+        usage(plugin_dirs)
+
+    # Bench-wrapper mode can have the number of jobs
+    if mode == BENCH_WRAPPER:
+        if len(args) > 1:
+            usage(plugin_dirs)
+        elif args:
+            try:
+                bench_jobs = int(args[0])
+            except ValueError:
+                sys.exit("--bench-wrapper argument must be an integer")
+            if bench_jobs < 1:
+                sys.exit("--bench-wrapper num_jobs must be >= 1")
+        else:
+            bench_jobs = benchwrapper.DEFAULT_NUM_JOBS
+
     # If stat mode, grab the report name
     if mode == STATS:
         if len(args) == 0:
@@ -419,19 +678,51 @@ def start_top(log_file_env_var, config, site_dir):
         report_name = args[0]
         report_args = args[1:]
 
+        # Several reports, like "tooltime,duration:-d"?
+        if "," in report_name or ":" in report_name:
+            report_list = parse_report_list(report_name)
+            if report_args:
+                sys.exit("With more than one report, give the report "
+                        "arguments as REPORT:ARG:ARG...")
+            if decode_jobs != 1:
+                sys.exit("--jobs can't be used with more than one report.")
+        else:
+            report_list = None
+
+        if live and report_list:
+            sys.exit("--live runs only one report.")
+
+    # Live mode is only for reports
+    if live and mode != STATS:
+        sys.exit("--live can only be used with --stats")
+
+    if live and decode_jobs != 1:
+        sys.exit("--jobs can't be used with --live")
+
     # Print plugin can only be chosen in stat mode
     if printer_name != DEFAULT_PRINT_PLUGIN and mode != STATS:
         sys.exit("Print plugin can only be used with --stats")
 
+    # Decoding processes can only be used in stat mode
+    if decode_jobs != 1 and mode != STATS:
+        sys.exit("--jobs can only be used with --stats")
+
     # Audit plugin can only be chosen in build mode
     # (help mode was already handled above)
     if audit_plugin and mode != BUILD:
         sys.exit("Audit plugin can only be used when building")
 
+    if host_sample_interval and mode != BUILD:
+        sys.exit("--host-samples can only be used when building")
+
+    if job_sample_interval and mode != BUILD:
+        sys.exit("--job-samples can only be used when building")
+
     # If we're supposed to read the log file(s), check
     # that they exist. But don't do this for report plugins, as
     # that check will come later.
-    if mode != BUILD and mode != STATS:
+    if mode != BUILD and mode != STATS and mode != PRUNE_CACHE and \
+            mode != COMPACT and mode != BENCH_WRAPPER:
         for file_name in log_file_names:
             if not os.path.exists(file_name):
                 sys.exit("%s does not exist." % (file_name,))
@@ -442,21 +733,23 @@ def start_top(log_file_env_var, config, site_dir):
     #########################
     # Finally, run something.
     if mode == STATS:
-        # Instmake recoreds are plain Python data types (lists, tuples,
-        # dictionaries, strings), but the LogHeader_1 that was added
-        # is a Python object, for which a class is neeeded. This was a
-        # mistake!
-        # In pre-open-source instmake logs, unpickle() will try to
-        # import 'instmake_log', but that won't work because in open-source
-        # instmake, 'instmake_log' has been moved to the instmakelib directory.
-        # To allow the open-source version of instmake to read instmake logs
-        # from before it was released to open source, we add the instmakelib
-        # directory to sys.path.
-        instmake_lib_path = os.path.dirname(__file__)
-        sys.path.append(instmake_lib_path)
-
-        run_report(report_name, printer_name, log_file_names, plugin_dirs,
-                report_args, assumed_default_logfile)
+        allow_old_log_headers()
+
+        if live:
+            # The log isn't finished, so it can't be cached.
+            run_live_report(report_name, printer_name, log_file_names,
+                    plugin_dirs, report_args, live_refresh)
+            return mode, None
+
+        instmake_log.SetDecodeJobs(decode_jobs)
+        instmake_log.SetDecodedCache(cache_dir)
+
+        if report_list:
+            run_reports(report_list, printer_name, log_file_names,
+                    plugin_dirs)
+        else:
+            run_report(report_name, printer_name, log_file_names,
+                    plugin_dirs, report_args, assumed_default_logfile)
         return mode, None
 
     elif mode == SHOW_TEXT:
@@ -484,7 +777,14 @@ def start_top(log_file_env_var, config, site_dir):
         print "MAKEFILE,",
         print "LINE,",
         print "START_TIME,",
-        print "END_TIME"
+        print "END_TIME,",
+        print "MAXRSS_KB,",
+        print "MINFLT,",
+        print "MAJFLT,",
+        print "INBLOCK,",
+        print "OUBLOCK,",
+        print "NVCSW,",
+        print "NIVCSW"
 
         # Run the 'dump' report with the 'csv' printer
         run_report('dump', 'csv', log_file_names, plugin_dirs, [],
@@ -507,6 +807,31 @@ def start_top(log_file_env_var, config, site_dir):
         instmake_log.show_log_header(log_file_name)
         return mode, None
 
+    elif mode == WRITE_INDEX:
+        if len(log_file_names) != 1:
+            sys.exit("--index uses only one log file.")
+        if not write_index(log_file_name, plugin_dirs, 1):
+            sys.exit(1)
+        return mode, None
+
+    elif mode == PRUNE_CACHE:
+        if not cache_dir:
+            cache_dir = decodecache.DEFAULT_CACHE_DIR
+        num_removed = decodecache.Prune(cache_dir)
+        print "Removed %d files from %s" % (num_removed, cache_dir)
+        return mode, None
+
+    elif mode == COMPACT:
+        compact_log(args[0], args[1], plugin_dirs, force_logfile_overwrite,
+                index_after_build)
+        return mode, None
+
+    elif mode == BENCH_WRAPPER:
+        start_plugins_for_reading(plugin_dirs)
+        benchwrapper.bench(os.path.abspath(sys.argv[0]), log_file_env_var,
+                bench_jobs, use_collector)
+        return mode, None
+
     elif mode == BUILD:
         # Start a build
 
@@ -522,7 +847,7 @@ def start_top(log_file_env_var, config, site_dir):
         os.environ[log_file_env_var] = log_file_name
         instmake_build.initialize_environment(record_env_vars, record_open_fds,
             stop_cmd_contains, run_instrumentation, audit_env_options,
-            inst_depth)
+            inst_depth, job_sample_interval)
 
         # We've got to wrap *something*.
         if len(args) == 0:
@@ -558,8 +883,36 @@ def start_top(log_file_env_var, config, site_dir):
 
         # Run the job
         jobserver = instmake_build.InstmakeJobServer()
+        if use_collector:
+            collector = instmake_build.start_collector(log_file_name)
+        else:
+            collector = None
+        app_inst_dir = instmake_build.make_app_inst_dir()
+        if host_sample_interval:
+            sampler = hostsampler.HostSampler(log_file_name,
+                    host_sample_interval)
+            if not sampler.Start():
+                print >> sys.stderr, "instmake: can't start the host sampler"
+                sampler = None
+        else:
+            sampler = None
+
         rc = instmake_build.invoke_child(log_file_name, args)
+
+        if sampler:
+            sampler.Finish()
+        if app_inst_dir:
+            instmake_build.remove_app_inst_dir(app_inst_dir)
+        if collector:
+            collector.Finish()
         jobserver.Close()
+
+        # Index the finished log, so that reports can find records
+        # without reading the whole log. A failure to index the log
+        # doesn't change the result of the build.
+        if index_after_build:
+            write_index(log_file_name, plugin_dirs, 0)
+
         return mode, rc
 
     else:
@@ -7,11 +7,17 @@ from __future__ import nested_scopes
 import cPickle as pickle
 import sys
 import os
-import gzip
 import socket
+import types
+import array
+import marshal
+import shutil
+import struct
+import tempfile
 from instmakelib import instmake_toolnames
 from instmakelib import shellsyntax
 from instmakelib import instmake_build
+from instmakelib import logcodec
 
 # This is imported for backwards-compatibility for
 # using clearaudit data from LogRecord 5 - 11.
@@ -35,11 +41,101 @@ INSTMAKE_VERSION_12 = VERSION_ROOT + "12"
 INSTMAKE_VERSION_13 = VERSION_ROOT + "13"
 INSTMAKE_VERSION_14 = VERSION_ROOT + "14"
 INSTMAKE_VERSION_15 = VERSION_ROOT + "15"
+INSTMAKE_VERSION_16 = VERSION_ROOT + "16"
+INSTMAKE_VERSION_17 = VERSION_ROOT + "17"
+INSTMAKE_VERSION_18 = VERSION_ROOT + "18"
+INSTMAKE_VERSION_19 = VERSION_ROOT + "19"
+INSTMAKE_VERSION_20 = VERSION_ROOT + "20"
 
-LATEST_VERSION = INSTMAKE_VERSION_15
+# A log rewritten by "instmake --compact"
+COMPACT_VERSION_1 = "INSTMAKE COMPACT LOG VERSION 1"
+
+LATEST_VERSION = INSTMAKE_VERSION_20
 
 ORIGIN_NOT_RECORDED = "not-recorded"
 
+# The fields of the resource usage of a job (see getrusage(2)), in the
+# order of the tuple that is stored in the log. These are the keys
+# of the LogRecord 'rusage' dictionary.
+RUSAGE_FIELDS = [ "utime", "stime", "maxrss", "ixrss", "idrss", "isrss",
+    "minflt", "majflt", "nswap", "inblock", "oublock", "msgsnd", "msgrcv",
+    "nsignals", "nvcsw", "nivcsw" ]
+
+# The phases of instmake's own work for a job, in seconds of wall-clock
+# time, in the order of the tuple that is stored in the log. These are
+# the keys of the LogRecord 'overhead' dictionary.
+#   startup     Starting Python and instmake, until instmake starts
+#               to set up the job. Read from /proc, so it is only as
+#               precise as the clock ticks.
+#   setup       Setting up the job: the app-inst file, the audit plugin,
+#               the environment.
+#   finish      After the job ended, until the record was ready to be
+#               written: the audit plugin, the recorded variables, etc.
+#   wait        Connecting to the collector, or waiting for the
+#               jobserver token to write to the log.
+# Writing the record itself can't be counted in the record.
+OVERHEAD_FIELDS = [ "startup", "setup", "finish", "wait" ]
+
+# The fields of a sample of a job's processes, taken while the job ran
+# by "instmake --job-samples" (see jobsampler), in the order of the
+# tuple that is stored in the log. These are the keys of each
+# dictionary in the LogRecord 'job_samples' list.
+#   time        Seconds since the job started.
+#   rss         The resident memory of the processes, in KB.
+#   cpu         The user and sys CPU seconds of the processes, and of
+#               their children that they have waited for.
+#   procs       The number of processes.
+# The processes are the job's process and all its descendants.
+JOB_SAMPLE_FIELDS = [ "time", "rss", "cpu", "procs" ]
+
+# The classes of system calls whose time is recorded by the strace
+# audit plugin, with its "times" option (see syscall.time_class()).
+# These are the keys of a record's syscall_times:
+#   file        File I/O: open, stat, read, write, etc.
+#   spawn       Starting processes: fork, clone, exec, and waiting
+#               for children while none of them were running.
+#   other       All the other system calls.
+SYSCALL_TIME_FIELDS = [ "file", "spawn", "other" ]
+
+# From version 18, the log can have samples of the state of the host,
+# taken during the build by "instmake --host-samples" (see hostsampler),
+# between the records. The records are tuples; a host sample is a
+# dictionary with these keys:
+#   time        When the sample was taken.
+#   ncpus       The number of CPUs.
+#   loadavg     The 1-, 5- and 15-minute load averages.
+#   cpu         The jiffies that the CPUs have spent in each of the
+#               CPU_STATES since boot, from /proc/stat.
+#   meminfo     The MEMINFO_FIELDS of /proc/meminfo, in KB.
+#   pressure    For each of PRESSURE_RESOURCES, the total microseconds
+#               that "some" tasks and that "full"-ly all tasks were
+#               stalled waiting for it, from /proc/pressure.
+#   cpu_mhz     The average frequency of the CPUs.
+# A value that couldn't be read is None.
+HOST_SAMPLE_KEYS = [ "time", "ncpus", "loadavg", "cpu", "meminfo",
+    "pressure", "cpu_mhz" ]
+CPU_STATES = [ "user", "nice", "system", "idle", "iowait", "irq", "softirq",
+    "steal" ]
+MEMINFO_FIELDS = [ "MemTotal", "MemFree", "MemAvailable", "Buffers", "Cached",
+    "SwapTotal", "SwapFree", "Dirty", "Writeback" ]
+PRESSURE_RESOURCES = [ "cpu", "memory", "io" ]
+
+def is_host_sample(array):
+    """Is this item of the log a host sample, instead of a record?"""
+    return type(array) == types.DictType
+
+def is_snapshot(array):
+    """Is this item of the log a snapshot of a dictionary that records
+    refer to (see SNAPSHOT_TAG in instmake_build), instead of a record?"""
+    return type(array) == types.ListType
+
+# The sidecar index file that can accompany an instmake log
+INDEX_SUFFIX = ".imidx"
+INDEX_VERSION_1 = "INSTMAKE INDEX VERSION 1"
+
+# How many records LogFile.seek_pids() reads at a time
+SEEK_BATCH_SIZE = 1000
+
 CLI_PLUGIN_PREFIX = "cli"
 
 # These are the plugins needed during reporting
@@ -55,6 +151,17 @@ global_plugins = None
 # This points to a single Printer plugin
 global_printer = None
 
+# The number of processes that decode log records. With 1,
+# the records are decoded in this process.
+decode_jobs = 1
+
+# The directory of the decoded-record cache, or None to not use it
+decoded_cache_dir = None
+
+# The logs that are being replayed (see StartReplay).
+# Key = absolute name of the log file, Value = [(LogFile, arrays), ...]
+log_replays = {}
+
 def SetPlugins(plugins):
     """Allow another module to set our 'global_plugins' variable."""
     global global_plugins
@@ -73,6 +180,37 @@ def SetPrinterPlugin(printer):
     global_printer = printer
 
 
+def SetDecodeJobs(num_jobs):
+    """Set the number of processes that decode log records."""
+    global decode_jobs
+    decode_jobs = num_jobs
+
+
+def SetDecodedCache(cache_dir):
+    """Use the decoded-record cache in cache_dir, or not, if None."""
+    global decoded_cache_dir
+    decoded_cache_dir = cache_dir
+
+def StartReplay(log, arrays):
+    """Until StopReplay() is called, a LogFile that is opened on the
+    same file as 'log' returns the records made from 'arrays', the
+    records that were already read from 'log' with read_array(),
+    instead of decoding the log again. Random access (the index
+    look-ups) still reads the log file. This lets a report that opens
+    the log itself run after the log was read for other reports.
+    Replays of the same log nest."""
+    key = os.path.abspath(log.log_file_name)
+    log_replays.setdefault(key, []).append((log, arrays))
+
+def StopReplay(log):
+    """Stop the replay started by the last StartReplay() for 'log'."""
+    key = os.path.abspath(log.log_file_name)
+    replays = log_replays[key]
+    replays.pop()
+    if not replays:
+        del log_replays[key]
+
+
 def WriteLatestHeader(fd, log_file_name,
         audit_plugin_name, audit_env_options, audit_cli_options):
     """Write a header to the log file. We put the version string
@@ -94,6 +232,52 @@ def WriteLatestHeader(fd, log_file_name,
         sys.exit("Failed to write to %s: %s" % (log_file_name, err))
 
 
+class LazyAttribute(object):
+    """A LogRecord attribute whose value is computed the first time
+    it is used. The value is then stored in the record itself, which
+    hides this object from any later look-ups. This lets a report that
+    only looks at PIDs and times skip the expensive work, like running
+    the ToolName plugins or parsing the audit data."""
+
+    def __init__(self, compute):
+        self.compute = compute
+        self.name = compute.__name__
+        self.__doc__ = compute.__doc__
+
+    def __get__(self, rec, rec_class):
+        if rec is None:
+            return self
+        value = self.compute(rec)
+        rec.__dict__[self.name] = value
+        return value
+
+def audit_attribute(name):
+    """Returns a LazyAttribute for an attribute that is set by
+    parsing the audit data."""
+    def compute(rec):
+        rec.ParseAudit()
+        return rec.__dict__[name]
+    compute.__name__ = name
+    return LazyAttribute(compute)
+
+
+# The attributes that the audit plugins set.
+AUDIT_ATTRIBUTES = [ "input_files", "output_files", "execed_files",
+    "audit_ok", "failed_lookups", "syscall_times", "file_times",
+    "stated_files", "accessed_files", "unlinked_files", "made_dirs" ]
+
+# The attributes whose strings are shared through the log's string table.
+INTERNED_ATTRIBUTES = [ "cwd", "makefile_filename", "make_target", "tool" ]
+INTERNED_PATH_LISTS = [ "input_files", "output_files", "execed_files",
+    "stated_files", "accessed_files", "unlinked_files", "made_dirs" ]
+INTERNED_PATH_DICTS = [ "failed_lookups", "file_times" ]
+
+# The attributes that might be LazyAttributes, depending on the
+# version of the LogRecord.
+LAZY_ATTRIBUTES = [ "cmdline_args", "tool", "env_vars", "make_vars",
+    "make_var_origins", "app_inst", "rusage", "overhead", "job_samples" ] \
+    + AUDIT_ATTRIBUTES
+
 class LogRecord:
     ppid = None                 # Parent Process ID
     pid = None                  # Process ID
@@ -122,6 +306,24 @@ class LogRecord:
     audit_ok = None             # True/False: did the audit plugin succeed in
                                 # auditing this command?
 
+    failed_lookups = None       # Directories in which files were looked
+                                # for but not found, if an appropriate audit
+                                # plugin was used. Key = directory,
+                                # Value = (files, programs to exec)
+
+    syscall_times = None        # The time spent in system calls, by
+                                # SYSCALL_TIME_FIELDS, if an appropriate
+                                # audit plugin recorded the times.
+
+    file_times = None           # The time spent in file I/O, by file,
+                                # if an appropriate audit plugin recorded
+                                # the times.
+
+    stated_files = None         # Files stat()ed, access()ed and unlinked,
+    accessed_files = None       # and directories made, if an appropriate
+    unlinked_files = None       # audit plugin was used.
+    made_dirs = None
+
     env_vars = None             # Recorded environment-variables hash table.
     open_fds = None             # List of open file descriptors before the
                                 # command started.
@@ -135,6 +337,22 @@ class LogRecord:
                                 # could be empty, if the app wrote an
                                 # empty json dictionary.
 
+    rusage = None               # Resource usage of the job, as a dictionary
+                                # whose keys are RUSAGE_FIELDS. None for
+                                # instmake logs prior to 16, or if the job
+                                # was interrupted.
+
+    overhead = None             # Time spent by instmake itself for the job,
+                                # as a dictionary whose keys are
+                                # OVERHEAD_FIELDS. None for instmake logs
+                                # prior to 17, or for records added with -r.
+
+    job_samples = None          # Samples of the job's processes while it
+                                # ran, as a list of dictionaries whose keys
+                                # are JOB_SAMPLE_FIELDS, oldest first. None
+                                # for instmake logs prior to 19, or if the
+                                # build didn't use --job-samples.
+
     USER_TIME = None
     SYS_TIME = None
     REAL_TIME = None
@@ -151,6 +369,12 @@ class LogRecord:
     # use the LogHeader in their init() ?
     NEEDS_LOG_HEADER_IN_RECORD_INIT = False
 
+    # The string table (a dictionary) of the log that the record is from.
+    _strings = None
+
+    # The SnapshotTable of the log that the record is from.
+    _snapshots = None
+
     # Does the "real time" indicate clock time? Prior to version 15
     # of the log file, it did not, as the OS could use any arbitrary
     # point in time as the epoch. In version 15 of the log, we use
@@ -182,6 +406,90 @@ class LogRecord:
         record's data, even though you might think it does by its name."""
         return normalize_path(path, self.cwd)
 
+    def Intern(self, text):
+        """Return the copy of text that is in the log's string table."""
+        if self._strings == None or text == None:
+            return text
+        return self._strings.setdefault(text, text)
+
+    def InternList(self, texts):
+        """Intern a list (or tuple) of strings."""
+        if type(texts) == types.ListType:
+            return [self.Intern(text) for text in texts]
+        elif type(texts) == types.TupleType:
+            return tuple([self.Intern(text) for text in texts])
+        else:
+            return texts
+
+    def InternKeys(self, dictionary):
+        """Intern the keys of a dictionary."""
+        if type(dictionary) != types.DictType:
+            return dictionary
+        interned = {}
+        for (key, value) in dictionary.items():
+            interned[self.Intern(key)] = value
+        return interned
+
+    def InternStrings(self, strings):
+        """Use a string table for the strings that are repeated from
+        record to record, so that the records share them. The attributes
+        that are computed later are interned when they are computed."""
+        rec_dict = self.__dict__
+        rec_dict["_strings"] = strings
+        for name in INTERNED_ATTRIBUTES:
+            if rec_dict.has_key(name):
+                rec_dict[name] = self.Intern(rec_dict[name])
+        for name in INTERNED_PATH_LISTS:
+            if rec_dict.has_key(name):
+                rec_dict[name] = self.InternList(rec_dict[name])
+        for name in INTERNED_PATH_DICTS:
+            if rec_dict.has_key(name):
+                rec_dict[name] = self.InternKeys(rec_dict[name])
+
+    def ResolveSnapshot(self, value):
+        """Returns the value of a field that can refer to a snapshot
+        (see LogRecord_20)."""
+        return value
+
+    def ParseAudit(self):
+        """Parse the audit data, if it hasn't been parsed yet. The
+        audit-related attributes do this when they are first used."""
+        rec_dict = self.__dict__
+        if rec_dict.has_key("_audit_parsed"):
+            return
+        rec_dict["_audit_parsed"] = True
+
+        # The audit plugin may not set all of the attributes.
+        for name in AUDIT_ATTRIBUTES:
+            if not rec_dict.has_key(name):
+                rec_dict[name] = None
+
+        self.ParseAuditData()
+
+        for name in INTERNED_PATH_LISTS:
+            rec_dict[name] = self.InternList(rec_dict[name])
+        for name in INTERNED_PATH_DICTS:
+            rec_dict[name] = self.InternKeys(rec_dict[name])
+
+    def ParseAuditData(self):
+        """Sub-classes that have audit data override this."""
+        pass
+
+    def Materialize(self):
+        """Compute all the lazily-computed attributes now."""
+        for name in LAZY_ATTRIBUTES:
+            getattr(self, name)
+
+    def __getstate__(self):
+        # When a record is pickled (to be passed to another process),
+        # send the computed values, not the raw data.
+        self.Materialize()
+        state = self.__dict__.copy()
+        for name in ("_array", "_audit_plugin", "_strings", "_snapshots"):
+            if state.has_key(name):
+                del state[name]
+        return state
+
 class LogRecord_1(LogRecord):
     PARENT_PID = 0
     PID = 1
@@ -207,6 +515,10 @@ class LogRecord_1(LogRecord):
     CPU_TIME = CHILD_CPU_TIME
 
     def __init__(self, array):
+        # The raw record, for the attributes that are computed
+        # when they are first used.
+        self._array = array
+
         self.ppid = array[self.PARENT_PID]
         self.pid = array[self.PID]
         self.cwd = array[self.CWD]
@@ -230,13 +542,18 @@ class LogRecord_1(LogRecord):
             a shell script (i.e., no -c). Args are stored in an array.
         4. -r, from jmake, to store special records. args can be stored
             as an array.
+
+        cmdline_args is computed from the single string when it is
+        first used.
         """
 
         # Convert array of arguments to a single string.
         self.cmdline = ' '.join(args)
 
-        # Then split it on whitespace, but honor quotes.
-        self.cmdline_args  = shellsyntax.split_shell_cmdline(self.cmdline, 1)
+    @LazyAttribute
+    def cmdline_args(self):
+        # Split the command-line on whitespace, but honor quotes.
+        return shellsyntax.split_shell_cmdline(self.cmdline, 1)
 
     def CalculateDiffTimes(self):
         """In case the caller modifies start/end times and needs to re-calculate
@@ -276,9 +593,10 @@ class LogRecord_3(LogRecord_2):
     # even when reading a VERSION 3 log file; the new dynamically-generated
     # TOOL will override the TOOL field that was stored in the log.
 
-    def __init__(self, array):
-        LogRecord_2.__init__(self, array)
-        self.tool = toolname_manager.GetTool(self.cmdline_args, self.cwd)
+    @LazyAttribute
+    def tool(self):
+        return self.Intern(toolname_manager.GetTool(self.cmdline_args,
+            self.cwd))
 
 class LogRecord_4(LogRecord_2):
     """TOOL is no longer computed during the running of the build. Rather,
@@ -286,11 +604,13 @@ class LogRecord_4(LogRecord_2):
     for interesting ways of computing TOOL, esp. in the cases of
     interpreted languages in which you really want to know the name
     of the script and not the name of the interpretor."""
-    def __init__(self, array):
-        # Yes, we're a sub-class of version 2, not version 3, as
-        # we're giving up the idea of a "TOOL" that was stored at build-time.
-        LogRecord_2.__init__(self, array)
-        self.tool = toolname_manager.GetTool(self.cmdline_args, self.cwd)
+    # Yes, we're a sub-class of version 2, not version 3, as
+    # we're giving up the idea of a "TOOL" that was stored at build-time.
+
+    @LazyAttribute
+    def tool(self):
+        return self.Intern(toolname_manager.GetTool(self.cmdline_args,
+            self.cwd))
 
 class LogRecord_5(LogRecord_4):
     """Time tuples only contain one user and one sys time."""
@@ -322,12 +642,22 @@ class LogRecord_6(LogRecord_5):
     """Add dependency information from clearaudit."""
     CLEARCASE_CATCR = 11
 
-    def __init__(self, array):
-        LogRecord_5.__init__(self, array)
-
+    input_files = audit_attribute("input_files")
+    output_files = audit_attribute("output_files")
+    execed_files = audit_attribute("execed_files")
+    audit_ok = audit_attribute("audit_ok")
+    failed_lookups = audit_attribute("failed_lookups")
+    syscall_times = audit_attribute("syscall_times")
+    file_times = audit_attribute("file_times")
+    stated_files = audit_attribute("stated_files")
+    accessed_files = audit_attribute("accessed_files")
+    unlinked_files = audit_attribute("unlinked_files")
+    made_dirs = audit_attribute("made_dirs")
+
+    def ParseAuditData(self):
         # Don't do this if we're LogRecord_12 or above.
         if not self.HAS_LOG_HEADER:
-            catcr_data = array[self.CLEARCASE_CATCR]
+            catcr_data = self._array[self.CLEARCASE_CATCR]
             if catcr_data:
                 audit_clearaudit.ParseData(catcr_data, self)
 
@@ -336,9 +666,14 @@ class LogRecord_7(LogRecord_6):
     """Add user-requested recorded environment variables."""
     RECORD_ENV_VARS = 12
 
-    def __init__(self, array):
-        LogRecord_6.__init__(self, array)
-        self.env_vars = array[self.RECORD_ENV_VARS]
+    @LazyAttribute
+    def env_vars(self):
+        # An audit plugin can add to the environment variables,
+        # so parse the audit data too.
+        self.__dict__["env_vars"] = \
+                self.ResolveSnapshot(self._array[self.RECORD_ENV_VARS])
+        self.ParseAudit()
+        return self.__dict__["env_vars"]
 
 class LogRecord_8(LogRecord_7):
     """Add open filedescriptors."""
@@ -352,13 +687,25 @@ class LogRecord_9(LogRecord_8):
     """Add make variables."""
     RECORD_MAKE_VARS = 14
 
-    def __init__(self, array):
-        LogRecord_8.__init__(self, array)
-        self.make_vars = array[self.RECORD_MAKE_VARS]
-        self.make_var_origins = {}
+    def ParseMakeVars(self):
+        """Returns a tuple of dictionaries: (make_vars, make_var_origins)"""
+        make_vars = self.ResolveSnapshot(self._array[self.RECORD_MAKE_VARS])
+        make_var_origins = {}
+
+        for key in make_vars.keys():
+            make_var_origins[key] = ORIGIN_NOT_RECORDED
+
+        return make_vars, make_var_origins
+
+    @LazyAttribute
+    def make_vars(self):
+        (make_vars, self.__dict__["make_var_origins"]) = self.ParseMakeVars()
+        return make_vars
 
-        for key in self.make_vars.keys():
-            self.make_var_origins[key] = ORIGIN_NOT_RECORDED
+    @LazyAttribute
+    def make_var_origins(self):
+        (self.__dict__["make_vars"], make_var_origins) = self.ParseMakeVars()
+        return make_var_origins
 
 class LogRecord_10(LogRecord_9):
     """Remove diff-time from log; compute it at run-time."""
@@ -382,24 +729,21 @@ class LogRecord_11(LogRecord_10):
     string also has the makefile filename and line number in it,
     delimited by colons."""
 
-    def __init__(self, array):
-        # Instead of running LogRecord_10.__init__, which
-        # would call LogRecord_9.__init__, which would
-        # create an invalid self.make_var_origins,
-        # call the parts of LogRecord_10
-        # and LogRecord_9 __init__ that we need
-        LogRecord_8.__init__(self, array)
-        self.CalculateDiffTimes()
-
-        self.make_vars = {}
-        self.make_var_origins = {}
-        for varname, vartuple in array[self.RECORD_MAKE_VARS].items():
+    def ParseMakeVars(self):
+        """Returns a tuple of dictionaries: (make_vars, make_var_origins)"""
+        make_vars = {}
+        make_var_origins = {}
+        make_vars_data = \
+                self.ResolveSnapshot(self._array[self.RECORD_MAKE_VARS])
+        for varname, vartuple in make_vars_data.items():
             (value, origin) = vartuple
-            self.make_vars[varname] = value
+            make_vars[varname] = value
             if origin:
-                self.make_var_origins[varname] = origin
+                make_var_origins[varname] = origin
             else:
-                self.make_var_origins[varname] = ORIGIN_NOT_RECORDED
+                make_var_origins[varname] = ORIGIN_NOT_RECORDED
+
+        return make_vars, make_var_origins
 
 class LogRecord_12(LogRecord_11):
     """Clearaudit information is no longer fixed field in the log.
@@ -413,10 +757,15 @@ class LogRecord_12(LogRecord_11):
 
     def __init__(self, array, audit_plugin):
         LogRecord_11.__init__(self, array)
+        self._audit_plugin = audit_plugin
+
+    def AuditOptions(self):
+        return ""
 
-        if audit_plugin:
-            audit_data = array[self.AUDIT_DATA]
-            audit_plugin.ParseData(audit_data, self, "")
+    def ParseAuditData(self):
+        if self._audit_plugin:
+            audit_data = self.ResolveSnapshot(self._array[self.AUDIT_DATA])
+            self._audit_plugin.ParseData(audit_data, self, self.AuditOptions())
 
 
 class LogRecord_13(LogRecord_12):
@@ -427,25 +776,20 @@ class LogRecord_13(LogRecord_12):
     NEEDS_LOG_HEADER_IN_RECORD_INIT = True
 
     def __init__(self, array, audit_plugin, log_hdr):
-        # Call LogRecord_11, and skip LogRecord_12 so we can
-        # call ParseData the way we want to.
-        LogRecord_11.__init__(self, array)
+        LogRecord_12.__init__(self, array, audit_plugin)
+        self._audit_options = log_hdr.audit_env_options
 
-        if audit_plugin:
-            audit_data = array[self.AUDIT_DATA]
-            audit_plugin.ParseData(audit_data, self, log_hdr.audit_env_options)
+    def AuditOptions(self):
+        return self._audit_options
 
 class LogRecord_14(LogRecord_13):
     """Add app_inst dictionary."""
 
     APP_INST = 14
 
-    def __init__(self, array, audit_plugin, log_hdr):
-        # Call LogRecord_11, and skip LogRecord_12 so we can
-        # call ParseData the way we want to.
-        LogRecord_13.__init__(self, array, audit_plugin, log_hdr)
-
-        self.app_inst = array[self.APP_INST]
+    @LazyAttribute
+    def app_inst(self):
+        return self._array[self.APP_INST]
 
 
 class LogRecord_15(LogRecord_14):
@@ -457,6 +801,91 @@ class LogRecord_15(LogRecord_14):
 
     REAL_TIME_IS_CLOCK_TIME = True
 
+class LogRecord_16(LogRecord_15):
+    """Add the resource usage of the job, from wait4(). The user and
+    sys times come from it too, so they are no longer rounded to
+    clock ticks."""
+
+    RUSAGE = 15
+
+    @LazyAttribute
+    def rusage(self):
+        return named_dict(RUSAGE_FIELDS, self._array[self.RUSAGE])
+
+class LogRecord_17(LogRecord_16):
+    """Add the overhead of instmake itself for the job."""
+
+    OVERHEAD = 16
+
+    @LazyAttribute
+    def overhead(self):
+        return named_dict(OVERHEAD_FIELDS, self._array[self.OVERHEAD])
+
+class LogRecord_18(LogRecord_17):
+    # No change in the record layout, but the log can have host
+    # samples between the records (see HOST_SAMPLE_KEYS).
+    pass
+
+class LogRecord_19(LogRecord_18):
+    """Add the samples of the job's processes."""
+
+    JOB_SAMPLES = 17
+
+    @LazyAttribute
+    def job_samples(self):
+        return named_dicts(JOB_SAMPLE_FIELDS, self._array[self.JOB_SAMPLES])
+
+class LogRecord_20(LogRecord_19):
+    """The recorded environment variables and make variables, and the
+    audit data, can refer to snapshots (see SNAPSHOT_TAG in
+    instmake_build). No change in the record layout."""
+
+    def ResolveSnapshot(self, value):
+        if type(value) != types.TupleType or len(value) != 3 or \
+                value[0] != instmake_build.SNAPSHOT_TAG:
+            return value
+
+        (tag, key, extra) = value
+        snapshot = None
+        if self._snapshots:
+            snapshot = self._snapshots.Get(key)
+        # Each record gets its own copy, which the audit plugin
+        # can add to.
+        if snapshot == None:
+            print >> sys.stderr, "instmake: snapshot %s of record %s " \
+                    "is not in the log" % (key, self.pid)
+            dictionary = {}
+        else:
+            dictionary = snapshot.copy()
+        dictionary.update(extra)
+        return dictionary
+
+def named_dict(names, values):
+    """Returns the dictionary for a tuple of values which is stored in
+    the log, given the names of its fields. The tuple may be None."""
+    if values == None:
+        return None
+    return dict(zip(names, values))
+
+def named_tuple(names, dictionary):
+    """The opposite of named_dict()."""
+    if dictionary == None:
+        return None
+    return tuple([dictionary[name] for name in names])
+
+def named_dicts(names, series):
+    """Returns the list of dictionaries for a tuple of tuples of
+    values which is stored in the log. The tuple may be None."""
+    if series == None:
+        return None
+    return [dict(zip(names, values)) for values in series]
+
+def named_tuples(names, dictionaries):
+    """The opposite of named_dicts()."""
+    if dictionaries == None:
+        return None
+    return tuple([named_tuple(names, dictionary)
+        for dictionary in dictionaries])
 
 record_version_map = {
     INSTMAKE_VERSION_1 : LogRecord_1,
@@ -474,8 +903,321 @@ record_version_map = {
     INSTMAKE_VERSION_13 : LogRecord_13,
     INSTMAKE_VERSION_14 : LogRecord_14,
     INSTMAKE_VERSION_15 : LogRecord_15,
+    INSTMAKE_VERSION_16 : LogRecord_16,
+    INSTMAKE_VERSION_17 : LogRecord_17,
+    INSTMAKE_VERSION_18 : LogRecord_18,
+    INSTMAKE_VERSION_19 : LogRecord_19,
+    INSTMAKE_VERSION_20 : LogRecord_20,
 }
 
+# The fields of a record in a compact log (see write_compact_log).
+# The tool isn't stored, as it is computed by the ToolName plugins
+# when the log is read, as for any other log. Nor are the diff_times
+# of the versions that compute them from the start and end times.
+# Fields are only added at the end; the records of older compact logs
+# don't have them.
+COMPACT_LOG_FIELDS = [ "ppid", "pid", "cwd", "retval", "times_start",
+    "times_end", "diff_times", "cmdline", "make_target",
+    "makefile_filename", "makefile_lineno", "input_files", "output_files",
+    "execed_files", "audit_ok", "env_vars", "open_fds", "make_vars",
+    "make_var_origins", "app_inst", "rusage", "overhead", "job_samples",
+    "failed_lookups", "syscall_times", "file_times", "stated_files",
+    "accessed_files", "unlinked_files", "made_dirs" ]
+
+# How each field is stored
+COMPACT_LOG_STRING_FIELDS = [ "ppid", "cwd", "make_target",
+    "makefile_filename" ]
+COMPACT_LOG_LIST_FIELDS = INTERNED_PATH_LISTS
+COMPACT_LOG_DICT_FIELDS = [ "env_vars", "make_vars", "make_var_origins" ]
+
+# The fields that are dictionaries with fixed keys, stored as tuples
+# of their values, as in the log. Key = field, Value = the names.
+COMPACT_LOG_NAMED_FIELDS = {
+    "rusage" : RUSAGE_FIELDS,
+    "overhead" : OVERHEAD_FIELDS,
+    "syscall_times" : SYSCALL_TIME_FIELDS,
+}
+
+# The fields that are lists of such dictionaries, stored as tuples of
+# tuples, as in the log.
+COMPACT_LOG_SERIES_FIELDS = {
+    "job_samples" : JOB_SAMPLE_FIELDS,
+}
+
+def compact_log_indices(names):
+    return [COMPACT_LOG_FIELDS.index(name) for name in names]
+
+COMPACT_LOG_STRING_INDICES = compact_log_indices(COMPACT_LOG_STRING_FIELDS)
+COMPACT_LOG_LIST_INDICES = compact_log_indices(COMPACT_LOG_LIST_FIELDS)
+COMPACT_LOG_DICT_INDICES = compact_log_indices(COMPACT_LOG_DICT_FIELDS)
+COMPACT_LOG_NAMED_INDICES = [(COMPACT_LOG_FIELDS.index(name), names)
+    for (name, names) in COMPACT_LOG_NAMED_FIELDS.items()]
+COMPACT_LOG_SERIES_INDICES = [(COMPACT_LOG_FIELDS.index(name), names)
+    for (name, names) in COMPACT_LOG_SERIES_FIELDS.items()]
+
+# Each frame in a compact log is the length of the data, then the data
+COMPACT_FRAME_FORMAT = "<I"
+COMPACT_FRAME_SIZE = struct.calcsize(COMPACT_FRAME_FORMAT)
+
+def read_compact_frame(fh):
+    """Read a frame from a compact log and unmarshal its data.
+    Raises EOFError at the end of the log."""
+    size_text = fh.read(COMPACT_FRAME_SIZE)
+    if not size_text:
+        raise EOFError
+    if len(size_text) != COMPACT_FRAME_SIZE:
+        raise ValueError("truncated frame")
+
+    (size,) = struct.unpack(COMPACT_FRAME_FORMAT, size_text)
+    data = fh.read(size)
+    if len(data) != size:
+        raise ValueError("truncated frame")
+    return marshal.loads(data)
+
+def compact_frame(value):
+    """Returns the frame for a value, to be written to a compact log."""
+    data = marshal.dumps(value, 2)
+    return struct.pack(COMPACT_FRAME_FORMAT, len(data)) + data
+
+
+class CompactLogWriter:
+    """Encodes records for a compact log. The strings that repeat from
+    record to record (the directories, the makefiles, the file names
+    from the audit plugin, the environment and make variables) are
+    stored once, in the string table, and the records refer to them by
+    their number in the table. Number 0 is None.
+
+    The lists of strings and dictionaries of strings are stored as
+    tuples of string numbers; a dictionary as key, value, key, value...
+    An empty dictionary, which most records have, is stored as False,
+    which marshals to a single byte. A value that is not like that is
+    stored as-is, in a 1-item list."""
+
+    def __init__(self):
+        self.strings = [None]
+        self.string_ids = {(types.NoneType, None) : 0}
+
+    def StringId(self, text):
+        # The type is part of the key, as "a" == u"a"
+        key = (type(text), text)
+        string_id = self.string_ids.get(key)
+        if string_id == None:
+            string_id = len(self.strings)
+            self.strings.append(text)
+            self.string_ids[key] = string_id
+        return string_id
+
+    def EncodeList(self, texts):
+        if texts == None:
+            return None
+        if type(texts) == types.ListType:
+            for text in texts:
+                if type(text) != types.StringType:
+                    break
+            else:
+                return tuple([self.StringId(text) for text in texts])
+        return [texts]
+
+    def EncodeDict(self, dictionary):
+        if dictionary == None:
+            return None
+        if type(dictionary) == types.DictType:
+            if not dictionary:
+                return False
+            ids = []
+            for (key, value) in dictionary.items():
+                if type(key) != types.StringType or \
+                        type(value) != types.StringType:
+                    break
+                ids.append(self.StringId(key))
+                ids.append(self.StringId(value))
+            else:
+                return tuple(ids)
+        return [dictionary]
+
+    def EncodeRecord(self, rec):
+        """Returns the frame for a LogRecord."""
+        values = []
+        for name in COMPACT_LOG_FIELDS:
+            value = getattr(rec, name)
+            if name == "diff_times" and rec.DIFF_TIMES == None:
+                value = None
+            elif name in COMPACT_LOG_STRING_FIELDS:
+                value = self.StringId(value)
+            elif name in COMPACT_LOG_LIST_FIELDS:
+                value = self.EncodeList(value)
+            elif name in COMPACT_LOG_DICT_FIELDS:
+                value = self.EncodeDict(value)
+            elif COMPACT_LOG_NAMED_FIELDS.has_key(name):
+                value = named_tuple(COMPACT_LOG_NAMED_FIELDS[name], value)
+            elif COMPACT_LOG_SERIES_FIELDS.has_key(name):
+                value = named_tuples(COMPACT_LOG_SERIES_FIELDS[name], value)
+            values.append(value)
+        return compact_frame(tuple(values))
+
+    def StringTableFrame(self):
+        return compact_frame(tuple(self.strings))
+
+
+def decode_compact_array(array, strings):
+    """Returns the values of the COMPACT_LOG_FIELDS of a record from
+    a compact log, given the string table."""
+    values = list(array)
+    values.extend([None] * (len(COMPACT_LOG_FIELDS) - len(values)))
+    for i in COMPACT_LOG_STRING_INDICES:
+        values[i] = strings[values[i]]
+
+    for i in COMPACT_LOG_LIST_INDICES:
+        ids = values[i]
+        if ids == None:
+            pass
+        elif type(ids) == types.TupleType:
+            values[i] = [strings[string_id] for string_id in ids]
+        else:
+            values[i] = ids[0]
+
+    for i in COMPACT_LOG_DICT_INDICES:
+        ids = values[i]
+        if ids == None:
+            pass
+        elif type(ids) == types.TupleType:
+            texts = [strings[string_id] for string_id in ids]
+            values[i] = dict(zip(texts[0::2], texts[1::2]))
+        elif ids == False:
+            values[i] = {}
+        else:
+            values[i] = ids[0]
+
+    for (i, names) in COMPACT_LOG_NAMED_INDICES:
+        values[i] = named_dict(names, values[i])
+    for (i, names) in COMPACT_LOG_SERIES_INDICES:
+        values[i] = named_dicts(names, values[i])
+    return values
+
+
+class CompactLogRecord:
+    """The record of a compact log. A class is made for each version
+    of the original log, with this class and the record class of
+    the original log as its base classes, so the record looks exactly
+    like a record of the original log; see compact_log_record_class().
+    All the fields, including the audit data, are already decoded."""
+
+    def __init__(self, array, strings, string_dict):
+        rec_dict = self.__dict__
+        rec_dict.update(zip(COMPACT_LOG_FIELDS,
+            decode_compact_array(array, strings)))
+        rec_dict["_audit_parsed"] = True
+        rec_dict["_strings"] = string_dict
+        if self.DIFF_TIMES == None:
+            self.CalculateDiffTimes()
+
+def compact_log_record_class(record_version):
+    """Returns the class for the records of a compact log whose
+    original log had the given version. The class is kept in this
+    module, so that its records can be pickled."""
+    name = "CompactLogRecord_" + record_version[len(VERSION_ROOT):]
+    module_dict = globals()
+    if not module_dict.has_key(name):
+        module_dict[name] = types.ClassType(name,
+                (CompactLogRecord, record_version_map[record_version]),
+                {"__module__" : __name__})
+    return module_dict[name]
+
+# The fields of a LogRecord that a CompactRecord keeps only when
+# asked to keep the details.
+COMPACT_DETAIL_FIELDS = [ "input_files", "output_files", "execed_files",
+    "audit_ok", "env_vars", "open_fds", "make_vars", "make_var_origins",
+    "app_inst", "rusage", "overhead", "job_samples", "failed_lookups",
+    "syscall_times", "file_times", "stated_files", "accessed_files",
+    "unlinked_files", "made_dirs" ]
+
+class CompactRecord(object):
+    """A copy of a LogRecord which uses much less memory, for reports
+    which keep all the records in memory. It has no per-instance
+    dictionary, the times are packed into a single array of doubles,
+    and the common strings are shared through the log's string table.
+    The time tuples are always (USER, SYS, REAL) for the start and end
+    times, and (USER, SYS, REAL, CPU) for the diff times, no matter the
+    version of the log.
+
+    The heavy fields (audit data, environment and make variables, etc.)
+    are kept only if 'details' is true; otherwise they are None.
+    cmdline_args is computed from cmdline each time it is used.
+    """
+
+    __slots__ = [ "ppid", "pid", "cwd", "retval", "_times", "cmdline",
+        "make_target", "makefile_filename", "makefile_lineno", "tool",
+        "REAL_TIME_IS_CLOCK_TIME" ] + COMPACT_DETAIL_FIELDS
+
+    # Time-tuple indices
+    USER_TIME = 0
+    SYS_TIME = 1
+    REAL_TIME = 2
+    CPU_TIME = 3
+
+    # Offsets into _times
+    _START = 0
+    _END = 3
+    _DIFF = 6
+
+    TimeIndex = LogRecord.TimeIndex.im_func
+    RealStartTime = LogRecord.RealStartTime.im_func
+    NormalizePath = LogRecord.NormalizePath.im_func
+
+    def __init__(self, rec, details=False):
+        self.ppid = rec.ppid
+        self.pid = rec.pid
+        self.cwd = rec.Intern(rec.cwd)
+        self.retval = rec.retval
+        self.cmdline = rec.cmdline
+        self.make_target = rec.make_target
+        self.makefile_filename = rec.Intern(rec.makefile_filename)
+        self.makefile_lineno = rec.makefile_lineno
+        self.tool = rec.Intern(rec.tool)
+        self.REAL_TIME_IS_CLOCK_TIME = rec.REAL_TIME_IS_CLOCK_TIME
+
+        # Older logs have more fields in the time tuples; keep only
+        # the ones that the LogRecord uses.
+        start = rec.times_start
+        end = rec.times_end
+        diff = rec.diff_times
+        self._times = array.array("d", (
+            start[rec.USER_TIME], start[rec.SYS_TIME], start[rec.REAL_TIME],
+            end[rec.USER_TIME], end[rec.SYS_TIME], end[rec.REAL_TIME],
+            diff[rec.USER_TIME], diff[rec.SYS_TIME], diff[rec.REAL_TIME],
+            diff[rec.CPU_TIME]))
+
+        for name in COMPACT_DETAIL_FIELDS:
+            if details:
+                setattr(self, name, getattr(rec, name))
+            else:
+                setattr(self, name, None)
+
+    def _get_times_start(self):
+        return tuple(self._times[self._START:self._END])
+    times_start = property(_get_times_start)
+
+    def _get_times_end(self):
+        return tuple(self._times[self._END:self._DIFF])
+    times_end = property(_get_times_end)
+
+    def _get_diff_times(self):
+        return tuple(self._times[self._DIFF:])
+    diff_times = property(_get_diff_times)
+
+    def _get_cmdline_args(self):
+        return shellsyntax.split_shell_cmdline(self.cmdline, 1)
+    cmdline_args = property(_get_cmdline_args)
+
+    def DiffTime(self, time_index):
+        """Return one of the diff times, without creating a tuple."""
+        return self._times[self._DIFF + time_index]
+
+    def StartTime(self, time_index):
+        """Return one of the start times, without creating a tuple."""
+        return self._times[self._START + time_index]
+
+
 # LogHeaders are versioned differently from LogRecords
 class LogHeader1:
     def __init__(self, audit_name, audit_env_options, audit_cli_options):
@@ -504,6 +1246,191 @@ class LogHeader1:
         print "Audit CLI Options: ", self.audit_cli_options
         print "Instmake Command:  ", ' '.join(self.instmake_command)
 
+class LogIndex:
+    """The sidecar index of an instmake log. For each record in the
+    log, it holds the offset of the record in the (uncompressed) log
+    stream, plus some secondary keys, so that records can be found
+    without unpickling every record in the log. Like the log records,
+    the index is stored on disk as plain Python data types."""
+
+    # The fields in each index entry
+    OFFSET = 0
+    PID = 1
+    PPID = 2
+    REAL_START = 3
+    REAL_END = 4
+    TOOL = 5
+    CWD = 6
+
+    def __init__(self, log_size, log_mtime, entries):
+        self.log_size = log_size
+        self.log_mtime = log_mtime
+        self.entries = entries
+
+        # Key = PID, Value = [entries]
+        self.by_pid = {}
+        # Key = PPID, Value = [entries]
+        self.by_ppid = {}
+
+        for entry in entries:
+            self.by_pid.setdefault(entry[self.PID], []).append(entry)
+            self.by_ppid.setdefault(entry[self.PPID], []).append(entry)
+
+    def Entries(self):
+        return self.entries
+
+    def EntriesForPID(self, pid):
+        return self.by_pid.get(pid, [])
+
+    def EntriesForPPID(self, ppid):
+        return self.by_ppid.get(ppid, [])
+
+    def EntriesBetween(self, time_start, time_end):
+        """Returns the entries whose real run time overlaps
+        the time_start - time_end interval."""
+        return [entry for entry in self.entries
+                if entry[self.REAL_START] <= time_end and
+                entry[self.REAL_END] >= time_start]
+
+    def Describes(self, log_file_name):
+        """Does this index describe the log as it is on disk now?"""
+        try:
+            stat_info = os.stat(log_file_name)
+        except OSError:
+            return False
+        return stat_info.st_size == self.log_size and \
+                stat_info.st_mtime == self.log_mtime
+
+    def Write(self, index_file_name):
+        """Write the index to disk. Can raise IOError or OSError."""
+        data = (INDEX_VERSION_1, self.log_size, self.log_mtime, self.entries)
+
+        # Write to a temporary file and rename it, so that a reader
+        # never sees a partially-written index.
+        tmp_file_name = index_file_name + ".tmp"
+        fh = open(tmp_file_name, "wb")
+        try:
+            pickle.dump(data, fh, 2)
+        finally:
+            fh.close()
+        os.rename(tmp_file_name, index_file_name)
+
+
+def index_file_name(log_file_name):
+    """Return the name of the sidecar index file for a log."""
+    return log_file_name + INDEX_SUFFIX
+
+def read_index(log_file_name):
+    """Read the sidecar index for a log. Returns a LogIndex object,
+    or None if there is no index, or if the index is out-of-date."""
+    try:
+        fh = open(index_file_name(log_file_name), "rb")
+    except IOError:
+        return None
+
+    try:
+        try:
+            data = pickle.load(fh)
+        except (EOFError, ValueError, pickle.UnpicklingError):
+            return None
+    finally:
+        fh.close()
+
+    if type(data) != types.TupleType or len(data) != 4 or \
+            data[0] != INDEX_VERSION_1:
+        return None
+
+    (version, log_size, log_mtime, entries) = data
+    index = LogIndex(log_size, log_mtime, entries)
+    if not index.Describes(log_file_name):
+        return None
+
+    return index
+
+def WriteIndex(log_file_name):
+    """Create the sidecar index for a log. Returns the number of
+    records in the index. Can raise IOError or OSError when
+    writing the index."""
+    log = LogFile(log_file_name)
+    index = log.BuildIndex()
+    log.close()
+    index.Write(index_file_name(log_file_name))
+    return len(index.Entries())
+
+def write_compact_log(in_file_name, out_file_name):
+    """Rewrite a log of any version as a compact log. Returns the
+    number of records. Can raise IOError or OSError when writing the
+    compact log.
+
+    A compact log starts with the pickled version string, like any
+    other log. The rest of the log is frames (see compact_frame):
+    the version of the original log and its pickled LogHeader,
+    the string table, and then the records."""
+    log = LogFile(in_file_name)
+    writer = CompactLogWriter()
+
+    # All the strings must be known before the first record is written,
+    # so the records go to a temporary file until then, in the directory
+    # of the compact log, which has room for them.
+    frames_fh = tempfile.TemporaryFile(
+            dir=os.path.dirname(os.path.abspath(out_file_name)))
+    try:
+        num_records = 0
+        while 1:
+            try:
+                rec = log.read_record()
+            except EOFError:
+                break
+            frames_fh.write(writer.EncodeRecord(rec))
+            num_records += 1
+
+        # The host samples are kept as they are, after the records.
+        for sample in log.HostSamples():
+            frames_fh.write(compact_frame(sample))
+        log.close()
+
+        fh = open(out_file_name, "wb")
+        try:
+            fh.write(pickle.dumps(COMPACT_VERSION_1, 0))
+            fh.write(compact_frame((log.original_version,
+                pickle.dumps(log.hdr))))
+            fh.write(writer.StringTableFrame())
+            frames_fh.seek(0)
+            shutil.copyfileobj(frames_fh, fh)
+        finally:
+            fh.close()
+    finally:
+        frames_fh.close()
+
+    return num_records
+
+
+class SnapshotTable:
+    """The snapshots of a log, by key. They are added as the log is
+    read, before the records that refer to them. A record that is read
+    out of order, through the index or in a decoding process, can refer
+    to a snapshot that hasn't been read; then the whole log is scanned
+    for the snapshots, once."""
+
+    def __init__(self, log):
+        self.log = log
+        self.snapshots = {}
+        self.scanned = False
+
+    def Add(self, item):
+        (key, snapshot) = item
+        self.snapshots[key] = snapshot
+
+    def Get(self, key):
+        """Returns a snapshot, or None if it is not in the log."""
+        snapshot = self.snapshots.get(key)
+        if snapshot == None and not self.scanned:
+            self.scanned = True
+            self.log.ScanSnapshots(self)
+            snapshot = self.snapshots.get(key)
+        return snapshot
+
+
 class LogFile:
     def __init__(self, log_file_name):
         try:
@@ -511,45 +1438,78 @@ class LogFile:
         except IOError, err:
             sys.exit("Cannot open %s: %s" % (log_file_name, err))
 
+        self.log_file_name = log_file_name
         self.orig_fh = None
+        self.index = None
+        self.record_pool = None
 
-        # Try to use gzip in case this is a gzipped file
-        try:
-            gzip_fh = gzip.GzipFile(None, None, None, self.fh)
-            try:
-                # See if we can read from the gzip object.
-                self.record_version = self.read_allow_exceptions(gzip_fh)
-                # Good; it worked. Use the gzip filehandle.
-                self.orig_fh = self.fh
-                self.orig_size = os.path.getsize(log_file_name)
-                self.fh = gzip_fh
-
-            except IOError:
-                # Not gzipped; use original filehandle
-                self.fh.seek(0)
-                self.record_version = self.read()
-        except:
-            # Gzip module failed for some reason;
-            # use original filehandle
-            self.fh.seek(0)
-            self.record_version = self.read()
+        # The string table that the records share.
+        self.strings = {}
+
+        # The snapshots that the records refer to
+        self.snapshots = SnapshotTable(self)
+
+        # Is this a log written by "instmake --compact"?
+        self.compact = False
+
+        # The function that unpickles a record from a filehandle
+        self.unpickle = pickle.load
+
+        # Is the log compressed?
+        codec = logcodec.detect_codec(self.fh)
+        if codec:
+            if not codec.Available():
+                sys.exit("%s is compressed with %s, which is not supported "
+                        "by this Python." % (log_file_name, codec.name))
+            self.orig_fh = self.fh
+            self.fh = logcodec.DecompressedStream(self.orig_fh, codec)
+            self.unpickle = logcodec.load_pickle
+
+        self.record_version = self.read()
+
+        # The version of the log that a compact log was made from
+        self.original_version = self.record_version
+
+        if self.record_version == COMPACT_VERSION_1:
+            self.compact = True
+            (self.original_version, hdr_text) = self.read()
+            self.hdr = pickle.loads(hdr_text)
+            self.compact_strings = self.read()
+            for text in self.compact_strings:
+                self.strings[text] = text
 
         # Read the log header if there
-        if record_version_map.has_key(self.record_version):
-            self.RecordClass = record_version_map[self.record_version]
-        else:
+        if not record_version_map.has_key(self.original_version):
             sys.exit("The file format is not supported: %s" % \
-                    (self.record_version,))
+                    (self.original_version,))
+        elif self.compact:
+            self.RecordClass = compact_log_record_class(self.original_version)
+        else:
+            self.RecordClass = record_version_map[self.record_version]
 
-        if self.RecordClass.HAS_LOG_HEADER:
+        # The fields of the record array to intern. The record keeps
+        # the array, so it must refer to the shared strings, too.
+        self.interned_fields = []
+        if not self.compact:
+            for name in ("CWD", "MAKE_TARGET", "MAKEFILE_FILENAME"):
+                field = getattr(self.RecordClass, name, None)
+                if field != None:
+                    self.interned_fields.append(field)
+
+        if self.compact:
+            # Already read
+            pass
+        elif self.RecordClass.HAS_LOG_HEADER:
             self.hdr = self.read()
         else:
             self.hdr = None
 
         if global_printer:
             self.RecordClass.Print = global_printer.Print
+            CompactRecord.Print = global_printer.Print
 
-        if self.hdr and self.hdr.AuditPluginName():
+        # The records of a compact log have their audit data parsed.
+        if self.hdr and self.hdr.AuditPluginName() and not self.compact:
             try:
                 self.audit_plugin = global_plugins.LoadPlugin( \
                         instmake_build.AUDIT_PLUGIN_PREFIX,
@@ -560,6 +1520,26 @@ class LogFile:
         else:
             self.audit_plugin = None
 
+        # Where the records start, after the version and the header.
+        self.records_offset = self.fh.tell()
+
+        # The records to replay, if the log is being replayed. The
+        # records share the strings and snapshots of the replayed log.
+        self.replay = None
+        replays = log_replays.get(os.path.abspath(log_file_name))
+        if replays:
+            (replayed_log, arrays) = replays[-1]
+            self.replay = iter(arrays)
+            self.strings = replayed_log.strings
+            self.snapshots = replayed_log.snapshots
+
+        if decoded_cache_dir and self.replay == None:
+            from instmakelib import decodecache
+            self.decoded_cache = decodecache.DecodedCache(decoded_cache_dir,
+                    self)
+        else:
+            self.decoded_cache = None
+
     def RecordVersion(self):
         return self.record_version
 
@@ -567,47 +1547,271 @@ class LogFile:
         """Returns the LogHeader object, or None."""
         return self.hdr
 
-    def read_allow_exceptions(self, fh):
-        return pickle.load(fh)
+    def load(self, fh):
+        """Read a single record from a filehandle of the log. Records
+        are pickled, except in compact logs."""
+        if self.compact:
+            return read_compact_frame(fh)
+        else:
+            return self.unpickle(fh)
 
     def read(self):
         """Read a single pickled record and unpickle it."""
         try:
-            return pickle.load(self.fh)
+            return self.load(self.fh)
         except ValueError, err:
             sys.exit("Could not read pickled data from log file:\n%s" \
                 % (err,))
         except pickle.UnpicklingError, err:
-            # Unfortunately the gzip object doesn't raise EOFError when
-            # EOF is reached. So, we see if the original filehandle is
-            # at the end of the file, and if so, raise EOFError.
-            if self.orig_fh and self.orig_fh.tell() == self.orig_size:
-                raise EOFError
-
             sys.exit("Could not read pickled data from log file:\n%s" \
                 % (err,))
 
-    def read_record(self):
+    def read_array(self):
+        """Read the next record and unpickle it, skipping any
+        host samples, and keeping any snapshots."""
         array = self.read()
+        while is_host_sample(array) or is_snapshot(array):
+            if is_snapshot(array):
+                self.snapshots.Add(array)
+            array = self.read()
+        return array
+
+    def read_record(self):
+        cache = self.decoded_cache
+        if cache and cache.Reading():
+            return cache.read_record()
+
+        try:
+            rec = self.decode_record()
+        except EOFError:
+            if cache and cache.Writing():
+                cache.finish()
+            raise
+
+        if cache and cache.Writing():
+            cache.add_record(rec)
+        return rec
+
+    def decode_record(self):
+        if self.replay != None:
+            try:
+                array = self.replay.next()
+            except StopIteration:
+                raise EOFError
+            return self.make_record(array, self.audit_plugin)
+
+        if decode_jobs > 1:
+            if not self.record_pool:
+                from instmakelib import logpool
+                self.record_pool = logpool.RecordPool(self, decode_jobs)
+            return self.record_pool.read_record()
+
+        return self.make_record(self.read_array(), self.audit_plugin)
+
+    def CanReduce(self):
+        """Can the records be given to a report consumer in the
+        decoding processes (see reduce_records)? Not with only one
+        process, or when the records are replayed or cached."""
+        return decode_jobs > 1 and self.replay == None and \
+                self.decoded_cache == None and self.record_pool == None
+
+    def reduce_records(self, consumer):
+        """Give the rest of the records to copies of a report consumer
+        in the decoding processes, and merge the copies into the
+        consumer (see reportstream), so that only the results of
+        the copies are sent back."""
+        from instmakelib import logpool
+        self.record_pool = logpool.RecordPool(self, decode_jobs, consumer)
+        self.record_pool.Reduce()
+
+    def make_record(self, array, audit_plugin):
+        """Create a LogRecord object from an unpickled record."""
+        if self.compact:
+            return self.RecordClass(array, self.compact_strings, self.strings)
+
+        array = list(array)
+        strings = self.strings
+        for field in self.interned_fields:
+            text = array[field]
+            if text != None:
+                array[field] = strings.setdefault(text, text)
 
         if self.RecordClass.NEEDS_LOG_HEADER_IN_RECORD_INIT:
-            return self.RecordClass(array, self.audit_plugin, self.hdr)
-        if self.RecordClass.HAS_VARIABLE_AUDIT_PLUGINS:
-            return self.RecordClass(array, self.audit_plugin)
+            rec = self.RecordClass(array, audit_plugin, self.hdr)
+        elif self.RecordClass.HAS_VARIABLE_AUDIT_PLUGINS:
+            rec = self.RecordClass(array, audit_plugin)
         else:
-            return self.RecordClass(array)
+            rec = self.RecordClass(array)
+
+        rec.InternStrings(self.strings)
+        rec.__dict__["_snapshots"] = self.snapshots
+        return rec
+
+    def BuildIndex(self):
+        """Read the records from the current position to the end
+        of the log, and return a LogIndex for them. The audit plugin
+        is not used, as the index doesn't need the audit data."""
+        entries = []
+        while 1:
+            offset = self.fh.tell()
+            try:
+                array = self.read()
+            except EOFError:
+                break
+
+            # The offset must be the record's, not a host sample's.
+            if is_host_sample(array):
+                continue
+            elif is_snapshot(array):
+                self.snapshots.Add(array)
+                continue
+            rec = self.make_record(array, None)
+
+            entries.append((offset, rec.pid, rec.ppid,
+                rec.times_start[rec.REAL_TIME], rec.times_end[rec.REAL_TIME],
+                rec.tool, rec.cwd))
+
+        try:
+            stat_info = os.stat(self.log_file_name)
+        except OSError, err:
+            sys.exit("Cannot stat %s: %s" % (self.log_file_name, err))
+
+        return LogIndex(stat_info.st_size, stat_info.st_mtime, entries)
+
+    def Index(self):
+        """Returns the LogIndex for this log. The sidecar index is used
+        if it exists and is up-to-date. Otherwise the log is scanned
+        once, and the index is kept in memory."""
+        if not self.index:
+            self.index = read_index(self.log_file_name)
+
+        if not self.index:
+            saved_offset = self.fh.tell()
+            self.fh.seek(self.records_offset)
+            self.index = self.BuildIndex()
+            self.fh.seek(saved_offset)
+
+        return self.index
+
+    def HostSamples(self):
+        """Returns the host samples of the log (see HOST_SAMPLE_KEYS),
+        in the order they were taken. The log is read from the start,
+        without decoding the records, and the current position in the
+        log is preserved."""
+        saved_offset = self.fh.tell()
+        self.fh.seek(self.records_offset)
+        samples = []
+        while 1:
+            try:
+                array = self.read()
+            except EOFError:
+                break
+            if is_host_sample(array):
+                samples.append(array)
+        self.fh.seek(saved_offset)
+
+        # The collector can write them out of order.
+        samples.sort(lambda a, b: cmp(a["time"], b["time"]))
+        return samples
+
+    def ScanSnapshots(self, table):
+        """Add all the snapshots of the log to a SnapshotTable. The log
+        is read through its own filehandle, as this can be called from
+        a decoding process, which shares the file position of the
+        LogFile's filehandle with this process."""
+        fh = open(self.log_file_name, "rb")
+        try:
+            if self.orig_fh:
+                fh = logcodec.DecompressedStream(fh, self.fh.codec)
+            fh.seek(self.records_offset)
+            while 1:
+                try:
+                    array = self.load(fh)
+                except EOFError:
+                    break
+                if is_snapshot(array):
+                    table.Add(array)
+        finally:
+            fh.close()
+
+    def read_records_at(self, entries):
+        """Read the records for a list of index entries. The current
+        position in the log is preserved, so random access can be
+        mixed with read_record()."""
+        saved_offset = self.fh.tell()
+        recs = []
+        for entry in entries:
+            self.fh.seek(entry[LogIndex.OFFSET])
+            recs.append(self.make_record(self.read_array(),
+                self.audit_plugin))
+        self.fh.seek(saved_offset)
+        return recs
+
+    def seek_pid(self, pid):
+        """Returns the record for a PID, or None if the PID is not
+        in the log."""
+        entries = self.Index().EntriesForPID(pid)
+        if entries:
+            return self.read_records_at(entries[:1])[0]
+        else:
+            return None
+
+    def seek_pids(self, pids):
+        """Yields the record for each PID in a list, in the order of the
+        list, or None for a PID that is not in the log, as seek_pid()
+        does. The records are read SEEK_BATCH_SIZE at a time, in log
+        order within each batch, so that a compressed log is not
+        decompressed from its start again for each record, and only one
+        batch of records is in memory at a time."""
+        index = self.Index()
+        for i in range(0, len(pids), SEEK_BATCH_SIZE):
+            entries = []
+            by_offset = {}
+            for pid in pids[i:i + SEEK_BATCH_SIZE]:
+                pid_entries = index.EntriesForPID(pid)
+                if pid_entries:
+                    entries.append(pid_entries[0])
+                    by_offset[pid_entries[0][LogIndex.OFFSET]] = \
+                            pid_entries[0]
+                else:
+                    entries.append(None)
+
+            offsets = by_offset.keys()
+            offsets.sort()
+            recs = dict(zip(offsets, self.read_records_at(
+                [by_offset[offset] for offset in offsets])))
+
+            for entry in entries:
+                if entry == None:
+                    yield None
+                else:
+                    yield recs[entry[LogIndex.OFFSET]]
+
+    def records_between(self, time_start, time_end):
+        """Returns the records, in log order, whose real run time
+        overlaps the time_start - time_end interval. To find the
+        records running at a single point in time, pass the same
+        value for time_start and time_end."""
+        return self.read_records_at(
+                self.Index().EntriesBetween(time_start, time_end))
+
+    def children_of(self, pid):
+        """Returns the records, in log order, whose parent is PID."""
+        return self.read_records_at(self.Index().EntriesForPPID(pid))
 
 
     def close(self):
+        if self.decoded_cache:
+            self.decoded_cache.close()
+            self.decoded_cache = None
+
+        if self.record_pool:
+            self.record_pool.Close()
+            self.record_pool = None
+
         try:
             self.fh.close()
 
-            # The gzip object doesn't close the
-            # backend filehandle, by design. We
-            # do it ourselves.
-            if self.orig_fh:
-                self.orig_fh.close()
-
         except IOError:
             pass
 
@@ -621,7 +1825,11 @@ def show_log(log_file_name):
     # Unpickle, a record at a time.
     while 1:
         try:
-            print log.read()
+            array = log.read()
+            if log.compact and not is_host_sample(array):
+                print decode_compact_array(array, log.compact_strings)
+            else:
+                print array
         except (EOFError, IOError, KeyboardInterrupt):
             log.close()
             break
@@ -631,6 +1839,8 @@ def show_log_version(log_file_name):
 
     log = LogFile(log_file_name)
     print log.RecordVersion()
+    if log.compact:
+        print "Compacted from:", log.original_version
 
 def show_log_header(log_file_name):
     """Show the log header."""
@@ -6,12 +6,32 @@ import os
 
 TOOLNAME_PLUGIN_PREFIX = "toolname"
 
+# The default number of answers that GetTool remembers.
+DEFAULT_CACHE_SIZE = 20000
+
 class ToolNameManager:
     """ToolName plugins have to register with this manager
-    the circumstances under which they wish to be called."""
-    def __init__(self, plugins):
+    the circumstances under which they wish to be called.
+
+    When registering, a plugin can declare what its callback depends on,
+    so that GetTool can remember its answers:
+
+        argv_words: how many of the leading words of argv the callback
+            looks at. This can be an integer, a function which is given
+            argv and returns an integer, or None, which means that the
+            callback looks at the entire command-line.
+
+        uses_cwd: true if the callback looks at the cwd.
+
+    The defaults assume that the callback looks at everything."""
+
+    def __init__(self, plugins, cache_size=DEFAULT_CACHE_SIZE):
         toolname_plugins = plugins.LoadAllPlugins(TOOLNAME_PLUGIN_PREFIX)
 
+        # The plugin modules, so that their answers can be identified
+        # (see decodecache).
+        self.plugins = toolname_plugins
+
         self.first_arg_matches = []
         self.first_arg_basename_matches = []
 
@@ -19,28 +39,54 @@ class ToolNameManager:
         self.first_arg_basename_regexes = []
         self.command_line_regexes = []
 
+        # The cache of answers.
+        # Key = (num_words, uses_cwd, words, all_words, cwd),
+        # Value = [tool, time of last use]
+        self.cache = {}
+        self.cache_size = cache_size
+        self.cache_clock = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+        # The dependencies of the cached answers, the most used first.
+        # Each is (num_words, uses_cwd).
+        self.cache_shapes = []
+        self.cache_shape_hits = {}
+
         for plugin in toolname_plugins:
             plugin.register(self)
 
-    def RegisterFirstArgumentMatch(self, text, cb):
+    def RegisterFirstArgumentMatch(self, text, cb, argv_words=None,
+            uses_cwd=True):
         """Call back parameters: first_arg, argv, cwd"""
-        self.first_arg_matches.append((text, cb))
+        self.first_arg_matches.append((text, cb, argv_words, uses_cwd))
 
-    def RegisterFirstArgumentRegex(self, regex, cb):
+    def RegisterFirstArgumentRegex(self, regex, cb, argv_words=None,
+            uses_cwd=True):
         """Call back parameters: first_arg, argv, cwd, regex_match"""
-        self.first_arg_regexes.append((regex, cb))
+        self.first_arg_regexes.append((regex, cb, argv_words, uses_cwd))
 
-    def RegisterFirstArgumentBasenameMatch(self, text, cb):
+    def RegisterFirstArgumentBasenameMatch(self, text, cb, argv_words=None,
+            uses_cwd=True):
         """Call back parameters: basename, first_arg, argv, cwd"""
-        self.first_arg_basename_matches.append((text, cb))
+        self.first_arg_basename_matches.append((text, cb, argv_words,
+            uses_cwd))
 
-    def RegisterFirstArgumentBasenameRegex(self, regex, cb):
+    def RegisterFirstArgumentBasenameRegex(self, regex, cb, argv_words=None,
+            uses_cwd=True):
         """Call back parameters: basename, first_arg, argv, cw, regex_match"""
-        self.first_arg_basename_regexes.append((regex, cb))
+        self.first_arg_basename_regexes.append((regex, cb, argv_words,
+            uses_cwd))
+
+    def RegisterCommandLineRegex(self, regex, cb, argv_words=None,
+            uses_cwd=True):
+        """Call back parameters: argv, cwd, regex_match
+        argv_words must cover the words that the regex can match, too."""
+        self.command_line_regexes.append((regex, cb, argv_words, uses_cwd))
 
-    def RegisterCommandLineRegex(self, regex, cb):
-        """Call back parameters: argv, cwd, regex_match"""
-        self.command_line_regexes.append((regex, cb))
+    def CacheStats(self):
+        """Returns (hits, misses) of the GetTool cache."""
+        return (self.cache_hits, self.cache_misses)
 
     def GetTool(self, cmdline_args, cwd):
         """Returns a single string representing the tool in this
@@ -57,6 +103,75 @@ class ToolNameManager:
         argv_joined = ' '.join(cmdline_args)
         argv = argv_joined.split()
 
+        # Have we seen a command-line that gives the same answer?
+        self.cache_clock += 1
+        for shape in self.cache_shapes:
+            (num_words, uses_cwd) = shape
+            entry = self.cache.get(self._CacheKey(argv, cwd, num_words,
+                uses_cwd))
+            if entry:
+                entry[1] = self.cache_clock
+                self.cache_hits += 1
+                self.cache_shape_hits[shape] += 1
+                return entry[0]
+
+        self.cache_misses += 1
+        (tool, num_words, uses_cwd) = self._ResolveTool(argv, cwd)
+
+        if self.cache_size > 0:
+            if len(self.cache) >= self.cache_size:
+                self._CachePrune()
+            key = self._CacheKey(argv, cwd, num_words, uses_cwd)
+            self.cache[key] = [tool, self.cache_clock]
+            if not (num_words, uses_cwd) in self.cache_shapes:
+                self._CacheShapes()
+
+        return tool
+
+    def _CacheKey(self, argv, cwd, num_words, uses_cwd):
+        if not uses_cwd:
+            cwd = None
+        if num_words == None:
+            return (None, uses_cwd, tuple(argv), True, cwd)
+        else:
+            return (num_words, uses_cwd, tuple(argv[:num_words]),
+                    len(argv) <= num_words, cwd)
+
+    def _CachePrune(self):
+        """Forget the least-recently-used quarter of the cache."""
+        items = self.cache.items()
+        items.sort(lambda a, b: cmp(a[1][1], b[1][1]))
+        for (key, entry) in items[:max(len(items) / 4, 1)]:
+            del self.cache[key]
+        self._CacheShapes()
+
+    def _CacheShapes(self):
+        """Find the dependencies of the cached answers."""
+        shapes = {}
+        for key in self.cache.keys():
+            shapes[key[:2]] = None
+            self.cache_shape_hits.setdefault(key[:2], 0)
+        shapes = shapes.keys()
+        shapes.sort(lambda a, b: cmp(self.cache_shape_hits[b],
+            self.cache_shape_hits[a]))
+        self.cache_shapes = shapes
+
+    def _ResolveTool(self, argv, cwd):
+        """Returns (tool, num_words, uses_cwd), where num_words is how
+        many of the leading words of argv the answer depends on (None
+        means all of them), and uses_cwd says if the answer depends on
+        the cwd."""
+
+        # While the plugins rewrite argv, keep track of how many words
+        # at the front of argv were made from the first 'num_words' words
+        # of the original argv. The rest of argv is the rest of the
+        # original argv.
+        num_words = 0
+        num_made = 0
+        uses_cwd = False
+
+        argv_joined = ' '.join(argv)
+
         # Call _GetTool as many times as necessary to find
         # a non-changing answer.
         seen = {}
@@ -65,64 +180,116 @@ class ToolNameManager:
 
         while 1:
             seen[argv_joined] = None
-            new_argv = self._GetTool(argv, cwd)
+            (new_argv, step_words, step_uses_cwd) = self._GetTool(argv, cwd)
             new_argv_joined = ' '.join(new_argv)
 
+            uses_cwd = uses_cwd or step_uses_cwd
+            if num_words != None:
+                if step_words == None:
+                    num_words = None
+                else:
+                    if step_words > num_made:
+                        num_words += step_words - num_made
+                        num_made = step_words
+
+                    # The plugin must have kept the words it didn't
+                    # look at.
+                    num_kept = max(len(argv) - num_made, 0)
+                    if num_kept > len(new_argv) or \
+                            new_argv[len(new_argv) - num_kept:] != \
+                            argv[len(argv) - num_kept:]:
+                        num_words = None
+                    else:
+                        num_made = len(new_argv) - num_kept
+
             if new_argv_joined == argv_joined:
-                return new_argv[0]
+                return (new_argv[0], num_words, uses_cwd)
             elif seen.has_key(new_argv_joined):
-                return new_argv[0]
+                return (new_argv[0], num_words, uses_cwd)
             else:
                 i += 1
                 if i == max_iterations:
-                    return new_argv[0]
+                    return (new_argv[0], num_words, uses_cwd)
                 argv = new_argv
                 argv_joined = new_argv_joined
 
     def _GetTool(self, argv, cwd):
+        """Returns (new_argv, num_words, uses_cwd); see _ResolveTool."""
+        # Looking for a plugin requires the first argument.
+        deps = _Dependencies(argv)
+
         cmdline = ' '.join(argv) 
         # Check the command-line
-        for (regex, cb) in self.command_line_regexes:
+        for (regex, cb, argv_words, uses_cwd) in self.command_line_regexes:
+            deps.Add(argv_words, uses_cwd)
             m = regex.search(cmdline)
             if m:
                 retval = cb(argv, cwd, m)
                 if retval != None:
-                    return retval
+                    return deps.Result(retval)
 
         # Get the first argument
         if len(argv) >= 1:
             first_arg = argv[0]
         else:
-            return argv
+            return deps.Result(argv)
 
         # Check the first argument
-        for (text, cb) in self.first_arg_matches:
+        for (text, cb, argv_words, uses_cwd) in self.first_arg_matches:
             if first_arg == text:
+                deps.Add(argv_words, uses_cwd)
                 retval =  cb(first_arg, argv, cwd)
                 if retval != None:
-                    return retval
+                    return deps.Result(retval)
 
-        for (regex, cb) in self.first_arg_regexes:
+        for (regex, cb, argv_words, uses_cwd) in self.first_arg_regexes:
             m = regex.search(first_arg)
             if m:
+                deps.Add(argv_words, uses_cwd)
                 retval = cb(first_arg, argv, cwd, m)
                 if retval != None:
-                    return retval
+                    return deps.Result(retval)
 
         # Check the basename of the first arg
         basename = os.path.basename(first_arg)
-        for (text, cb) in self.first_arg_basename_matches:
+        for (text, cb, argv_words, uses_cwd) in \
+                self.first_arg_basename_matches:
             if basename == text:
+                deps.Add(argv_words, uses_cwd)
                 retval = cb(basename, first_arg, argv, cwd)
                 if retval != None:
-                    return retval
+                    return deps.Result(retval)
 
-        for (regex, cb) in self.first_arg_basename_regexes:
+        for (regex, cb, argv_words, uses_cwd) in \
+                self.first_arg_basename_regexes:
             m = regex.search(basename)
             if m:
+                deps.Add(argv_words, uses_cwd)
                 retval = cb(basename, first_arg, argv, cwd, m)
                 if retval != None:
-                    return retval
+                    return deps.Result(retval)
 
         # Nothing matched. Return the default value.
-        return argv
+        return deps.Result(argv)
+
+class _Dependencies:
+    """What one pass through the plugins depended on."""
+    def __init__(self, argv):
+        self.argv = argv
+        self.num_words = 1
+        self.uses_cwd = False
+
+    def Add(self, argv_words, uses_cwd):
+        """Add the dependencies of a plugin that was called."""
+        if callable(argv_words):
+            argv_words = argv_words(self.argv)
+
+        if argv_words == None or self.num_words == None:
+            self.num_words = None
+        else:
+            self.num_words = max(self.num_words, argv_words)
+
+        self.uses_cwd = self.uses_cwd or uses_cwd
+
+    def Result(self, new_argv):
+        return (new_argv, self.num_words, self.uses_cwd)
@@ -0,0 +1,199 @@
+# Copyright (c) 2012 by Cisco Systems, Inc.
+"""
+Sample the memory and CPU of a job's processes while the job runs.
+
+The resource usage in a record only has the totals at the end of the
+job. With "instmake --job-samples=SECONDS", each instmake samples the
+processes of its job at that interval while it waits for the job, and
+the samples are stored in the job's record. See JOB_SAMPLE_FIELDS in
+instmake_log for what a sample holds, and the "peakmem" report for how
+the samples are used.
+
+A long job would have too many samples, so the samples are downsampled
+to at most MAX_JOB_SAMPLES: when the list is full, each pair of samples
+is replaced by the one of the two with more resident memory, so that the
+peaks are kept, and from then on one sample is kept out of each two.
+
+This module is imported by each instmake of a build that takes job
+samples, so it imports as little as it can.
+"""
+
+import errno
+import os
+import signal
+import time
+
+# The most samples that are kept for a job.
+MAX_JOB_SAMPLES = 100
+
+# Indices in a sample tuple; see JOB_SAMPLE_FIELDS in instmake_log.
+TIME = 0
+RSS = 1
+CPU = 2
+PROCS = 3
+
+PAGE_KB = os.sysconf("SC_PAGE_SIZE") / 1024
+CLOCK_TICKS = float(os.sysconf("SC_CLK_TCK"))
+
+# The fields of /proc/<pid>/stat that we need, counted after the
+# process name: ppid is the 4th field of the file, utime the 14th,
+# stime, cutime and cstime the next ones, and rss the 24th.
+STAT_PPID = 4 - 3
+STAT_UTIME = 14 - 3
+STAT_CSTIME = 17 - 3
+STAT_RSS = 24 - 3
+
+# Can a process's children be read from /proc/<pid>/task/<tid>/children?
+# If not, all of /proc is read to find them.
+HAVE_CHILDREN_FILES = os.path.exists("/proc/self/task/%d/children" % \
+        (os.getpid(),))
+
+
+def read_stat(pid):
+    """Returns (ppid, CPU ticks, resident pages) of a process, or None
+    if it is gone."""
+    try:
+        fh = open("/proc/%s/stat" % (pid,))
+        try:
+            text = fh.read()
+        finally:
+            fh.close()
+        # The process name, in parentheses, may have spaces in it.
+        fields = text[text.rindex(")") + 2:].split()
+        ticks = 0
+        for field in fields[STAT_UTIME:STAT_CSTIME + 1]:
+            ticks += int(field)
+        return (int(fields[STAT_PPID]), ticks, int(fields[STAT_RSS]))
+    except (IOError, OSError, ValueError, IndexError):
+        return None
+
+def read_children(pid):
+    """Returns the PIDs of the children of a process, from the children
+    files of its threads."""
+    children = []
+    try:
+        tids = os.listdir("/proc/%d/task" % (pid,))
+    except OSError:
+        return children
+    for tid in tids:
+        try:
+            fh = open("/proc/%d/task/%s/children" % (pid, tid))
+            try:
+                children.extend([int(child) for child in fh.read().split()])
+            finally:
+                fh.close()
+        except (IOError, OSError, ValueError):
+            pass
+    return children
+
+def subtree_stats(root_pid):
+    """Returns the (ppid, CPU ticks, resident pages) of a process and
+    all its descendants."""
+    stats = []
+    if HAVE_CHILDREN_FILES:
+        pids = [root_pid]
+        while pids:
+            pid = pids.pop()
+            stat = read_stat(pid)
+            if stat != None:
+                stats.append(stat)
+                pids.extend(read_children(pid))
+        return stats
+
+    # Find the children of every process.
+    children = {}
+    all_stats = {}
+    try:
+        names = os.listdir("/proc")
+    except OSError:
+        return stats
+    for name in names:
+        if not name.isdigit():
+            continue
+        stat = read_stat(name)
+        if stat != None:
+            pid = int(name)
+            all_stats[pid] = stat
+            children.setdefault(stat[0], []).append(pid)
+
+    pids = [root_pid]
+    while pids:
+        pid = pids.pop()
+        if all_stats.has_key(pid):
+            stats.append(all_stats[pid])
+            pids.extend(children.get(pid, []))
+    return stats
+
+
+def interrupt(signum, frame):
+    """The SIGALRM handler; the signal only has to interrupt wait4()."""
+    pass
+
+
+class JobSampler:
+    """Samples the processes of a job while waiting for it."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.samples = []
+
+        # Each kept sample is the one with the most memory out of
+        # this many samples.
+        self.group = 1
+        self.pending = None
+        self.num_pending = 0
+
+    def Wait(self, pid, start):
+        """Wait for the job whose process is 'pid', which started at
+        time 'start', like os.wait4(pid, 0), sampling its processes
+        at each interval. Returns what os.wait4() returns."""
+        old_handler = signal.signal(signal.SIGALRM, interrupt)
+        signal.setitimer(signal.ITIMER_REAL, self.interval, self.interval)
+        try:
+            while 1:
+                try:
+                    return os.wait4(pid, 0)
+                except OSError, err:
+                    if err.errno != errno.EINTR:
+                        raise
+                self.Sample(pid, start)
+        finally:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, old_handler)
+
+    def Sample(self, pid, start):
+        stats = subtree_stats(pid)
+        if not stats:
+            return
+        ticks = 0
+        pages = 0
+        for (ppid, proc_ticks, proc_pages) in stats:
+            ticks += proc_ticks
+            pages += proc_pages
+        self.Add((time.time() - start, pages * PAGE_KB,
+            ticks / CLOCK_TICKS, len(stats)))
+
+    def Add(self, sample):
+        if self.pending == None or sample[RSS] > self.pending[RSS]:
+            self.pending = sample
+        self.num_pending += 1
+        if self.num_pending < self.group:
+            return
+
+        self.samples.append(self.pending)
+        self.pending = None
+        self.num_pending = 0
+
+        if len(self.samples) == MAX_JOB_SAMPLES:
+            self.samples = [max(self.samples[i], self.samples[i + 1],
+                key=lambda sample: sample[RSS])
+                for i in range(0, MAX_JOB_SAMPLES, 2)]
+            self.group *= 2
+
+    def Samples(self):
+        """Returns the samples, as they are stored in the log: a tuple
+        of tuples of JOB_SAMPLE_FIELDS."""
+        samples = self.samples[:]
+        if self.pending != None:
+            samples.append(self.pending)
+        return tuple(samples)
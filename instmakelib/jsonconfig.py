@@ -20,6 +20,10 @@ CONFIG_USAGE_LOGGER = "usage-logger"
 # path names in the clidiff report.
 CONFIG_CLIDIFF_NORMPATH = "clidiff-normpath"
 
+# The directory of the decoded-record cache. If set, reports use
+# the cache unless --no-cache is given.
+CONFIG_DECODED_CACHE = "decoded-cache"
+
 def update(caller_config, json_filename):
     # This will throw errors
     fh = open(json_filename)
@@ -0,0 +1,131 @@
+# Copyright (c) 2012 by Cisco Systems, Inc.
+"""
+Read a log while the build is still writing it, for "instmake --live".
+
+A LiveLogFile reads the records as they are appended to the log. At
+the end of the log, or at a record that is only partly written, it
+waits for more of the log to be written. The top-level instmake's
+record is the last record of a build, so the log is finished after it.
+
+The records are given to the report's live consumer (see reportstream)
+as they arrive, and its update() method is called every few seconds
+to print the report for the records so far. Its finish() method is
+called when the build is finished, or when the user interrupts the
+report.
+
+A job's record is written when the job finishes, so the jobs that are
+still running are not in the reports.
+"""
+
+import os
+import sys
+import time
+import cPickle as pickle
+
+from instmakelib import instmake_log as LOG
+
+# How often the report is printed, in seconds
+DEFAULT_REFRESH = 5.0
+
+# How often the log is checked for new records
+POLL_INTERVAL = 0.5
+
+# Clear the terminal between updates
+CLEAR_SCREEN = "\033[H\033[2J"
+
+
+def wait_for_log(log_file_name):
+    """Wait for the build to create the log and write its header.
+    The header is written with one write()."""
+    while 1:
+        try:
+            if os.path.getsize(log_file_name) > 0:
+                return
+        except OSError:
+            pass
+        time.sleep(POLL_INTERVAL)
+
+
+class LiveLogFile(LOG.LogFile):
+    """A LogFile that a build is still writing."""
+
+    def __init__(self, log_file_name):
+        wait_for_log(log_file_name)
+        LOG.LogFile.__init__(self, log_file_name)
+
+        if self.orig_fh or self.compact:
+            sys.exit("%s is not being written by a build; "
+                    "run the report without --live." % (log_file_name,))
+
+        # Has the top-level record been read?
+        self.finished = False
+
+    def read_available(self):
+        """Returns the next record, or None if it has not been
+        completely written yet."""
+        while 1:
+            offset = self.fh.tell()
+            try:
+                array = self.unpickle(self.fh)
+            except (EOFError, ValueError, pickle.UnpicklingError):
+                # Read it again when more of it has been written.
+                self.fh.seek(offset)
+                return None
+            if LOG.is_snapshot(array):
+                self.snapshots.Add(array)
+            elif not LOG.is_host_sample(array):
+                break
+
+        rec = self.make_record(array, self.audit_plugin)
+        if rec.ppid == None:
+            self.finished = True
+        return rec
+
+
+def print_update(log_file_name, num_records, consumer):
+    if sys.stdout.isatty():
+        sys.stdout.write(CLEAR_SCREEN)
+    print "instmake --live: %s, %d records, at %s" % (log_file_name,
+            num_records, time.strftime("%H:%M:%S"))
+    print
+    consumer.update()
+    sys.stdout.flush()
+
+
+def run_live(log_file_name, consumer, refresh=DEFAULT_REFRESH):
+    """Read a log as the build writes it, giving each record to a
+    live consumer, until the build is finished or the user
+    interrupts it."""
+    log = LiveLogFile(log_file_name)
+    consumer.begin(log.header())
+
+    num_records = 0
+    last_update = time.time()
+    new_records = False
+
+    try:
+        while not log.finished:
+            rec = log.read_available()
+            if rec:
+                consumer.record(rec)
+                num_records += 1
+                new_records = True
+            else:
+                time.sleep(POLL_INTERVAL)
+
+            if new_records and time.time() - last_update >= refresh:
+                print_update(log_file_name, num_records, consumer)
+                last_update = time.time()
+                new_records = False
+
+    except KeyboardInterrupt:
+        print
+        print "Interrupted; the build is not finished."
+
+    log.close()
+
+    if sys.stdout.isatty():
+        sys.stdout.write(CLEAR_SCREEN)
+    print "instmake --live: %s, %d records" % (log_file_name, num_records)
+    print
+    consumer.finish()
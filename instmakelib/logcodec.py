@@ -0,0 +1,201 @@
+# Copyright (c) 2010 by Cisco Systems, Inc.
+"""
+Read compressed instmake logs.
+
+The compression of a log is found from the magic bytes at the start
+of the file. gzip and bzip2 are always supported; xz is supported if
+the lzma module (Python 3, or the backports.lzma package) can be
+imported.
+
+A compressed log is decompressed in large chunks into a buffer, and
+the records are unpickled from the buffer, which is a cStringIO object,
+from which cPickle reads without calling back into Python code for
+each of its small reads. When a record runs past the end of the buffer,
+at least as much data as the buffer has from the start of the record
+is added to it, and the record is unpickled again, so that a large
+record is unpickled only a few times.
+"""
+
+import bz2
+import cPickle as pickle
+import cStringIO
+import zlib
+
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma = None
+
+# How much compressed data to decompress at a time
+RAW_CHUNK_SIZE = 256 * 1024
+
+
+class Codec:
+    def __init__(self, name, magic, decompressor):
+        self.name = name
+        self.magic = magic
+        self.decompressor = decompressor
+
+    def Available(self):
+        return self.decompressor != None
+
+def gzip_decompressor():
+    # 16 + MAX_WBITS: expect the gzip header and trailer
+    return zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+if lzma:
+    xz_decompressor = lzma.LZMADecompressor
+else:
+    xz_decompressor = None
+
+CODECS = [
+    Codec("gzip", "\x1f\x8b", gzip_decompressor),
+    Codec("bzip2", "BZh", bz2.BZ2Decompressor),
+    Codec("xz", "\xfd7zXZ\x00", xz_decompressor),
+]
+
+MAGIC_SIZE = max([len(codec.magic) for codec in CODECS])
+
+
+def detect_codec(fh):
+    """Returns the Codec of a file that is compressed, or None. The
+    file position is left at the start of the file."""
+    magic = fh.read(MAGIC_SIZE)
+    fh.seek(0)
+    for codec in CODECS:
+        if magic.startswith(codec.magic):
+            return codec
+    return None
+
+
+class DecompressedStream:
+    """A read-only file object for the decompressed data of a
+    compressed file. Seeking backwards means decompressing the file
+    from the start again."""
+
+    def __init__(self, raw_fh, codec):
+        self.raw_fh = raw_fh
+        self.codec = codec
+        self.Rewind()
+
+    def Rewind(self):
+        self.raw_fh.seek(0)
+        self.decompressor = self.codec.decompressor()
+        self.raw_eof = False
+
+        # The decompressed data in the buffer, and its position
+        # in the decompressed stream.
+        self.data = ""
+        self.buf = cStringIO.StringIO(self.data)
+        self.buf_start = 0
+
+    def Decompress(self):
+        """Decompress the next chunk of the file. Returns the data,
+        which may be empty, or None at the end of the file."""
+        if self.raw_eof:
+            return None
+
+        raw = self.raw_fh.read(RAW_CHUNK_SIZE)
+        if not raw:
+            self.raw_eof = True
+            if hasattr(self.decompressor, "flush"):
+                return self.decompressor.flush()
+            return ""
+
+        pieces = []
+        while raw:
+            try:
+                pieces.append(self.decompressor.decompress(raw))
+            except EOFError:
+                # bz2 and lzma refuse data after the end of a stream.
+                # It is the next stream of a concatenated file.
+                self.decompressor = self.codec.decompressor()
+                continue
+
+            # After the end of a stream, the rest of the data is left
+            # in unused_data. Skip any zero padding after the stream.
+            raw = getattr(self.decompressor, "unused_data", "").lstrip("\0")
+            if raw:
+                self.decompressor = self.codec.decompressor()
+
+        return "".join(pieces)
+
+    def Fill(self, min_size=1):
+        """Add at least min_size bytes to the buffer, or the rest of
+        the file, dropping the data that has been read. Returns False
+        at the end of the file."""
+        pos = self.buf.tell()
+        pieces = [self.data[pos:]]
+        size = 0
+        while size < min_size:
+            data = self.Decompress()
+            if data == None:
+                break
+            pieces.append(data)
+            size += len(data)
+        if size == 0:
+            return False
+
+        self.buf_start += pos
+        self.data = "".join(pieces)
+        self.buf = cStringIO.StringIO(self.data)
+        return True
+
+    def load_pickle(self):
+        """Unpickle the next object. Raises EOFError at the end of
+        the file."""
+        while 1:
+            start = self.buf.tell()
+            try:
+                return pickle.load(self.buf)
+            except (EOFError, ValueError, pickle.UnpicklingError), err:
+                # The pickle may run past the end of the buffer.
+                # Double what is buffered of it, so that a large one
+                # isn't unpickled again for every chunk.
+                self.buf.seek(start)
+                if not self.Fill(max(RAW_CHUNK_SIZE,
+                        len(self.data) - start)):
+                    if self.buf.tell() == len(self.data):
+                        raise EOFError
+                    # A partial record at the end of the log is
+                    # treated as it is in an uncompressed log.
+                    raise err
+
+    def read(self, size=-1):
+        pieces = [self.buf.read(size)]
+        if size < 0:
+            while self.Fill():
+                pieces.append(self.buf.read())
+        else:
+            size -= len(pieces[0])
+            while size > 0 and self.Fill():
+                pieces.append(self.buf.read(size))
+                size -= len(pieces[-1])
+        return "".join(pieces)
+
+    def tell(self):
+        return self.buf_start + self.buf.tell()
+
+    def seek(self, offset, whence=0):
+        assert whence == 0
+        if offset < self.buf_start:
+            self.Rewind()
+
+        while offset > self.buf_start + len(self.data):
+            # Skip the whole buffer
+            self.buf.seek(len(self.data))
+            if not self.Fill():
+                break
+
+        self.buf.seek(offset - self.buf_start)
+
+    def close(self):
+        self.raw_fh.close()
+
+
+def load_pickle(stream):
+    """Unpickle the next object from a DecompressedStream."""
+    return stream.load_pickle()
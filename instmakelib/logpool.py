@@ -0,0 +1,222 @@
+# Copyright (c) 2012 by Cisco Systems, Inc.
+"""
+Decode instmake log records in a pool of processes.
+
+The log is split into chunks at record boundaries. If the log has an
+up-to-date sidecar index, the chunks are described by record offsets,
+and each worker reads its own chunks from the log; a worker reading a
+compressed log decompresses it once, as its chunks come in log order.
+Otherwise, this process unpickles the records (which is cheap compared
+to creating the LogRecord objects) and sends the arrays to the workers.
+
+The workers create the LogRecord objects. Either the records are
+returned to the caller in their original order, or, for a report
+consumer that can merge its results (see reportstream), each worker
+gives the records of a chunk to a copy of the consumer, and only
+the copy is sent back, to be merged in the original order.
+"""
+
+import collections
+import copy
+import multiprocessing
+import signal
+import sys
+
+from instmakelib import instmake_log as LOG
+from instmakelib import logcodec
+
+# Records per chunk
+CHUNK_SIZE = 500
+
+# Chunk types
+CHUNK_OFFSETS = "offsets"
+CHUNK_ARRAYS = "arrays"
+
+# multiprocessing doesn't deliver KeyboardInterrupt while waiting
+# for a result unless a timeout is given.
+RESULT_TIMEOUT = 365 * 24 * 60 * 60
+
+# The LogFile being decoded, and the consumer that the records are
+# given to, if any. The workers inherit these when the pool is forked.
+_worker_log = None
+_worker_consumer = None
+
+# Each worker opens its own filehandle to the log, as the
+# filehandle it inherits shares its file position with this process.
+_worker_fh = None
+
+
+class DecodeError(Exception):
+    pass
+
+
+def _init_worker():
+    # Let the parent process handle ^C
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+def _open_worker_fh(log):
+    fh = open(log.log_file_name, "rb")
+    if log.orig_fh:
+        fh = logcodec.DecompressedStream(fh, log.fh.codec)
+    return fh
+
+def _chunk_records(chunk):
+    """Create the LogRecord objects for a chunk. This runs
+    in the worker process."""
+    global _worker_fh
+    log = _worker_log
+    recs = []
+
+    try:
+        if chunk[0] == CHUNK_OFFSETS:
+            (chunk_type, offset, count) = chunk
+            if not _worker_fh:
+                _worker_fh = _open_worker_fh(log)
+            _worker_fh.seek(offset)
+            while len(recs) < count:
+                array = log.load(_worker_fh)
+                if LOG.is_host_sample(array):
+                    continue
+                elif LOG.is_snapshot(array):
+                    log.snapshots.Add(array)
+                    continue
+                recs.append(log.make_record(array, log.audit_plugin))
+        else:
+            (chunk_type, arrays) = chunk
+            for array in arrays:
+                recs.append(log.make_record(array, log.audit_plugin))
+
+    # Many errors while reading a log call sys.exit(). Don't let
+    # that kill the worker; pass the error back to the parent.
+    except SystemExit, err:
+        raise DecodeError(str(err))
+
+    return recs
+
+def _decode_chunk(chunk):
+    """Returns the LogRecord objects for a chunk. This runs
+    in the worker process."""
+    recs = _chunk_records(chunk)
+
+    # The records compute some attributes lazily; compute them
+    # here, in the worker, which is the point of the pool.
+    for rec in recs:
+        rec.Materialize()
+
+    return recs
+
+def _reduce_chunk(chunk):
+    """Give the records of a chunk to a copy of the consumer, and
+    return the copy. This runs in the worker process."""
+    consumer = copy.deepcopy(_worker_consumer)
+    try:
+        for rec in _chunk_records(chunk):
+            consumer.record(rec)
+    except SystemExit, err:
+        raise DecodeError(str(err))
+    return consumer
+
+
+class RecordPool:
+    """Reads records from a LogFile, decoding them in a pool
+    of processes. If a consumer is given, the records are given
+    to copies of it in the pool; see Reduce()."""
+
+    def __init__(self, log, num_jobs, consumer=None):
+        global _worker_log
+        global _worker_consumer
+        _worker_log = log
+        _worker_consumer = consumer
+        self.log = log
+        self.consumer = consumer
+
+        self.chunks = self.Chunks()
+        self.pending = collections.deque()
+        self.records = collections.deque()
+
+        # Keep each worker busy, but don't read the whole
+        # log into memory.
+        self.max_pending = 2 * num_jobs
+
+        self.pool = multiprocessing.Pool(num_jobs, _init_worker)
+
+    def Chunks(self):
+        """Generate the chunks of the log, starting at the
+        current position of the log."""
+        index = LOG.read_index(self.log.log_file_name)
+
+        if index:
+            start_offset = self.log.fh.tell()
+            entries = [entry for entry in index.Entries()
+                    if entry[LOG.LogIndex.OFFSET] >= start_offset]
+            for i in xrange(0, len(entries), CHUNK_SIZE):
+                chunk_entries = entries[i:i + CHUNK_SIZE]
+                yield (CHUNK_OFFSETS, chunk_entries[0][LOG.LogIndex.OFFSET],
+                        len(chunk_entries))
+            return
+
+        arrays = []
+        while 1:
+            try:
+                arrays.append(self.log.read_array())
+            except EOFError:
+                break
+
+            if len(arrays) == CHUNK_SIZE:
+                yield (CHUNK_ARRAYS, arrays)
+                arrays = []
+
+        if arrays:
+            yield (CHUNK_ARRAYS, arrays)
+
+    def Fill(self):
+        """Submit chunks until enough are pending."""
+        if self.consumer:
+            func = _reduce_chunk
+        else:
+            func = _decode_chunk
+
+        while len(self.pending) < self.max_pending:
+            try:
+                chunk = self.chunks.next()
+            except StopIteration:
+                break
+            self.pending.append(self.pool.apply_async(func, (chunk,)))
+
+    def NextResult(self):
+        """Returns the result of the next chunk, or raises EOFError."""
+        self.Fill()
+        if not self.pending:
+            raise EOFError
+
+        result = self.pending.popleft()
+        try:
+            return result.get(RESULT_TIMEOUT)
+        except DecodeError, err:
+            self.Close()
+            sys.exit(str(err))
+
+    def read_record(self):
+        """Returns the next record, or raises EOFError."""
+        while not self.records:
+            self.records.extend(self.NextResult())
+
+        # The records were unpickled with their own copies of
+        # the strings; share them again.
+        rec = self.records.popleft()
+        rec.InternStrings(self.log.strings)
+        return rec
+
+    def Reduce(self):
+        """Give all the records to copies of the consumer, and merge
+        the copies into the consumer, in log order."""
+        while 1:
+            try:
+                partial = self.NextResult()
+            except EOFError:
+                break
+            self.consumer.merge(partial)
+
+    def Close(self):
+        self.pool.terminate()
+        self.pool.join()
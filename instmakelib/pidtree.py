@@ -7,17 +7,25 @@ of SortableRec's, which are wrappers around instmake-log records objects.
 Thus, a lot of memory is used because the instmake-log records are
 kept in memory.
 
+The CompactPIDTree is a PIDTree that keeps instmake_log.CompactRecord's
+instead of the instmake-log records, which uses much less memory.
+
 The PIDTreeLight is a light-weight class because it keeps track
 of PIDs only. It does not keep the instmake-log record in memory.
 """
 
 import sys
+from instmakelib import instmake_log as LOG
 
-class SortableRec:
+class SortableRec(object):
     """A wrapper around an instmakelog record object. The SortableRec knows
     about its children records, and as the name suggests, the SortableRec
     can be sorted in an array."""
 
+    # There is one of these per record, so don't use a dictionary
+    # for each one.
+    __slots__ = [ "rec", "children" ]
+
     def __init__(self, rec):
         self.rec = rec
         self.children = []
@@ -205,6 +213,19 @@ class PIDTree:
     def BranchSRecs(self):
         return filter(lambda x: x.Children(), self.SRecs())
 
+class CompactPIDTree(PIDTree):
+    """A PIDTree which stores a CompactRecord for each record.
+    If details is false, the CompactRecords don't keep the heavy
+    fields (audit data, environment and make variables, etc.)."""
+
+    def __init__(self, details=True):
+        PIDTree.__init__(self)
+        self.details = details
+
+    def AddRec(self, rec):
+        """Add a record to the PIDTree."""
+        PIDTree.AddRec(self, LOG.CompactRecord(rec, self.details))
+
 class PIDTreeLight:
     """Like PIDTree, but only maintins the PID, not the rec. Uses less
     memory."""
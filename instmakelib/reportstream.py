@@ -0,0 +1,170 @@
+# Copyright (c) 2010 by Cisco Systems, Inc.
+"""
+Run reports that consume a stream of records, so that several reports
+can share one reading of a log.
+
+A report plugin can provide, in addition to report(), a function:
+
+    make_consumer(log_file_name, args)
+
+which checks the report arguments and returns a consumer object
+with these methods:
+
+    begin(header)   Called before the first record, with the LogHeader
+                    of the log, or None.
+    record(rec)     Called for each LogRecord, in log order.
+    finish()        Called after the last record. Prints the report.
+
+A consumer can also have this method:
+
+    merge(other)    Add the results of another consumer, which was
+                    copied from this one before its first record, and
+                    was given the records that follow this one's.
+
+With "instmake -s REPORT --jobs N", the records of such a consumer
+are given to copies of it in the decoding processes, and only the
+copies are sent back, to be merged in log order.
+
+The same LogRecord is given to every consumer, so a consumer must not
+modify it.
+
+A report that can be run with "instmake --live" (see livelog) provides:
+
+    make_live_consumer(log_file_name, args)
+
+which returns a consumer that also has this method:
+
+    update()        Called now and then while the build is running.
+                    Prints the report for the records so far.
+
+Reports that only provide report() are run through LegacyReport,
+which keeps the unpickled records and replays them to the report when
+it opens the log (see instmake_log.StartReplay).
+"""
+
+import sys
+
+from instmakelib import instmake_log as LOG
+
+
+class ReportConsumer:
+    """A convenient base class for consumers."""
+    def begin(self, header):
+        pass
+
+    def record(self, rec):
+        pass
+
+    def finish(self):
+        pass
+
+    def update(self):
+        pass
+
+
+def run_consumer(log_file_name, consumer):
+    """Read a log, giving each record to one consumer."""
+    log = LOG.LogFile(log_file_name)
+    consumer.begin(log.header())
+
+    if hasattr(consumer, "merge") and log.CanReduce():
+        log.reduce_records(consumer)
+        log.close()
+        consumer.finish()
+        return
+
+    while 1:
+        try:
+            rec = log.read_record()
+        except EOFError:
+            log.close()
+            break
+
+        consumer.record(rec)
+
+    consumer.finish()
+
+
+class LegacyReport(ReportConsumer):
+    """Runs a report that only provides report(). While the report
+    runs, the log is replayed: a LogFile that the report opens on the
+    same log file returns the records that were already read, instead
+    of reading the log again. Each replay creates new LogRecords, so
+    the report may modify them."""
+
+    def __init__(self, mod, log, arrays, args):
+        self.mod = mod
+        self.log = log
+        self.arrays = arrays
+        self.args = args
+
+    def finish(self):
+        LOG.StartReplay(self.log, self.arrays)
+        try:
+            self.mod.report([self.log.log_file_name], self.args)
+        finally:
+            LOG.StopReplay(self.log)
+
+
+def run_reports(log_file_name, reports):
+    """Run several reports while reading the log once. 'reports' is
+    a list of (report_name, report_module, report_args)."""
+    log = LOG.LogFile(log_file_name)
+
+    # Unpickled records, kept for the legacy reports
+    arrays = None
+
+    consumers = []
+    streaming = []
+    for (report_name, mod, args) in reports:
+        if hasattr(mod, "make_consumer"):
+            consumer = mod.make_consumer(log_file_name, args)
+            streaming.append(consumer)
+        else:
+            if arrays == None:
+                arrays = []
+            consumer = LegacyReport(mod, log, arrays, args)
+        consumers.append((report_name, consumer))
+
+    for consumer in streaming:
+        consumer.begin(log.header())
+
+    if arrays == None:
+        # Only streaming reports, so the records can come from the
+        # LogFile as usual (and from the decoded-record cache).
+        while 1:
+            try:
+                rec = log.read_record()
+            except EOFError:
+                break
+
+            for consumer in streaming:
+                consumer.record(rec)
+
+    else:
+        while 1:
+            try:
+                array = log.read_array()
+            except EOFError:
+                break
+
+            arrays.append(array)
+
+            if streaming:
+                rec = log.make_record(array, log.audit_plugin)
+                for consumer in streaming:
+                    consumer.record(rec)
+
+    i = 0
+    for (report_name, consumer) in consumers:
+        if i > 0:
+            print
+        print "=" * 78
+        print "Report:", report_name
+        print "=" * 78
+        print
+        consumer.finish()
+        sys.stdout.flush()
+        i += 1
+
+    log.close()
@@ -46,7 +46,8 @@ class Stat:
     def Calculate(self, grand_total):
         """This finishes up the stat object by calculating
         some final numbers. This is more efficient than re-computing
-        these numbers every time Add() is called."""
+        these numbers every time Add() is called. More values can be
+        added afterwards, as long as Calculate() is called again."""
         if self.n != 0:
             self.mean = self.total / float(self.n)
         if grand_total != 0:
@@ -5,6 +5,7 @@ import re
 import os
 import sys
 import types
+import cStringIO
 
 try:
     # Called from instmake, we import like this
@@ -17,6 +18,7 @@ except ImportError:
 
 SYSCALL_REGEX = re.compile(r"""
 ((?P<pid>\d+)\s+)?                    # PID, may or may not be present.
+((?P<time>\d+\.\d+)\s+)?              # timestamp, with strace -ttt.
 (?P<name>\w+)                         # system call name.
 \((?P<args>.*)\)                      # args
 \s+=\s+
@@ -27,6 +29,7 @@ SYSCALL_REGEX = re.compile(r"""
 
 UNFINISHED_SYSCALL_REGEX = re.compile(r"""
 ((?P<pid>\d+)\s+)?                    # PID, may or may not be present.
+((?P<time>\d+\.\d+)\s+)?              # timestamp, with strace -ttt.
 (?P<name>\w+)                         # system call name.
 \((?P<args>.*)                        # args, some might present
 <unfinished\s+\.\.\.>                    # unfinished
@@ -35,6 +38,7 @@ UNFINISHED_SYSCALL_REGEX = re.compile(r"""
 
 RESUMED_SYSCALL_REGEX = re.compile(r"""
 ((?P<pid>\d+)\s+)?                    # PID, may or may not be present.
+((?P<time>\d+\.\d+)\s+)?              # timestamp, with strace -ttt.
 <\.\.\.\s+
 (?P<name>\w+)                         # system call name.      
 \s+resumed>                         # state = resumed. 
@@ -45,41 +49,224 @@ RESUMED_SYSCALL_REGEX = re.compile(r"""
 """, re.VERBOSE)
 
 
-INFO_REGEX = re.compile(r"""
+# The start of each line, to find the name of the system call, or
+# whether it is an info message, before parsing the whole line.
+LINE_START_REGEX = re.compile(r"""
 ((?P<pid>\d+)\s+)?                    # PID, may or may not be present.
-\-\-\-(?P<errmsg>.*)\-\-\-            # info msgs like child exited starts with ---
-""", re.VERBOSE )
+((?P<time>\d+\.\d+)\s+)?              # timestamp, with strace -ttt.
+(<\.\.\.\s+(?P<resumed>\w+)\s+resumed> # a resumed system call,
+|(?P<name>\w+)\(                      # a system call,
+|(?P<info>\-\-\-|\+\+\+))             # or an info message.
+""", re.VERBOSE)
 
 
-INFO_REGEX2 = re.compile(r"""
-((?P<pid>\d+)\s+)?                    # PID, may or may not be present.
-\+\+\+(?P<errmsg>.*)\+\+\+            # info msgs like child exited starts with ---
-""", re.VERBOSE )
+# The system calls that have a class in the syscall module. Only
+# these can read, write, or exec a file, or change the cwd of a
+# process, so the lines of the other system calls are skipped
+# without being parsed. The system calls on file descriptors are
+# only parsed in strace output with times, to find the files that
+# their time is for (TIMED_SYSCALLS).
+TRACKED_SYSCALLS = {}
+TIMED_SYSCALLS = {}
+for _name, _value in vars(syscall).items():
+    if type(_value) == types.ClassType and \
+            issubclass(_value, syscall.SysCall) and \
+            _value != syscall.SysCall:
+        TIMED_SYSCALLS[_name] = _value
+        if not issubclass(_value, syscall.fd_syscall):
+            TRACKED_SYSCALLS[_name] = _value
+del _name, _value
 
 
 class StraceParseError(Exception):
     pass
 
 
+def parse_strace_line(line):
+    """Returns (pid, name, args, retval, errmsg, state) for a line
+    of a system call."""
+    match = SYSCALL_REGEX.match(line)
+    if match:
+        pid    = match.group('pid')
+        name   = match.group('name')
+        args   = match.group('args').split(',')
+        retval = match.group('retval')
+        errmsg = match.group('errmsg')
+        state  = syscall.COMPLETED
+        return (pid, name, args, retval, errmsg, state)
+
+    match = UNFINISHED_SYSCALL_REGEX.match(line)
+    if match:
+        pid    = match.group('pid')
+        name   = match.group('name')
+        args   = match.group('args').split(',')
+        retval = None
+        errmsg = None
+        state  = syscall.UNFINISHED
+        return (pid, name, args, retval, errmsg, state)
+
+    match = RESUMED_SYSCALL_REGEX.match(line)
+    if match:
+        pid    = match.group('pid')
+        name   = match.group('name')
+        args   = match.group('args').split(',')
+        retval = match.group('retval')
+        errmsg = match.group('errmsg')
+        state  = syscall.RESUMED
+        return (pid, name, args, retval, errmsg, state)
+
+    # We could not match any thing 
+    raise StraceParseError("%s: Unable to parse the line" % line )
+
+
+def split_duration(line):
+    """Returns the line without the duration at its end (from strace -T),
+    and the duration, or None."""
+    if line.endswith(">"):
+        i = line.rfind(" <")
+        if i != -1:
+            try:
+                return line[:i], float(line[i + 2:-1])
+            except ValueError:
+                pass
+    return line, None
+
+def read_syscalls(lines, times=None):
+    """A generator of the tracked system calls in the lines of strace
+    output, in the order they were executed.
+
+    A system call that is unfinished is joined with its resumed line,
+    so it is only yielded when it is resumed (or at the end of the
+    output, if it never is). The system calls after it are held back
+    until then, to keep the order; only these are kept in memory.
+
+    If the output has times (strace -ttt -T), the time of every line
+    is given to 'times', a SyscallTimes, if there is one, and the system
+    calls on file descriptors are yielded, too."""
+
+    tracked = TRACKED_SYSCALLS
+    pending = []
+    unfinished = { }
+    first_syscall = None
+    seen_syscall = False
+
+    for line in lines:
+        line = line.rstrip("\n")
+        if line == "":
+            continue
+
+        match = LINE_START_REGEX.match(line)
+        if not match:
+            raise StraceParseError("%s: Unable to parse the line" % line )
+
+        name = match.group('name') or match.group('resumed')
+        (line, duration) = split_duration(line)
+
+        if times != None and match.group('time'):
+            tracked = TIMED_SYSCALLS
+            times.AddLine(match.group('pid'), float(match.group('time')),
+                    name, duration, match.group('resumed') != None)
+
+        # An info message, like a child exiting
+        if match.group('info'):
+            continue
+
+        if not tracked.has_key(name):
+            seen_syscall = True
+            continue
+
+        (pid, name, args, retval, errmsg, state) = parse_strace_line(line)
+        curr_syscall = tracked[name](pid, name, args, retval,
+                errmsg, state)
+        if match.group('time'):
+            curr_syscall.time = float(match.group('time'))
+        curr_syscall.duration = duration
+
+        if not seen_syscall:
+            seen_syscall = True
+            first_syscall = curr_syscall
+
+        if curr_syscall.is_completed():
+            pending.append(curr_syscall)
+
+        # A system call is unfinished, It went to sleep before
+        # completed. Keep its place in the pending system calls and
+        # keep it tracked under 'unfinished'. Once the system call
+        # finishes we should update the curr_syscall.
+        elif curr_syscall.is_unfinished():
+            pid_name = (curr_syscall.pid, curr_syscall.name)
+            unfinished[pid_name] = curr_syscall
+            pending.append(curr_syscall)
+
+        # System call previously went to sleep resumed.
+        # No, need to add to the pending system calls as we already
+        # added it before it went to sleep
+        elif curr_syscall.is_resumed():
+            pid_name = (curr_syscall.pid, curr_syscall.name)
+            if unfinished.has_key(pid_name):
+                prev_syscall = unfinished[pid_name]
+                prev_syscall.join(curr_syscall)
+                del unfinished[pid_name]
+            else:
+                # we got an orphaned entry :-) . Add it to the system
+                # calls and process as much as we can do.
+                pending.append(curr_syscall)
+
+        # Yield the system calls up to the first unfinished one
+        i = 0
+        while i < len(pending) and not pending[i].is_unfinished():
+            if not is_shell_exec(pending[i], first_syscall):
+                yield pending[i]
+            i += 1
+        del pending[:i]
+
+    for pending_syscall in pending:
+        if not is_shell_exec(pending_syscall, first_syscall):
+            yield pending_syscall
+
+
+def is_shell_exec(curr_syscall, first_syscall):
+    """If the very first syscall is exeve of /bin/sh, then
+    it was the sh of the cmd shell script; and we should
+    ignore that. We don't want it to appear
+    in our list of execed files."""
+    return curr_syscall is first_syscall and \
+            isinstance(curr_syscall, syscall.exec_family) and \
+            curr_syscall.get_file_execed() == "/bin/sh"
+
+
 class StraceOutput:
+    """The files read, written, execed, stat()ed, access()ed and
+    unlinked, and the directories made, in strace output, and the number
+    of failed lookups in each directory. The output can be a string or
+    a file object; it is read a line at a time, and only the files are
+    kept, not the system calls."""
+
     def __init__(self, strace_op_data):
-        assert type(strace_op_data) == types.StringType
-        self.strace_op_lines = strace_op_data.split("\n")
-        self.syscalls       = self.__read()
-        self.process_cwd    = { }
-        self.ignore_files_read = []
-        self.ignore_files_written = []
-
-        # If the very first syscall is exeve of /bin/sh, then
-        # it was the sh of the cmd shell script; and we should
-        # ignore that. We don't want it to appear
-        # in our list of execed files.
-        if len(self.syscalls) > 0:
-            first_syscall = self.syscalls[0]
-            if isinstance(first_syscall, syscall.exec_family):
-                xname = first_syscall.get_file_execed()
-                if xname == "/bin/sh":
-                    self.syscalls = self.syscalls[1:]
+        if type(strace_op_data) == types.StringType:
+            lines = cStringIO.StringIO(strace_op_data)
+        else:
+            lines = strace_op_data
+
+        self.ignore_files_read = {}
+        self.ignore_files_written = {}
+
+        self.files_read = FileSet()
+        self.files_written = FileSet()
+        self.files_execed = FileSet()
+        self.files_stated = FileSet()
+        self.files_accessed = FileSet()
+        self.files_unlinked = FileSet()
+        self.dirs_made = FileSet()
+
+        # Key = directory, Value = the number of files that were not
+        # found in it
+        self.failed_lookups = {}
+        self.failed_execs = {}
+
+        self.times = SyscallTimes()
+
+        self.__read(lines)
 
     def set_debug(self, new_value):
         """Turn on or off debug mode in the syscall module.
@@ -87,182 +274,268 @@ class StraceOutput:
         syscall.debug_mode = new_value
 
     def remove_read(self, filename):
-        self.ignore_files_read.append(filename)
+        self.ignore_files_read[filename] = None
 
     def remove_written(self, filename):
-        self.ignore_files_written.append(filename)
-
-    def __syscall_obj(self, line):
-        """ parses the strace output line and returns a appropriate system call
-        object """
-    
-        # matching a info message.
-        if INFO_REGEX.match(line):
-            return None
-        if INFO_REGEX2.match(line):
-            return None
-    
-        (pid, name, args, retval, errmsg, state) = self.__parse_strace_op(line)
- 
-        # see if the module 'syscall' has a subclass defined with syscall_name, 
-        # if so return the object of syscall_name other wise return object of base
-        # class syscall.SysCall
-        syscall_base_class = syscall.SysCall
-
-        if hasattr(syscall, name):
-            syscall_class = getattr(syscall, name)
-            if not issubclass(syscall_class, syscall_base_class):
-                assert "%s is defined but it is not sub class of %s" % \
-                            (syscall_class, syscall_base_class)
-        else:
-            syscall_class = syscall_base_class
+        self.ignore_files_written[filename] = None
 
-        return syscall_class(pid, name, args, retval, errmsg, state)
+    def __read(self, lines):
+        """Read the strace output and find the files of each system
+        call, tracking the cwd and the file descriptors of each
+        process."""
+        cwd = CWD()
+        categories = (
+            ("get_file_read", self.files_read),
+            ("get_file_written", self.files_written),
+            ("get_file_execed", self.files_execed),
+            ("get_file_stated", self.files_stated),
+            ("get_file_accessed", self.files_accessed),
+            ("get_file_unlinked", self.files_unlinked),
+            ("get_dir_made", self.dirs_made),
+        )
+
+        for curr_syscall in read_syscalls(lines, self.times):
+            # if the system call does chdir update the cwd info.
 
-            
-    
-    def __parse_strace_op(self, line):
-        match = SYSCALL_REGEX.match(line)
-        if match:
-            pid    = match.group('pid')
-            name   = match.group('name')
-            args   = match.group('args').split(',')
-            retval = match.group('retval')
-            errmsg = match.group('errmsg')
-            state  = syscall.COMPLETED
-            return (pid, name, args, retval, errmsg, state)
-
-        match = UNFINISHED_SYSCALL_REGEX.match(line)
-        if match:
-            pid    = match.group('pid')
-            name   = match.group('name')
-            args   = match.group('args').split(',')
-            retval = None
-            errmsg = None
-            state  = syscall.UNFINISHED
-            return (pid, name, args, retval, errmsg, state)
-
-        match = RESUMED_SYSCALL_REGEX.match(line)
-        if match:
-            pid    = match.group('pid')
-            name   = match.group('name')
-            args   = match.group('args').split(',')
-            retval = match.group('retval')
-            errmsg = match.group('errmsg')
-            state  = syscall.RESUMED
-            return (pid, name, args, retval, errmsg, state)
-
-        # We could not match any thing 
-        raise StraceParseError("%s: Unable to parse the line" % line )
-
-
-    def __read(self):
-        """ read the strace output file and return a list of systemcalls. 
-        Handles the unfinished and resumed system calls and returns the list of all
-        system calls present in the strace ouptut in the order they have
-        executed."""
-
-        # final retval
-        ret_syscalls = []
-        unfinished   = { }
-
-        for line in self.strace_op_lines:
-#            print "LINE:", line
-            if line == "":
+            dir_name = curr_syscall.get_chdir_name()
+            if dir_name:
+                cwd.update_cwd(curr_syscall.pid, dir_name)
                 continue
-            curr_syscall = self.__syscall_obj(line)
 
-            # this line might not correspond to syscall, but rather a info
-            # message
-            if curr_syscall is None:
+            # if the system call does fork/clone ..
+            child_pid = curr_syscall.get_child_pid()
+            if child_pid:
+                cwd.copy_cwd(curr_syscall.pid, child_pid)
+                self.times.AddChild(curr_syscall.pid, child_pid)
                 continue
 
-            if curr_syscall.is_completed():
-                ret_syscalls.append(curr_syscall)
-
-            # A system call is unfinished, It went to sleep before
-            # completed. Add it to the return system calls and keep it
-            # tracked under 'unfinished'. Once the system call finishes we
-            # should update the curr_syscall.
-            elif curr_syscall.is_unfinished():
-                pid_name = (curr_syscall.pid, curr_syscall.name)
-                unfinished[pid_name] = curr_syscall
-                ret_syscalls.append(curr_syscall)
-
-            # System call previously went to sleep resumed.
-            # No, need to add to the return system calls as we already
-            # added it before it went to sleep
-            elif curr_syscall.is_resumed():
-                pid_name = (curr_syscall.pid, curr_syscall.name)
-                if unfinished.has_key(pid_name):
-                    prev_syscall = unfinished[pid_name]
-                    prev_syscall.join(curr_syscall)
-                    del unfinished[pid_name]
-                else:
-                    # we got an orphaned entry :-) . Add it to the system
-                    # calls list and process as much as we can do.
-                    ret_syscalls.append(curr_syscall)
-                    
-
-        return ret_syscalls
-
+            for (syscall_method_name, files) in categories:
+                fname = getattr(curr_syscall, syscall_method_name)()
+                if not fname:
+                    continue
+
+                files.Add(fname, self.__abs_name(cwd, curr_syscall, fname))
+
+            for (syscall_method_name, failed) in (
+                    ("get_failed_lookup", self.failed_lookups),
+                    ("get_failed_exec", self.failed_execs)):
+                fname = getattr(curr_syscall, syscall_method_name)()
+                if fname:
+                    dir_name = os.path.dirname(self.__abs_name(cwd,
+                        curr_syscall, fname))
+                    failed[dir_name] = failed.get(dir_name, 0) + 1
+
+            if curr_syscall.duration != None and \
+                    syscall.time_class(curr_syscall.name) == syscall.TIME_FILE:
+                fname = curr_syscall.get_file_timed()
+                if fname:
+                    fname = self.__abs_name(cwd, curr_syscall, fname)
+                elif isinstance(curr_syscall, syscall.fd_syscall):
+                    fname = cwd.get_fd_file(curr_syscall.pid,
+                            curr_syscall.get_fd())
+                if fname:
+                    self.times.AddFile(fname, curr_syscall.duration)
+
+            # Remember the file of a new file descriptor, in case it is
+            # a directory that later file names are relative to.
+            fd = curr_syscall.get_fd_opened()
+            if fd:
+                fname = curr_syscall.get_path()
+                if fname:
+                    cwd.add_fd(curr_syscall.pid, fd,
+                            self.__abs_name(cwd, curr_syscall, fname))
+
+            fd = curr_syscall.get_fd_closed()
+            if fd:
+                cwd.remove_fd(curr_syscall.pid, fd)
+
+    def __abs_name(self, cwd, curr_syscall, fname):
+        if os.path.isabs(fname):
+            return fname
+        else:
+            return os.path.join(cwd.get_dir(curr_syscall.pid,
+                curr_syscall.get_dirfd()), fname)
 
     def get_files_written(self):
-        return self._get_files("get_file_written", self.ignore_files_written)
+        return self.files_written.Files(self.ignore_files_written)
 
     def get_files_read(self):
-        return self._get_files("get_file_read", self.ignore_files_read)
+        return self.files_read.Files(self.ignore_files_read)
 
     def get_files_execed(self):
-        return self._get_files("get_file_execed", [])
+        return self.files_execed.Files({})
 
-    def _get_files(self, syscall_method_name, ignore_list):
-        """Generic handler for finding files in the strace output"""
-        files_result = []
-        cwd = CWD()
+    def get_files_stated(self):
+        return self.files_stated.Files({})
 
-        for syscall in self.syscalls:
-            # if the system call does chdir update the cwd info.
+    def get_files_accessed(self):
+        return self.files_accessed.Files({})
 
-            dir_name = syscall.get_chdir_name()
-            if dir_name:
-                cwd.update_cwd(syscall.pid, dir_name)
-                continue
+    def get_files_unlinked(self):
+        return self.files_unlinked.Files({})
 
-            # if the system call does fork/clone ..
-            child_pid = syscall.get_child_pid()
-            if child_pid:
-                cwd.copy_cwd(syscall.pid, child_pid)
-                continue
+    def get_dirs_made(self):
+        return self.dirs_made.Files({})
 
-            if hasattr(syscall, syscall_method_name):
-                syscall_method = getattr(syscall, syscall_method_name)
-            else:
-                continue
+    def get_failed_lookups(self):
+        """Returns a dictionary of the directories in which files were
+        not found, and how many."""
+        return self.failed_lookups
+
+    def get_failed_execs(self):
+        """The same as get_failed_lookups(), for the programs that a
+        process tried to exec."""
+        return self.failed_execs
+
+    def get_syscall_times(self):
+        """Returns the time spent in each class of system calls (see
+        syscall.time_class()), or None if the strace output has no
+        times."""
+        return self.times.ClassTimes()
+
+    def get_file_times(self):
+        """Returns the time of the file I/O of each file, or None if
+        the strace output has no times."""
+        return self.times.FileTimes()
 
-            fname = syscall_method()
-            if fname:
-                if os.path.isabs(fname):
-                    abs_fname = fname
-                else:
-                    abs_fname = os.path.join(cwd.get_cwd(syscall.pid), fname)
 
-                if not fname in ignore_list:
-                    # Avoid duplicates
-                    if not abs_fname in files_result:
-                        files_result.append(abs_fname)
+class FileSet:
+    """The files of one kind (read, written, or execed), in the order
+    they were first seen, without duplicates. Each file is kept with
+    its name as it was in the system call, as the files to ignore are
+    given by those names."""
+
+    def __init__(self):
+        self.files = []
+        self.seen = { }
+
+    def Add(self, fname, abs_fname):
+        if not self.seen.has_key((fname, abs_fname)):
+            self.seen[(fname, abs_fname)] = None
+            self.files.append((fname, abs_fname))
+
+    def Files(self, ignore_files):
+        """Returns the absolute file names, except the ones that were
+        named as one of the ignore_files (a dictionary)."""
+        files_result = []
+        seen = { }
+
+        for (fname, abs_fname) in self.files:
+            if ignore_files.has_key(fname) or seen.has_key(abs_fname):
+                continue
+            seen[abs_fname] = None
+            files_result.append(abs_fname)
 
         return files_result
 
 
 
 
+class SyscallTimes:
+    """The time spent in the system calls of strace output with times
+    (strace -ttt -T), by class of system call, and the time of the
+    file I/O, by file.
+
+    A process that waits for its children does nothing itself while
+    they run, so the time of a wait is only counted, as "spawn" time,
+    for the part of it when none of the process's children were
+    running. The timestamps give when each process was running."""
+
+    def __init__(self):
+        self.timed = False
+        self.class_times = {
+            syscall.TIME_FILE : 0.0,
+            syscall.TIME_SPAWN : 0.0,
+            syscall.TIME_OTHER : 0.0,
+        }
+        self.file_times = {}
+
+        # (pid, start, end) of each wait
+        self.waits = []
+
+        # Key = pid, Value = [first time, last time]
+        self.lifetimes = {}
+
+        # Key = pid, Value = list of its children's pids
+        self.children = {}
+
+    def AddLine(self, pid, time, name, duration, resumed):
+        """Add the time of a line of strace output. 'name' is None
+        for an info message."""
+        self.timed = True
+
+        # A resumed line is printed when the system call finishes.
+        start = time
+        if resumed and duration != None:
+            start = time - duration
+        end = start + (duration or 0.0)
+
+        lifetime = self.lifetimes.get(pid)
+        if lifetime == None:
+            self.lifetimes[pid] = [start, end]
+        else:
+            lifetime[0] = min(lifetime[0], start)
+            lifetime[1] = max(lifetime[1], end)
+
+        if name == None or duration == None:
+            return
+
+        time_class = syscall.time_class(name)
+        if time_class == None:
+            self.waits.append((pid, start, end))
+        else:
+            self.class_times[time_class] += duration
+
+    def AddChild(self, pid, child_pid):
+        self.children.setdefault(pid, []).append(child_pid)
+
+    def AddFile(self, fname, duration):
+        self.file_times[fname] = self.file_times.get(fname, 0.0) + duration
+
+    def ClassTimes(self):
+        if not self.timed:
+            return None
+
+        times = self.class_times.copy()
+        for (pid, start, end) in self.waits:
+            children = [self.lifetimes[child_pid]
+                    for child_pid in self.children.get(pid, [])
+                    if self.lifetimes.has_key(child_pid)]
+            times[syscall.TIME_SPAWN] += uncovered_time(start, end, children)
+        return times
+
+    def FileTimes(self):
+        if not self.timed:
+            return None
+        return self.file_times
+
+
+def uncovered_time(start, end, intervals):
+    """Returns the time from start to end that is not in any of the
+    [start, end] intervals."""
+    intervals = [(max(start, i_start), min(end, i_end))
+            for (i_start, i_end) in intervals
+            if i_start < end and i_end > start]
+    intervals.sort()
+
+    covered = 0.0
+    covered_to = start
+    for (i_start, i_end) in intervals:
+        if i_end <= covered_to:
+            continue
+        covered += i_end - max(i_start, covered_to)
+        covered_to = i_end
+    return max(end - start - covered, 0.0)
+
+
 class CWD:
-    """ Tracks the current working dir of the processes used in the strace output
+    """ Tracks the current working dir of the processes used in the strace output,
+    and the files of their file descriptors, for the *at() system calls.
     """
 
     def __init__(self):
         self.process_cwd = { }
+        self.process_fds = { }
 
 
     def get_cwd(self, pid):
@@ -298,16 +571,45 @@ class CWD:
         """ set the CWD of child process same as the parent process """
         self.process_cwd[child_pid] = self.get_cwd(parent_pid)
 
+        # The child inherits the file descriptors, too.
+        if self.process_fds.has_key(parent_pid):
+            self.process_fds[child_pid] = self.process_fds[parent_pid].copy()
+
+    def add_fd(self, pid, fd, fname):
+        """ fd of process pid is the file fname """
+        self.process_fds.setdefault(pid, {})[fd] = fname
+
+    def remove_fd(self, pid, fd):
+        """ fd of process pid was closed """
+        fds = self.process_fds.get(pid)
+        if fds and fds.has_key(fd):
+            del fds[fd]
+
+    def get_fd_file(self, pid, fd):
+        """ returns the file of fd of process pid, or None """
+        return self.process_fds.get(pid, {}).get(fd)
+
+    def get_dir(self, pid, dirfd):
+        """ returns the directory that a relative file name is relative to:
+        the cwd of process pid, or the directory of its file descriptor dirfd.
+        If the directory of dirfd is not known, the file name stays relative. """
+        if dirfd == None:
+            return self.get_cwd(pid)
+
+        return self.process_fds.get(pid, {}).get(dirfd, "")
+
 
 def StraceFile(filename):
-    data = open(filename).read()
-    return StraceOutput(data)
+    fh = open(filename)
+    try:
+        return StraceOutput(fh)
+    finally:
+        fh.close()
     
     
 def _test():
     for file in sys.argv[1:]:
-        data = open(file).read()
-        strace_op_file = StraceOutput(data)
+        strace_op_file = StraceFile(file)
         print "File:", file
         print
         print "Written:"
@@ -10,10 +10,53 @@ COMPLETED  = 'completed'
 # only a particular log_record.pid
 debug_mode = False
 
+# The classes of system calls, for the time spent in them (with
+# strace -T). The time that a process spends waiting for its children
+# is "spawn" time only while it has no children running.
+TIME_FILE  = 'file'
+TIME_SPAWN = 'spawn'
+TIME_OTHER = 'other'
+# In the order of the tuple stored in the log; see SYSCALL_TIME_FIELDS
+# in instmake_log.
+TIME_CLASSES = [ TIME_FILE, TIME_SPAWN, TIME_OTHER ]
+
+FILE_SYSCALLS = [ "open", "openat", "creat", "close", "read", "write",
+    "pread64", "pwrite64", "readv", "writev", "preadv", "pwritev", "lseek",
+    "stat", "lstat", "fstat", "newfstatat", "statx", "statfs", "fstatfs",
+    "access", "faccessat", "faccessat2", "readlink", "readlinkat",
+    "getdents", "getdents64", "unlink", "unlinkat", "mkdir", "mkdirat",
+    "rmdir", "rename", "renameat", "renameat2", "link", "linkat",
+    "symlink", "symlinkat", "chmod", "fchmod", "fchmodat", "chown",
+    "fchown", "lchown", "fchownat", "utime", "utimes", "utimensat",
+    "truncate", "ftruncate", "fsync", "fdatasync", "sendfile",
+    "copy_file_range" ]
+
+SPAWN_SYSCALLS = [ "fork", "vfork", "clone", "clone3", "execve",
+    "execveat" ]
+
+WAIT_SYSCALLS = [ "wait4", "waitid", "waitpid" ]
+
+def time_class(name):
+    """Returns the class of a system call, for its time, or None
+    for the wait system calls."""
+    if name in FILE_SYSCALLS:
+        return TIME_FILE
+    elif name in SPAWN_SYSCALLS:
+        return TIME_SPAWN
+    elif name in WAIT_SYSCALLS:
+        return None
+    else:
+        return TIME_OTHER
+
 class InvalidSysCallInfo(Exception):
     pass
 
 class SysCall:
+    # With strace -ttt and -T: when the system call started,
+    # and how long it took, in seconds.
+    time = None
+    duration = None
+
     def __init__(self, pid, name, args, retval, errmsg, state):
 
         self.pid        = pid
@@ -60,6 +103,7 @@ class SysCall:
         self.retval      = other.retval
         self.errmsg      = other.errmsg
         self.state       = COMPLETED
+        self.duration    = other.duration
 
 
     def is_retval_negative(self):
@@ -77,6 +121,13 @@ class SysCall:
         else:
             return False
 
+    def is_enoent(self):
+        """Did the system call fail because the file did not exist?"""
+        if not self.is_completed() or not self.is_retval_negative():
+            return False
+        return self.errmsg != None and \
+                self.errmsg.split()[:1] == ["ENOENT"]
+
 
     # system call functions, needs to be over-ridden by individual subclasses..
 
@@ -95,6 +146,43 @@ class SysCall:
     def get_chdir_name(self):
         pass
 
+    def get_file_stated(self):
+        pass
+
+    def get_file_accessed(self):
+        pass
+
+    def get_file_unlinked(self):
+        pass
+
+    def get_dir_made(self):
+        pass
+
+    def get_dirfd(self):
+        """The directory file descriptor that a relative file name is
+        relative to, or None if it is relative to the cwd"""
+        pass
+
+    def get_fd_opened(self):
+        pass
+
+    # A lookup of a file that does not exist, as when a compiler looks
+    # for a header in each -I directory until it finds it.
+    def get_failed_lookup(self):
+        pass
+
+    # The same, for a program, as when a shell looks for it in each
+    # directory in PATH.
+    def get_failed_exec(self):
+        pass
+
+    # The file whose I/O the time of the system call is for
+    def get_file_timed(self):
+        pass
+
+    def get_fd_closed(self):
+        pass
+
 
 
 # Add one class for each system call we want to track 
@@ -107,51 +195,234 @@ class SysCall:
 # These cases are rare, but they do occur. Do as much processing as possible to
 # mine the information. 
 
-class open(SysCall):
+class path_syscall(SysCall):
+    """A system call whose argument FNAME_ARG is a file name. If
+    DIRFD_ARG is set, a relative file name is relative to the directory
+    file descriptor in that argument, as in the *at() system calls."""
+
+    FNAME_ARG = 0
+    DIRFD_ARG = None
+
+    def _fname(self):
+        """The file name, without its quotes, or None if the
+        system call doesn't have it."""
+        if len(self.args) <= self.FNAME_ARG:
+            return None
+
+        fname = self.args[self.FNAME_ARG]
+        fname = fname.rstrip(' "')
+        fname = fname.lstrip(' "')
+        return fname
+
+    def get_path(self):
+        if self.is_retval_negative():
+            return None
+        return self._fname()
+
+    def get_file_timed(self):
+        return self._fname()
+
+    def get_failed_path(self):
+        """The file name, if the file did not exist."""
+        if not self.is_enoent():
+            return None
+        return self._fname()
+
+    def get_dirfd(self):
+        if self.DIRFD_ARG == None or len(self.args) <= self.DIRFD_ARG:
+            return None
+
+        dirfd = self.args[self.DIRFD_ARG].strip()
+        if dirfd == "AT_FDCWD":
+            return None
+        return dirfd
+
+
+class open(path_syscall):
 
     def get_file_read(self):
 
         if self.is_completed():
-            if len(self.args) < 2:
+            if len(self.args) < self.FNAME_ARG + 2:
                 assert "%s: Number of arguments to open system call should be atleast 2" % self
         else:
 #            print "Warning %s: incomplete system call" % self
-            if len(self.args) < 2:
+            if len(self.args) < self.FNAME_ARG + 2:
                 return None
 
         if self.is_retval_negative():
             return None
 
-        fname = self.args[0]
-        flags = self.args[1]
+        flags = self.args[self.FNAME_ARG + 1]
 
         if 'O_RDONLY' in flags or 'O_RDWR' in flags:
-            fname = fname.rstrip(' "')
-            fname = fname.lstrip(' "')
-            return fname
+            return self._fname()
 
 
     def get_file_written(self):
 
         if self.is_completed():
-            if len(self.args) < 2:
+            if len(self.args) < self.FNAME_ARG + 2:
                 assert "%s: Number of arguments to open system call should be atleast 2" % self
         else:
 #            print "Warning %s: incomplete system call" % self
-            if len(self.args) < 2:
+            if len(self.args) < self.FNAME_ARG + 2:
                 return None
 
         if self.is_retval_negative():
             return None
 
-        fname = self.args[0]
-        flags = self.args[1]
+        flags = self.args[self.FNAME_ARG + 1]
 
         # anything other than O_RDONLY (O_RDWR, O_WRONLY, O_CREATE means write) 
         if 'O_RDONLY' not in flags:
-            fname = fname.rstrip(' "')
-            fname = fname.lstrip(' "')
-            return fname
+            return self._fname()
+
+    def get_fd_opened(self):
+        if not self.is_completed() or self.is_retval_negative():
+            return None
+        return self.retval
+
+    def get_failed_lookup(self):
+        return self.get_failed_path()
+
+
+class openat(open):
+    # 29129 openat(AT_FDCWD, "/etc/ld.so.cache", O_RDONLY|O_CLOEXEC) = 3
+    FNAME_ARG = 1
+    DIRFD_ARG = 0
+
+
+class creat(path_syscall):
+
+    def get_file_written(self):
+        return self.get_path()
+
+    def get_fd_opened(self):
+        if not self.is_completed() or self.is_retval_negative():
+            return None
+        return self.retval
+
+
+class stat(path_syscall):
+    # Only the files that exist; the probes for files that don't
+    # exist fail.
+
+    def get_file_stated(self):
+        return self.get_path()
+
+    def get_failed_lookup(self):
+        return self.get_failed_path()
+
+class lstat(stat):
+    pass
+
+class newfstatat(stat):
+    # 29129 newfstatat(AT_FDCWD, "a.h", {st_mode=S_IFREG|0644, ...}, 0) = 0
+    FNAME_ARG = 1
+    DIRFD_ARG = 0
+
+class statx(newfstatat):
+    pass
+
+
+class access(path_syscall):
+
+    def get_file_accessed(self):
+        return self.get_path()
+
+    def get_failed_lookup(self):
+        return self.get_failed_path()
+
+class faccessat(access):
+    FNAME_ARG = 1
+    DIRFD_ARG = 0
+
+class faccessat2(faccessat):
+    pass
+
+
+class unlink(path_syscall):
+
+    def get_file_unlinked(self):
+        return self.get_path()
+
+class unlinkat(unlink):
+    FNAME_ARG = 1
+    DIRFD_ARG = 0
+
+
+class mkdir(path_syscall):
+
+    def get_dir_made(self):
+        return self.get_path()
+
+class mkdirat(mkdir):
+    FNAME_ARG = 1
+    DIRFD_ARG = 0
+
+
+class fd_syscall(SysCall):
+    """A system call on a file descriptor, which is the first argument.
+    These are only parsed for their time, in strace output with times,
+    as there are so many of them."""
+
+    def get_fd(self):
+        if len(self.args) < 1:
+            return None
+        return self.args[0].strip()
+
+class read(fd_syscall):
+    pass
+
+class write(fd_syscall):
+    pass
+
+class pread64(fd_syscall):
+    pass
+
+class pwrite64(fd_syscall):
+    pass
+
+class readv(fd_syscall):
+    pass
+
+class writev(fd_syscall):
+    pass
+
+class preadv(fd_syscall):
+    pass
+
+class pwritev(fd_syscall):
+    pass
+
+class lseek(fd_syscall):
+    pass
+
+class fstat(fd_syscall):
+    pass
+
+class getdents(fd_syscall):
+    pass
+
+class getdents64(fd_syscall):
+    pass
+
+class fsync(fd_syscall):
+    pass
+
+class fdatasync(fd_syscall):
+    pass
+
+class ftruncate(fd_syscall):
+    pass
+
+class close(fd_syscall):
+
+    def get_fd_closed(self):
+        if not self.is_completed() or self.is_retval_negative():
+            return None
+        return self.get_fd()
 
 
 class chdir(SysCall):
@@ -193,6 +464,12 @@ class fork(SysCall):
 class clone(fork):
     pass
 
+class clone3(fork):
+    pass
+
+class vfork(fork):
+    pass
+
 class rename(SysCall):
 
     def get_file_written(self):
@@ -241,6 +518,15 @@ class exec_family(SysCall):
         xname = xname.lstrip(' "')
         return xname
 
+    def get_failed_exec(self):
+        if len(self.args) < 1 or not self.is_enoent():
+            return None
+
+        xname = self.args[0]
+        xname = xname.rstrip(' "')
+        xname = xname.lstrip(' "')
+        return xname
+
 class execve(exec_family):
     # 29129 execve("/bin/hostname", ["/bin/hostname"], [/* 68 vars */]) = 0
     pass
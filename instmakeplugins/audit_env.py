@@ -6,6 +6,8 @@ Record all environment variables.
 import os
 import sys
 
+from instmakelib import instmake_build
+
 description = "Record all environment variables"
 
 def usage():
@@ -27,7 +29,10 @@ class Auditor:
         return None
 
     def CommandFinished(self, cexit, cretval):
-        return cretval, os.environ
+        # The environment is about the same for every job, so it is
+        # stored as a snapshot.
+        return cretval, instmake_build.make_snapshot_ref(os.environ,
+                instmake_build.VOLATILE_ENV_VARS)
 
 def ParseData(audit_data, log_record, audit_env_options):
     """Read the strace data."""
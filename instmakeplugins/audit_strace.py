@@ -9,12 +9,15 @@ import subprocess
 import tempfile
 
 from instmakelib import straceparse
+from instmakelib import syscall
 
 description = "Record syscalls via strace"
 
 # CLI options
 OPT_STRACE = "strace"
 OPT_EXTERNAL = "ext-logs"
+OPT_PARSE = "parse"
+OPT_TIMES = "times"
 OPT_LEAVE_COMMANDS = "leave-cmds"
 OPT_WORK_DIR = "work-dir"
 
@@ -22,9 +25,16 @@ OPT_WORK_DIR = "work-dir"
 LEAVE = "L"
 REMOVE = "R"
 
-# Should the strace logs be external or internal to the instmake log
+# Should the strace logs be external or internal to the instmake log,
+# or be parsed by the instmake of each job, which then stores only the
+# files that were read, written and execed (see compact_file_lists).
 EXTERNAL_LOGS = "X"
 INTERNAL_LOGS = "I"
+PARSED_LOGS = "P"
+
+# Should strace record the time of each system call?
+TIMES = "T"
+NO_TIMES = "N"
 
 # strace_prog = 'strace'
 STRACE_PROG = "strace"
@@ -49,6 +59,13 @@ def usage():
     print "       %s : keep strace log files external from instmake log" % \
             (OPT_EXTERNAL,)
 
+    print "          %s : parse the strace logs as each command finishes," % \
+            (OPT_PARSE,)
+    print "                  and keep only the lists of files in the instmake log"
+
+    print "          %s : record the time of each system call (strace -ttt -T)" % \
+            (OPT_TIMES,)
+
     print "     %s : leave the temporary shell scripts on disk" % \
             (OPT_LEAVE_COMMANDS,)
 
@@ -60,6 +77,7 @@ def usage():
 def CheckCLI(options):
     LEAVE_CMDS = REMOVE
     EXTERNAL = INTERNAL_LOGS
+    TIMED = NO_TIMES
     STRACE = os.environ.get(STRACE_PROG_ENV_VAR, STRACE_PROG)
     WORK_DIR = os.environ.get(LOG_DIR_ENV_VAR, tempfile.gettempdir())
 
@@ -70,7 +88,17 @@ def CheckCLI(options):
             if option == OPT_LEAVE_COMMANDS:
                 LEAVE_CMDS = LEAVE
             elif option == OPT_EXTERNAL:
+                if EXTERNAL == PARSED_LOGS:
+                    sys.exit("Use only one of the strace audit options "
+                            "%s and %s" % (OPT_EXTERNAL, OPT_PARSE))
                 EXTERNAL = EXTERNAL_LOGS
+            elif option == OPT_PARSE:
+                if EXTERNAL == EXTERNAL_LOGS:
+                    sys.exit("Use only one of the strace audit options "
+                            "%s and %s" % (OPT_EXTERNAL, OPT_PARSE))
+                EXTERNAL = PARSED_LOGS
+            elif option == OPT_TIMES:
+                TIMED = TIMES
             else:
                 sys.exit("Unrecognized strace audit option '%s'" % (option,))
 
@@ -104,13 +132,14 @@ def CheckCLI(options):
     except subprocess.CalledProcessError as e:
         sys.exit("Unable to execute '%s': %s" % (' '.join(cmdv)), str(e))
 
-    audit_options = "|".join([LEAVE_CMDS, EXTERNAL, STRACE, WORK_DIR])
+    audit_options = "|".join([LEAVE_CMDS, EXTERNAL, STRACE, WORK_DIR, TIMED])
     return audit_options
 
 class Auditor:
     def __init__(self, audit_options):
         (self.leave_temp, self.ext_logs,
-                self.strace, self.temp_dir) = audit_options.split("|")
+                self.strace, self.temp_dir,
+                self.timed) = audit_options.split("|")
         self.cmd_file       = None
         self.strace_op_file = None
 
@@ -139,8 +168,10 @@ class Auditor:
             os.system("touch %s" % self.strace_op_file)
 
             exec_proc = self.strace
-            exec_args = [self.strace, "-f", "-o", self.strace_op_file,
-                    "sh", self.cmd_file]
+            exec_args = [self.strace, "-f", "-o", self.strace_op_file]
+            if self.timed == TIMES:
+                exec_args.extend(["-ttt", "-T"])
+            exec_args.extend(["sh", self.cmd_file])
 
             return exec_proc, exec_args
 
@@ -150,7 +181,13 @@ class Auditor:
 
 
     def CommandFinished(self, cexit, cretval):
-        """Returns a tuple: (retval of command, text result of strace)"""
+        """Returns a tuple: (retval of command, result of strace). The
+        result is (cmd_file, name of the strace log) for external logs,
+        (cmd_file, text of the strace log) for internal logs, and
+        (cmd_file, directories, read, written, execed, failed,
+        syscall times, file times, stated, accessed, unlinked,
+        directories made) for parsed logs, or (cmd_file, text of the
+        strace log) if it can't be parsed."""
 
         strace_output = None
 
@@ -188,13 +225,30 @@ class Auditor:
                 except IOError:
                     pass
 
+            # Or we parse the strace log now, and store only the files
+            elif self.ext_logs == PARSED_LOGS:
+                try:
+                    fh = open(self.strace_op_file)
+                    try:
+                        try:
+                            strace_output = (self.cmd_file,) + \
+                                    compact_file_lists(parse_strace(fh,
+                                        self.cmd_file))
+                        except straceparse.StraceParseError:
+                            fh.seek(0)
+                            strace_output = (self.cmd_file, fh.read())
+                    finally:
+                        fh.close()
+                except IOError:
+                    return (cretval, None)
+
             if self.leave_temp == REMOVE:
                 try:
                     os.unlink(self.cmd_file)
                 except OSError:
                     pass
 
-                if self.ext_logs == INTERNAL_LOGS:
+                if self.ext_logs in (INTERNAL_LOGS, PARSED_LOGS):
                     try:
                         os.unlink(self.strace_op_file)
                     except OSError:
@@ -223,33 +277,147 @@ class Auditor:
         return cmd_file
 
 
+def parse_strace(strace_op_data, cmd_file):
+    """Parse a strace log, from its text or a file object.
+    Returns the StraceOutput."""
+    strace_data = straceparse.StraceOutput(strace_op_data)
+
+    # Ignore the command-file
+    strace_data.remove_read(cmd_file) 
+    strace_data.remove_read("/dev/tty")
+    strace_data.remove_written("/dev/tty")
+    return strace_data
+
+def compact_file_lists(strace_data):
+    """Returns the files read, written and execed of a StraceOutput,
+    its failed lookups and its times, in the form that is stored in the
+    instmake log: (directories, read, written, execed, failed,
+    syscall times, file times, stated, accessed, unlinked, directories
+    made). Each list of files is a tuple of
+    (directory number, file name) pairs, so that a directory is stored
+    once, and a file that is both read and written is stored once, too,
+    as pickle stores the same string object only once. The failed
+    lookups are (directory number, lookups, execs) tuples. The syscall
+    times are a tuple of the times of the syscall.TIME_CLASSES, and the
+    file times are (directory number, file name, seconds) tuples; both
+    are None if the strace log has no times."""
+    dir_numbers = {}
+    dirs = []
+    names = {}
+
+    def number(dir_name):
+        dir_number = dir_numbers.get(dir_name)
+        if dir_number == None:
+            dir_number = len(dirs)
+            dir_numbers[dir_name] = dir_number
+            dirs.append(dir_name)
+        return dir_number
+
+    def compact(paths):
+        pairs = []
+        for path in paths:
+            (dir_name, name) = os.path.split(path)
+            pairs.append((number(dir_name), names.setdefault(name, name)))
+        return tuple(pairs)
+
+    read = compact(strace_data.get_files_read())
+    written = compact(strace_data.get_files_written())
+    execed = compact(strace_data.get_files_execed())
+    failed = tuple([(number(dir_name), lookups, execs)
+        for (dir_name, (lookups, execs))
+        in failed_lookups(strace_data).items()])
+
+    syscall_times = strace_data.get_syscall_times()
+    if syscall_times != None:
+        syscall_times = tuple([syscall_times[name]
+            for name in syscall.TIME_CLASSES])
+    file_times = strace_data.get_file_times()
+    if file_times != None:
+        file_times = tuple([(number(os.path.dirname(path)),
+            names.setdefault(os.path.basename(path),
+                os.path.basename(path)), seconds)
+            for (path, seconds) in file_times.items()])
+
+    stated = compact(strace_data.get_files_stated())
+    accessed = compact(strace_data.get_files_accessed())
+    unlinked = compact(strace_data.get_files_unlinked())
+    dirs_made = compact(strace_data.get_dirs_made())
+
+    return (tuple(dirs), read, written, execed, failed, syscall_times,
+            file_times, stated, accessed, unlinked, dirs_made)
+
+def expand_file_list(dirs, pairs):
+    """The opposite of compact_file_lists(), for one list of files."""
+    return [os.path.join(dirs[dir_number], name)
+            for (dir_number, name) in pairs]
+
+def failed_lookups(strace_data):
+    """Returns the failed lookups of a StraceOutput, as they are kept
+    in a log record: Key = directory,
+    Value = (files not found in it, programs not found in it)"""
+    lookups = strace_data.get_failed_lookups()
+    execs = strace_data.get_failed_execs()
+    failed = {}
+    for dir_name in lookups.keys() + execs.keys():
+        failed[dir_name] = (lookups.get(dir_name, 0), execs.get(dir_name, 0))
+    return failed
+
 def ParseData(audit_data, log_record, audit_env_options) :
     """Read the strace data."""
     if not audit_data:
         log_record.audit_ok = False
         return
 
+    # Logs from before the times option have one less option.
     (leave_temp, ext_logs,
-            strace, temp_dir) = audit_env_options.split("|")
+            strace, temp_dir) = audit_env_options.split("|")[:4]
+
+    # Was the strace log already parsed while building? Logs from
+    # before the failed lookups, the times, or the stat()ed, access()ed
+    # and unlinked files were kept don't have them.
+    if len(audit_data) >= 5:
+        (cmd_file, dirs, read, written, execed) = audit_data[:5]
+        log_record.audit_ok = True
+        log_record.input_files = expand_file_list(dirs, read)
+        log_record.output_files = expand_file_list(dirs, written)
+        log_record.execed_files = expand_file_list(dirs, execed)
+        if len(audit_data) > 5:
+            failed = {}
+            for (dir_number, lookups, execs) in audit_data[5]:
+                failed[dirs[dir_number]] = (lookups, execs)
+            log_record.failed_lookups = failed
+        if len(audit_data) > 6 and audit_data[6] != None:
+            log_record.syscall_times = dict(zip(syscall.TIME_CLASSES,
+                audit_data[6]))
+            file_times = {}
+            for (dir_number, name, seconds) in audit_data[7]:
+                file_times[os.path.join(dirs[dir_number], name)] = seconds
+            log_record.file_times = file_times
+        if len(audit_data) > 8:
+            (stated, accessed, unlinked, dirs_made) = audit_data[8:12]
+            log_record.stated_files = expand_file_list(dirs, stated)
+            log_record.accessed_files = expand_file_list(dirs, accessed)
+            log_record.unlinked_files = expand_file_list(dirs, unlinked)
+            log_record.made_dirs = expand_file_list(dirs, dirs_made)
+        return
 
     (cmd_file, strace_op_data) = audit_data
 
     try:
         if ext_logs == EXTERNAL_LOGS:
-            strace_log = strace_op_data
-            strace_data = straceparse.StraceFile(strace_log)
+            fh = open(strace_op_data)
+            try:
+                strace_data = parse_strace(fh, cmd_file)
+            finally:
+                fh.close()
         else:
-            strace_data = straceparse.StraceOutput(strace_op_data)
+            strace_data = parse_strace(strace_op_data, cmd_file)
     except IOError:
         log_record.audit_ok = False
+        return
 
     log_record.audit_ok = True
 
-    # Ignore the command-file
-    strace_data.remove_read(cmd_file) 
-    strace_data.remove_read("/dev/tty")
-    strace_data.remove_written("/dev/tty")
-
     # Left over code from debugging; useful to leave
     # here in case we need to debug a particular syscall
     # for a particular PID
@@ -261,6 +429,13 @@ def ParseData(audit_data, log_record, audit_env_options) :
     log_record.input_files = strace_data.get_files_read()
     log_record.output_files = strace_data.get_files_written()
     log_record.execed_files = strace_data.get_files_execed()
+    log_record.failed_lookups = failed_lookups(strace_data)
+    log_record.syscall_times = strace_data.get_syscall_times()
+    log_record.file_times = strace_data.get_file_times()
+    log_record.stated_files = strace_data.get_files_stated()
+    log_record.accessed_files = strace_data.get_files_accessed()
+    log_record.unlinked_files = strace_data.get_files_unlinked()
+    log_record.made_dirs = strace_data.get_dirs_made()
 
 
 
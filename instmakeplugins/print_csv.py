@@ -6,6 +6,11 @@ import sys
 
 description = "Print selected fields as comma-separated values."
 
+# The resource-usage fields that are printed, after the times. They
+# are empty if the log doesn't have them.
+RUSAGE_COLUMNS = [ "maxrss", "minflt", "majflt", "inblock", "oublock",
+    "nvcsw", "nivcsw" ]
+
 def PrintHeader():
     pass
 
@@ -47,7 +52,13 @@ def Print(self, fh=sys.stdout, indent=0, vspace=0):
     print >> fh, '%s,' % (self.makefile_lineno,),
 
     print >> fh, "%s," % (self.times_start[self.REAL_TIME],),
-    print >> fh, "%s" % (self.times_end[self.REAL_TIME],)
+    print >> fh, "%s," % (self.times_end[self.REAL_TIME],),
+
+    if self.rusage == None:
+        print >> fh, "," * (len(RUSAGE_COLUMNS) - 1)
+    else:
+        print >> fh, ",".join([str(self.rusage[name])
+            for name in RUSAGE_COLUMNS])
 
     if vspace:
         print >> fh
@@ -34,6 +34,20 @@ def Print(self, fh=sys.stdout, indent=0, vspace=1):
         print >> fh, "%sREAL/start:    " % (spaces,), self.times_start[self.REAL_TIME]
         print >> fh, "%sREAL/end:      " % (spaces,), self.times_end[self.REAL_TIME]
 
+    if self.rusage != None:
+        rusage = self.rusage
+        print >> fh, "%sMAX RSS:       " % (spaces,), rusage["maxrss"], "KB"
+        print >> fh, "%sPAGE FAULTS:   " % (spaces,), rusage["minflt"], "minor,", rusage["majflt"], "major"
+        print >> fh, "%sBLOCK I/O:     " % (spaces,), rusage["inblock"], "in,", rusage["oublock"], "out"
+        print >> fh, "%sCTX SWITCHES:  " % (spaces,), rusage["nvcsw"], "voluntary,", rusage["nivcsw"], "involuntary"
+
+    if self.overhead != None:
+        print >> fh, "%sOVERHEAD:      " % (spaces,), ", ".join(["%s %s" % (name, LOG.hms(self.overhead[name])) for name in LOG.OVERHEAD_FIELDS if self.overhead[name] != None])
+
+    if self.job_samples:
+        peak = max([sample["rss"] for sample in self.job_samples])
+        print >> fh, "%sJOB SAMPLES:   " % (spaces,), len(self.job_samples), "samples, peak RSS", peak, "KB"
+
     if self.make_target:
         print >> fh, "%sTARGET:        " % (spaces,), self.make_target
 
@@ -58,6 +72,44 @@ def Print(self, fh=sys.stdout, indent=0, vspace=1):
         label =      "%sEXECED FILES:  " % (spaces,)
         LOG.print_indented_list(fh, [label], self.execed_files)
 
+    if self.stated_files:
+        label =      "%sSTATED FILES:  " % (spaces,)
+        LOG.print_indented_list(fh, [label], self.stated_files)
+
+    if self.accessed_files:
+        label =      "%sACCESSED FILES:" % (spaces,)
+        LOG.print_indented_list(fh, [label], self.accessed_files)
+
+    if self.unlinked_files:
+        label =      "%sUNLINKED FILES:" % (spaces,)
+        LOG.print_indented_list(fh, [label], self.unlinked_files)
+
+    if self.made_dirs:
+        label =      "%sMADE DIRS:     " % (spaces,)
+        LOG.print_indented_list(fh, [label], self.made_dirs)
+
+    if self.failed_lookups:
+        label =      "%sNOT FOUND IN:  " % (spaces,)
+        dir_names = self.failed_lookups.keys()
+        dir_names.sort()
+        LOG.print_indented_list(fh, [label], ["%s (%d files, %d programs)" %
+            ((dir_name,) + self.failed_lookups[dir_name])
+            for dir_name in dir_names])
+
+    if self.syscall_times:
+        print >> fh, "%sSYSCALL TIME:  " % (spaces,), ", ".join(
+            ["%s %s" % (field, LOG.hms(self.syscall_times[field]))
+            for field in LOG.SYSCALL_TIME_FIELDS])
+
+    if self.file_times:
+        label =      "%sFILE TIMES:    " % (spaces,)
+        file_names = self.file_times.keys()
+        file_names.sort(lambda a, b: cmp(self.file_times[b],
+            self.file_times[a]) or cmp(a, b))
+        LOG.print_indented_list(fh, [label], ["%s %s" %
+            (LOG.hms(self.file_times[file_name]), file_name)
+            for file_name in file_names])
+
     # Environment variables
     if self.env_vars:
         labels = []
@@ -32,6 +32,16 @@ FIELD_OPEN_FDS = "open-fds"                 # list
 FIELD_MAKE_VARS = "make-vars"               # dictionary
 FIELD_MAKE_VAR_ORIGINS = "make-var-origins" # dictionary
 FIELD_APP_INST_FIELDS = "app-inst-fields"   # dictionary
+FIELD_RUSAGE = "rusage"                     # dictionary
+FIELD_OVERHEAD = "overhead"                 # dictionary
+FIELD_JOB_SAMPLES = "job-samples"           # list of dictionaries
+FIELD_FAILED_LOOKUPS = "failed-lookups"     # dictionary
+FIELD_SYSCALL_TIMES = "syscall-times"       # dictionary
+FIELD_FILE_TIMES = "file-times"             # dictionary
+FIELD_STATED_FILES = "stated-files"         # list
+FIELD_ACCESSED_FILES = "accessed-files"     # list
+FIELD_UNLINKED_FILES = "unlinked-files"     # list
+FIELD_MADE_DIRS = "made-dirs"               # list
 
 description = "Print as JSON list of dictionaries"
 
@@ -110,6 +120,27 @@ def Print(self, fh=sys.stdout, indent=0, vspace=1):
     if self.output_files != None:
         fields[FIELD_OUTPUT_FILES] = self.output_files
 
+    if self.failed_lookups != None:
+        fields[FIELD_FAILED_LOOKUPS] = self.failed_lookups
+
+    if self.syscall_times != None:
+        fields[FIELD_SYSCALL_TIMES] = self.syscall_times
+
+    if self.file_times != None:
+        fields[FIELD_FILE_TIMES] = self.file_times
+
+    if self.stated_files != None:
+        fields[FIELD_STATED_FILES] = self.stated_files
+
+    if self.accessed_files != None:
+        fields[FIELD_ACCESSED_FILES] = self.accessed_files
+
+    if self.unlinked_files != None:
+        fields[FIELD_UNLINKED_FILES] = self.unlinked_files
+
+    if self.made_dirs != None:
+        fields[FIELD_MADE_DIRS] = self.made_dirs
+
     # Environment variables
     if self.env_vars:
         fields[FIELD_ENV_VARS] = self.env_vars
@@ -129,5 +160,17 @@ def Print(self, fh=sys.stdout, indent=0, vspace=1):
     if self.app_inst != None:
         fields[FIELD_APP_INST_FIELDS] = self.app_inst
 
+    # Resource usage
+    if self.rusage != None:
+        fields[FIELD_RUSAGE] = self.rusage
+
+    # Instmake's own time
+    if self.overhead != None:
+        fields[FIELD_OVERHEAD] = self.overhead
+
+    # Samples of the job's processes
+    if self.job_samples != None:
+        fields[FIELD_JOB_SAMPLES] = self.job_samples
+
     json_text = json.dumps(fields, indent=2, separators=(',', ':'))
     print json_text,
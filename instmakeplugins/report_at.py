@@ -153,17 +153,11 @@ def find_last_proc(log_file_name):
 def find_pid(log_file_name, pid):
     # Open the log file
     log = LOG.LogFile(log_file_name)
+    rec = log.seek_pid(pid)
+    log.close()
 
-    while 1:
-        try:
-            rec = log.read_record()
-        except EOFError:
-            log.close()
-            break
-
-        if rec.pid == pid:
-            log.close()
-            return rec
+    if rec:
+        return rec
 
     sys.exit("PID %s not found." % (pid,))
 
@@ -175,8 +169,17 @@ def find_recs(log_file_name, time_start, time_end, job_types):
     if job_types != ALL_JOBS:
         parentfinder = parentfinderclass.ParentFinder()
 
+    # If we don't need to know which jobs are makes, the log index
+    # can find the records for us.
+    if job_types == ALL_JOBS:
+        if time_end == None:
+            recs = log.records_between(time_start, time_start)
+        else:
+            recs = log.records_between(time_start, time_end)
+        log.close()
+
     # Looking at a single timestamp?
-    if time_end == None:
+    elif time_end == None:
         while 1:
             try:
                 rec = log.read_record()
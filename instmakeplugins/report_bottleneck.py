@@ -9,6 +9,7 @@ import sys
 import getopt
 from instmakelib import parentfinderclass
 from instmakelib import timelineclass
+from instmakelib import reportstream
 
 from math import sqrt
 
@@ -18,14 +19,24 @@ def usage():
     print "bottleneck: NUM_PARTS", description
 
 
-def report(log_file_names, args):
+class Bottleneck(reportstream.ReportConsumer):
+    def __init__(self, num_parts):
+        self.num_parts = num_parts
+        self.parentfinder = parentfinderclass.ParentFinder()
+        self.timeline = timelineclass.Timeline()
 
-    # We only accept one log file
-    if len(log_file_names) != 1:
-        sys.exit("'bottleneck' report uses one log file.")
-    else:
-        log_file_name = log_file_names[0]
+    def record(self, rec):
+        self.parentfinder.Record(rec)
+
+        if not self.parentfinder.IsParent(rec):
+            self.timeline.Record(rec)
+
+    def finish(self):
+        self.timeline.Finalize()
+
+        run_report(self.timeline, self.num_parts)
 
+def make_consumer(log_file_name, args):
     optstring = ""
     longopts = []
 
@@ -46,26 +57,18 @@ def report(log_file_names, args):
         usage()
         sys.exit(1)
 
-    # Open the log file
-    log = LOG.LogFile(log_file_name)
-    parentfinder = parentfinderclass.ParentFinder()
-    timeline = timelineclass.Timeline()
+    return Bottleneck(num_parts)
 
-    while 1:
-        try:
-            rec = log.read_record()
-        except EOFError:
-            log.close()
-            break
-
-        parentfinder.Record(rec)
-
-        if not parentfinder.IsParent(rec):
-            timeline.Record(rec)
+def report(log_file_names, args):
 
-    timeline.Finalize()
+    # We only accept one log file
+    if len(log_file_names) != 1:
+        sys.exit("'bottleneck' report uses one log file.")
+    else:
+        log_file_name = log_file_names[0]
 
-    run_report(timeline, num_parts)
+    reportstream.run_consumer(log_file_name,
+            make_consumer(log_file_name, args))
 
 class DescriptiveStatistics:
     def __init__(self):
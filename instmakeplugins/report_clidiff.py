@@ -269,36 +269,42 @@ class Build:
     def ReadLogForPIDs(self, pids):
         log = LOG.LogFile(self.filename)
 
-        # Read the log and construct the ptree
-        while 1:
-            try:
-                rec = log.read_record()
-            except EOFError:
-                log.close()
-                break
+        # Find each record via the log index
+        for pid in pids[:]:
+            rec = log.seek_pid(pid)
+            if not rec:
+                continue
+
+            pids.remove(rec.pid)
+            rec.Print()
+            cwd = self.NormalizeDir(rec.cwd)
+            parser = self.cli_plugins.ParseRecord(rec, cwd, self.NormalizeDir)
+            if parser:
+                if self.map_cb:
+                    parser.AdjustFiles(self.map_cb)
+                parser.Dump()
+            else:
+                print "No parser found."
 
-            if rec.pid in pids:
-                pids.remove(rec.pid)
-                rec.Print()
-                cwd = self.NormalizeDir(rec.cwd)
-                parser = self.cli_plugins.ParseRecord(rec, cwd, self.NormalizeDir)
-                if parser:
-                    if self.map_cb:
-                        parser.AdjustFiles(self.map_cb)
-                    parser.Dump()
-                else:
-                    print "No parser found."
+            # Finished findind all the PIDs asked for?
+            if pids:
+                print
 
-                # Finished findind all the PIDs asked for?
-                if pids:
-                    print
-                else:
-                    return
+        log.close()
 
     def ReadLog(self, pid):
         log = LOG.LogFile(self.filename)
         pid_hash = {}
 
+        # Looking for one PID? Find it via the log index.
+        if pid:
+            rec = log.seek_pid(pid)
+            log.close()
+            if rec:
+                pid_hash[rec.pid] = rec
+                self.ParseRec(rec, pid_hash)
+            return
+
         # Read the log and construct the ptree
         while 1:
             try:
@@ -307,9 +313,8 @@ class Build:
                 log.close()
                 break
 
-            if (not pid) or (pid and rec.pid == pid):
-                pid_hash[rec.pid] = rec
-                self.ParseRec(rec, pid_hash)
+            pid_hash[rec.pid] = rec
+            self.ParseRec(rec, pid_hash)
 
 
     def ParseRec(self, rec, pid_hash):
@@ -6,8 +6,10 @@ Show concurrent processes for a single instmake log.
 # The Python libraries that we need
 from instmakelib import instmake_log as LOG
 import sys
+import time
 import getopt
 from instmakelib import concurrency
+from instmakelib import reportstream
 
 description = "Show concurrent-process stats."
 
@@ -18,6 +20,17 @@ def usage():
     print "     [--tools] summarize tools in use during each -j chunk."
     print "     [--procs] show processes during each -j chunk."
     print "     [--procs-j=N] show processes during -jN chunk."
+    print "   With instmake --live, only these options:"
+    print "     [--non-make|--only-make|--all]: DEFAULT=--non-make"
+    print "     [--window=SECONDS] average the processes over windows"
+    print "         of this many seconds. DEFAULT=%d" % (DEFAULT_WINDOW,)
+    print "     [--windows=N] show the last N windows. DEFAULT=%d" % \
+            (DEFAULT_NUM_WINDOWS,)
+
+# For --live
+DEFAULT_WINDOW = 60
+DEFAULT_NUM_WINDOWS = 10
+BAR_WIDTH = 50
 
 def report_the_procs(conprocs, jobslot):
     print "=" * 80
@@ -48,6 +61,117 @@ def report_the_tools(conprocs, jobslot):
 
     print
 
+def title_for_mode(mode):
+    if mode == concurrency.NON_MAKE:
+        return "Concurrent Non-Make Processes During Build"
+    elif mode == concurrency.ONLY_MAKE:
+        return "Concurrent Make Processes During Build"
+    elif mode == concurrency.ALL:
+        return "Concurrent Processes (Make and Non-Make) During Build"
+    else:
+        assert 0, "Mode %s not expected" % (mode,)
+
+class LiveConprocs(reportstream.ReportConsumer):
+    """Shows the concurrent processes of a build that is running."""
+
+    def __init__(self, mode, window, num_windows):
+        self.mode = mode
+        self.window = window
+        self.num_windows = num_windows
+        self.conprocs = concurrency.IncrementalConcurrency(mode)
+
+    def record(self, rec):
+        self.conprocs.AddRec(rec)
+
+    def update(self):
+        conprocs = self.conprocs
+        span = conprocs.Span()
+
+        print title_for_mode(self.mode)
+        conprocs.PrintWarnings()
+        print
+        if not span:
+            print "No processes yet."
+            return
+
+        print "Processes Considered:", conprocs.NumJobs()
+        print "Real Time So Far:    ", LOG.hms(conprocs.TotalTime())
+        print
+        print "-j SLOT       REAL TIME   %TIME"
+        tot_time = conprocs.TotalTime()
+        for (jobslot, pct_duration) in conprocs.Results():
+            print "     %2d %15s %6.2f%%" % (jobslot,
+                    LOG.hms(tot_time * pct_duration / 100.0), pct_duration)
+
+        print
+        print "Average processes per %d-second window:" % (self.window,)
+        print
+
+        (first, last) = span
+        start = max(last - self.window * self.num_windows, first)
+        averages = []
+        while start < last:
+            end = min(start + self.window, last)
+            averages.append((start, conprocs.Average(start, end)))
+            start = end
+
+        most = max([avg for (start, avg) in averages] + [1.0])
+        for (start, avg) in averages:
+            bar = "#" * int(round(BAR_WIDTH * avg / most))
+            print "%s %6.2f %s" % (time.strftime("%H:%M:%S",
+                    time.localtime(start)), avg, bar)
+
+    def finish(self):
+        self.update()
+        if not self.conprocs.TopRecord():
+            print
+            print "The build is not finished; the processes that " \
+                    "were running are not counted."
+
+def make_live_consumer(log_file_name, args):
+    mode = concurrency.NON_MAKE
+    window = DEFAULT_WINDOW
+    num_windows = DEFAULT_NUM_WINDOWS
+
+    optstring = ""
+    longopts = ["non-make", "only-make", "all", "window=", "windows="]
+
+    try:
+        opts, args = getopt.getopt(args, optstring, longopts)
+    except getopt.GetoptError:
+        usage()
+        sys.exit(1)
+
+    for opt, arg in opts:
+        if opt == "--non-make":
+            mode = concurrency.NON_MAKE
+        elif opt == "--only-make":
+            mode = concurrency.ONLY_MAKE
+        elif opt == "--all":
+            mode = concurrency.ALL
+        elif opt == "--window":
+            try:
+                window = int(arg)
+            except ValueError:
+                sys.exit("--window accepts an integer value")
+            if window < 1:
+                sys.exit("--window must be >= 1")
+        elif opt == "--windows":
+            try:
+                num_windows = int(arg)
+            except ValueError:
+                sys.exit("--windows accepts an integer value")
+            if num_windows < 1:
+                sys.exit("--windows must be >= 1")
+        else:
+            assert 0, "Unexpected option %s" % (opt,)
+
+    if args:
+        usage()
+        sys.exit(1)
+
+    return LiveConprocs(mode, window, num_windows)
+
 def report(log_file_names, args):
     mode = concurrency.NON_MAKE
     show_timeline = 0
@@ -98,16 +222,7 @@ def report(log_file_names, args):
         show_timeline, show_tools, keep_recs=keep_recs_flag)
 
     # Add an extra title line.
-    if mode == concurrency.NON_MAKE:
-        title = "Concurrent Non-Make Processes During Build"
-    elif mode == concurrency.ONLY_MAKE:
-        title = "Concurrent Make Processes During Build"
-    elif mode == concurrency.ALL:
-        title = "Concurrent Processes (Make and Non-Make) During Build"
-    else:
-        assert 0, "Mode %s not expected" % (mode,)
-
-    print title
+    print title_for_mode(mode)
     top_rec = conprocs.TopRecord()
     ovtime = top_rec.diff_times[top_rec.REAL_TIME]
 
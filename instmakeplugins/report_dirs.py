@@ -6,45 +6,51 @@ Report all dirs used in build.
 import sys
 
 from instmakelib import instmake_log as LOG
+from instmakelib import reportstream
 
 description = "Report directories used in build."
 
 def usage():
     print "dirs:", description
 
-def report(log_file_names, args):
-
-    # We only accept one log file
-    if len(log_file_names) != 1:
-        sys.exit("'mmake' report uses one log file.")
-    else:
-        log_file_name = log_file_names[0]
-
-    # Open the log file
-    log = LOG.LogFile(log_file_name)
-
-    dirs = {}
-
-    # Read the log records
-    while 1:
-        try:
-            rec = log.read_record()
-        except EOFError:
-            log.close()
-            break
+class Dirs(reportstream.ReportConsumer):
+    def __init__(self):
+        self.dirs = {}
 
+    def record(self, rec):
+        dirs = self.dirs
         if not dirs.has_key(rec.cwd):
             dirs[rec.cwd] = 1
         else:
             dirs[rec.cwd] += 1
 
-    dirnames = dirs.keys()
-    dirnames.sort()
+    def merge(self, other):
+        dirs = self.dirs
+        for (dirname, num) in other.dirs.items():
+            dirs[dirname] = dirs.get(dirname, 0) + num
 
-    maxnum = max(dirs.values())
-    width = len(str(maxnum))
-    fmt = "%%%sd %%s" % (width,)
+    def finish(self):
+        dirs = self.dirs
+        dirnames = dirs.keys()
+        dirnames.sort()
 
-    for dirname in dirnames:
-        print fmt % (dirs[dirname], dirname)
+        maxnum = max(dirs.values())
+        width = len(str(maxnum))
+        fmt = "%%%sd %%s" % (width,)
+
+        for dirname in dirnames:
+            print fmt % (dirs[dirname], dirname)
+
+def make_consumer(log_file_name, args):
+    return Dirs()
+
+def report(log_file_names, args):
+
+    # We only accept one log file
+    if len(log_file_names) != 1:
+        sys.exit("'mmake' report uses one log file.")
+    else:
+        log_file_name = log_file_names[0]
 
+    reportstream.run_consumer(log_file_name,
+            make_consumer(log_file_name, args))
@@ -11,10 +11,7 @@ def reverse_dump(records):
     return records
 
 def start_dump(records):
-    def cmp_start(x, y):
-        return cmp(x.times_start[x.REAL_TIME], y.times_start[x.REAL_TIME])
-
-    records.sort(cmp_start)
+    records.sort(key=lambda rec: rec.StartTime(rec.REAL_TIME))
     return records
 
 def sort_dump(log, func):
@@ -25,15 +22,17 @@ def sort_dump(log, func):
         try:
             rec = log.read_record()
         except EOFError:
-            log.close()
             break
 
-        records.append(rec)
+        # All the records are kept, so keep them small; they are
+        # read again to be printed.
+        records.append(LOG.CompactRecord(rec))
 
     records = func(records)
 
-    for rec in records:
+    for rec in log.seek_pids([rec.pid for rec in records]):
         rec.Print()
+    log.close()
 
 def regular_dump(log):
     # Read through the records
@@ -8,6 +8,7 @@ from __future__ import nested_scopes
 import getopt
 import sys
 from instmakelib import instmake_log as LOG
+from instmakelib import reportstream
 
 # Guard against old versions of Python
 try:
@@ -16,13 +17,11 @@ except NameError:
     False = 0
     True = not False
 
-def make_sort_func(sort_index, first_rec):
-    """Returns a function which can sort on any time field. Requires
-    an example record so the proper time index can be found for this type
-    of instmake log (earlier versions had different time storage layouts)."""
+def make_sort_key(sort_index, first_rec):
+    """Returns a function which returns the sort key for any time field.
+    Requires an example record so the proper time index can be found."""
     time_index = first_rec.TimeIndex(sort_index)
-    return lambda rec_a, rec_b : \
-        cmp(rec_a.diff_times[time_index], rec_b.diff_times[time_index])
+    return lambda rec : rec.DiffTime(time_index)
 
 description = "Show all jobs, sorted by duration"
 
@@ -37,14 +36,58 @@ def usage():
     print "\t--non-make   (show only non-make processes)"
     print "\t--make       (show only make processes)"
 
-def report(log_file_names, args):
-
-    # We only accept one log file
-    if len(log_file_names) != 1:
-        sys.exit("'duplicate' report uses one log file.")
-    else:
-        log_file_name = log_file_names[0]
-
+class Duration(reportstream.ReportConsumer):
+    def __init__(self, log_file_name, ascending, sort_field,
+            include_make_procs, only_make_procs):
+        self.log_file_name = log_file_name
+        self.ascending = ascending
+        self.sort_field = sort_field
+        self.include_make_procs = include_make_procs
+        self.only_make_procs = only_make_procs
+
+        self.records = []
+        self.ppids = {}
+
+    def record(self, rec):
+        # Create an object for each record and add it to our array.
+        # All the records are kept, so keep them small; the ones that
+        # are printed are read again.
+        self.records.append(LOG.CompactRecord(rec))
+        self.ppids[rec.ppid] = None
+
+    def finish(self):
+        records = self.records
+        ppids = self.ppids
+
+        if not records:
+            return
+
+        if self.only_make_procs:
+            # Remove chlid-processes from records
+            records = [rec for rec in records
+                        if ppids.has_key(rec.pid)]
+
+        if not self.include_make_procs:
+            # Remove parent-processes from records
+            records = [rec for rec in records
+                        if not ppids.has_key(rec.pid)]
+
+        # Sort!
+        sort_key = make_sort_key(self.sort_field, records[0])
+        records.sort(key=sort_key)
+
+        # Maybe reverse the sort.
+        if not self.ascending:
+            records.reverse()
+
+        # And dump the data.
+        log = LOG.LogFile(self.log_file_name)
+        for rec in log.seek_pids([rec.pid for rec in records]):
+            rec.Print()
+            print
+        log.close()
+
+def make_consumer(log_file_name, args):
     # Defaults
     ascending = 1
     sort_field = "CPU"
@@ -82,47 +125,16 @@ def report(log_file_names, args):
         else:
             assert 0, "%s option not handled." % (opt,)
 
-    # Open the log file
-    log = LOG.LogFile(log_file_name)
-
-    records = []
-    ppids = {}
-
-    # Read through the records
-    while 1:
-        try:
-            rec = log.read_record()
-        except EOFError:
-            log.close()
-            break
-
-        # Create an object for each record and add it to our array
-        records.append(rec)
-        ppids[rec.ppid] = None
-#        ppids.setdefault(rec.ppid, []).append(rec.pid)
-
-    if not records:
-        return
-
-    if only_make_procs:
-        # Remove chlid-processes from records
-        records = [rec for rec in records
-                    if ppids.has_key(rec.pid)]
-
-    if not include_make_procs:
-        # Remove parent-processes from records
-        records = [rec for rec in records
-                    if not ppids.has_key(rec.pid)]
-
-    # Sort!
-    sort_func = make_sort_func(sort_field, records[0])
-    records.sort(sort_func)
-
-    # Maybe reverse the sort.
-    if not ascending:
-        records.reverse()
-
-    # And dump the data.
-    for rec in records:
-        rec.Print()
-        print
+    return Duration(log_file_name, ascending, sort_field,
+            include_make_procs, only_make_procs)
+
+def report(log_file_names, args):
+
+    # We only accept one log file
+    if len(log_file_names) != 1:
+        sys.exit("'duplicate' report uses one log file.")
+    else:
+        log_file_name = log_file_names[0]
+
+    reportstream.run_consumer(log_file_name,
+            make_consumer(log_file_name, args))
@@ -0,0 +1,268 @@
+# Copyright (c) 2012 by Cisco Systems, Inc.
+"""
+Line up the host samples of a build (taken with instmake --host-samples)
+with the number of jobs that were running, to tell whether a phase of
+the build with few jobs running was limited by make, or by the host.
+"""
+
+import getopt
+import sys
+import time
+from instmakelib import instmake_log as LOG
+from instmakelib import concurrency
+
+description = "Show the host's load, CPU, memory and I/O during the build."
+
+def usage():
+    print "host:", description
+    print "\t--window=SECONDS   one line per SECONDS seconds (default %d)" % \
+            (DEFAULT_WINDOW,)
+
+DEFAULT_WINDOW = 60
+
+# A window is a low-parallelism phase when fewer jobs than this
+# fraction of the CPUs were running, on average.
+LOW_PARALLELISM = 0.5
+
+# The host is the limit when any of these is reached.
+CPU_BUSY_PCT = 90.0
+IOWAIT_PCT = 20.0
+STALL_PCT = 20.0
+MEM_AVAILABLE_PCT = 5.0
+
+# The ways that the host can be the limit
+LIMIT_CPU = "cpu"
+LIMIT_IO = "io"
+LIMIT_MEMORY = "memory"
+
+LIMITED_BY_MAKE = "make"
+LIMITED_BY_HOST = "host"
+
+class Window:
+    """The host samples of one line of the report, and the numbers
+    computed from them. Any of the numbers can be None, if the samples
+    didn't have what they are computed from."""
+
+    def __init__(self, samples, conprocs):
+        first = samples[0]
+        last = samples[-1]
+        self.start = first["time"]
+        self.end = last["time"]
+        elapsed = self.end - self.start
+
+        self.jobs = conprocs.Average(self.start, self.end)
+        self.ncpus = last["ncpus"]
+
+        if last["loadavg"]:
+            self.load = last["loadavg"][0]
+        else:
+            self.load = None
+
+        # The % of the CPUs' time spent busy, and waiting for I/O
+        self.cpu_busy = None
+        self.iowait = None
+        if first["cpu"] and last["cpu"]:
+            deltas = {}
+            for state in LOG.CPU_STATES:
+                deltas[state] = last["cpu"][state] - first["cpu"][state]
+            total = sum(deltas.values())
+            if total > 0:
+                self.cpu_busy = 100.0 * (total - deltas["idle"] - \
+                        deltas["iowait"]) / total
+                self.iowait = 100.0 * deltas["iowait"] / total
+
+        # The % of the time that some tasks were stalled
+        self.stall = {}
+        for resource in LOG.PRESSURE_RESOURCES:
+            self.stall[resource] = None
+            if not first["pressure"] or not last["pressure"] or \
+                    elapsed <= 0:
+                continue
+            try:
+                stalled = last["pressure"][resource]["some"] - \
+                        first["pressure"][resource]["some"]
+            except KeyError:
+                continue
+            self.stall[resource] = 100.0 * stalled / (elapsed * 1000000.0)
+
+        # The least memory that was available, in KB
+        self.mem_available = None
+        self.mem_total = None
+        for sample in samples:
+            meminfo = sample["meminfo"]
+            if not meminfo or not meminfo.has_key("MemAvailable"):
+                continue
+            self.mem_total = meminfo.get("MemTotal")
+            if self.mem_available == None:
+                self.mem_available = meminfo["MemAvailable"]
+            else:
+                self.mem_available = min(self.mem_available,
+                        meminfo["MemAvailable"])
+
+        mhz = [sample["cpu_mhz"] for sample in samples
+                if sample["cpu_mhz"] != None]
+        if mhz:
+            self.cpu_mhz = sum(mhz) / len(mhz)
+        else:
+            self.cpu_mhz = None
+
+        self.host_limits = self.HostLimits()
+
+    def HostLimits(self):
+        """Returns the ways that the host was limiting the build."""
+        limits = []
+        if over(self.cpu_busy, CPU_BUSY_PCT) or \
+                over(self.stall[LIMIT_CPU], STALL_PCT):
+            limits.append(LIMIT_CPU)
+        if over(self.iowait, IOWAIT_PCT) or \
+                over(self.stall[LIMIT_IO], STALL_PCT):
+            limits.append(LIMIT_IO)
+        if over(self.stall[LIMIT_MEMORY], STALL_PCT) or \
+                (self.mem_available != None and self.mem_total and \
+                100.0 * self.mem_available / self.mem_total < \
+                MEM_AVAILABLE_PCT):
+            limits.append(LIMIT_MEMORY)
+        return limits
+
+    def LimitedBy(self):
+        """Returns LIMITED_BY_MAKE or LIMITED_BY_HOST for a window with
+        few jobs running, or None."""
+        if not self.ncpus or self.jobs >= self.ncpus * LOW_PARALLELISM:
+            return None
+        if self.host_limits:
+            return LIMITED_BY_HOST
+        else:
+            return LIMITED_BY_MAKE
+
+def over(value, threshold):
+    return value != None and value >= threshold
+
+def make_windows(samples, window_length, conprocs):
+    """Group the samples into windows of at least window_length seconds.
+    The last sample of a window is the first sample of the next."""
+    windows = []
+    first = 0
+    for i in range(1, len(samples)):
+        if samples[i]["time"] - samples[first]["time"] >= window_length or \
+                i == len(samples) - 1:
+            windows.append(Window(samples[first:i + 1], conprocs))
+            first = i
+    return windows
+
+def fmt(value, format):
+    if value == None:
+        return "-"
+    else:
+        return format % (value,)
+
+def print_windows(windows):
+    print "%-8s %6s %6s %6s %7s %9s %6s %6s %6s %6s  %s" % ("TIME", "JOBS",
+            "LOAD", "CPU", "IOWAIT", "MEM AVAIL", "STALL", "STALL", "STALL",
+            "MHZ", "LIMITED BY")
+    print "%-8s %6s %6s %6s %7s %9s %6s %6s %6s %6s" % ("", "", "", "", "",
+            "", "CPU", "MEM", "IO", "")
+
+    for window in windows:
+        limited_by = window.LimitedBy()
+        if limited_by == LIMITED_BY_HOST:
+            limited_by = "%s (%s)" % (limited_by,
+                    ", ".join(window.host_limits))
+
+        print "%-8s %6.2f %6s %6s %7s %9s %6s %6s %6s %6s  %s" % (
+                time.strftime("%H:%M:%S", time.localtime(window.start)),
+                window.jobs,
+                fmt(window.load, "%.2f"),
+                fmt(window.cpu_busy, "%.1f%%"),
+                fmt(window.iowait, "%.1f%%"),
+                fmt(window.mem_available and window.mem_available / 1024,
+                    "%dM"),
+                fmt(window.stall[LIMIT_CPU], "%.1f%%"),
+                fmt(window.stall[LIMIT_MEMORY], "%.1f%%"),
+                fmt(window.stall[LIMIT_IO], "%.1f%%"),
+                fmt(window.cpu_mhz, "%.0f"),
+                limited_by or "")
+
+def print_summary(windows):
+    """Print the time of the low-parallelism windows that were
+    limited by make and by the host."""
+    times = { LIMITED_BY_MAKE : 0.0, LIMITED_BY_HOST : 0.0 }
+    limit_times = {}
+    for window in windows:
+        limited_by = window.LimitedBy()
+        if limited_by == None:
+            continue
+        length = window.end - window.start
+        times[limited_by] += length
+        if limited_by == LIMITED_BY_HOST:
+            for limit in window.host_limits:
+                limit_times[limit] = limit_times.get(limit, 0.0) + length
+
+    print "Time with fewer jobs running than %d%% of the CPUs:" % \
+            (LOW_PARALLELISM * 100,)
+    print "\tlimited by make:  ", LOG.hms(times[LIMITED_BY_MAKE])
+    print "\tlimited by host:  ", LOG.hms(times[LIMITED_BY_HOST])
+    for limit in (LIMIT_CPU, LIMIT_IO, LIMIT_MEMORY):
+        if limit_times.has_key(limit):
+            print "\t    %-14s" % (limit + ":",), LOG.hms(limit_times[limit])
+
+def report(log_file_names, args):
+    window_length = DEFAULT_WINDOW
+
+    # We only accept one log file
+    if len(log_file_names) != 1:
+        sys.exit("'host' report uses one log file.")
+    else:
+        log_file_name = log_file_names[0]
+
+    optstring = ""
+    longopts = ["window="]
+
+    try:
+        opts, args = getopt.getopt(args, optstring, longopts)
+    except getopt.GetoptError:
+        usage()
+        sys.exit(1)
+
+    for opt, arg in opts:
+        if opt == "--window":
+            try:
+                window_length = float(arg)
+            except ValueError:
+                sys.exit("--window accepts a number")
+            if window_length <= 0:
+                sys.exit("--window must be > 0")
+        else:
+            assert 0, "Unexpected option %s" % (opt,)
+
+    if args:
+        usage()
+        sys.exit(1)
+
+    log = LOG.LogFile(log_file_name)
+
+    # The non-make jobs that were running
+    conprocs = concurrency.IncrementalConcurrency(concurrency.NON_MAKE)
+    while 1:
+        try:
+            rec = log.read_record()
+        except EOFError:
+            break
+        conprocs.AddRec(rec)
+
+    samples = log.HostSamples()
+    log.close()
+
+    if len(samples) < 2:
+        print "The log has no host samples; build with " \
+                "instmake --host-samples=SECONDS to take them."
+        return
+
+    windows = make_windows(samples, window_length, conprocs)
+
+    print "CPUs:", samples[-1]["ncpus"]
+    print "Host samples:", len(samples)
+    conprocs.PrintWarnings()
+    print
+    print_windows(windows)
+    print
+    print_summary(windows)
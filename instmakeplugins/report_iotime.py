@@ -0,0 +1,188 @@
+# Copyright (c) 2012 by Cisco Systems, Inc.
+"""
+Split the real time of each tool into CPU time, file I/O, process
+spawning and the rest, from a build that was run with the strace audit
+plugin and its "times" option, to show which steps of the build are
+I/O-bound and which are CPU-bound.
+
+The file I/O and spawn times are the durations of the system calls
+that strace recorded (see syscall.time_class()). The system time of a
+job is mostly spent in its system calls, so only the system time that
+is more than the time of all the system calls is added to the CPU time.
+The rest is the real time that is left, which is the time the job
+waited for the CPU, or spent in instmake and strace themselves.
+"""
+
+import getopt
+import sys
+from instmakelib import instmake_log as LOG
+from instmakelib import reportstream
+
+description = "Split each tool's time into CPU, file I/O and process " \
+        "spawning (needs the strace audit, with its times option)."
+
+DEFAULT_TOP = 20
+
+def usage():
+    print "iotime:", description
+    print "\t--top=N   show the top N of each list (default %d)" % \
+            (DEFAULT_TOP,)
+
+# Indices in the times lists
+REAL = 0
+CPU = 1
+FILE = 2
+SPAWN = 3
+OTHER = 4
+JOBS = 5
+
+PARTS = [ ("cpu", CPU), ("file", FILE), ("spawn", SPAWN), ("other", OTHER) ]
+
+def job_times(rec):
+    """Returns the times list of a record that has syscall times."""
+    real = rec.diff_times[rec.REAL_TIME]
+    user = rec.diff_times[rec.USER_TIME]
+    sys_time = rec.diff_times[rec.SYS_TIME]
+
+    syscall_times = rec.syscall_times
+    file_time = syscall_times["file"]
+    spawn_time = syscall_times["spawn"]
+    syscall_time = file_time + spawn_time + syscall_times["other"]
+
+    cpu = user + max(sys_time - syscall_time, 0.0)
+    other = max(real - cpu - file_time - spawn_time, 0.0)
+    return [real, cpu, file_time, spawn_time, other, 1]
+
+def add_times(table, key, times):
+    totals = table.setdefault(key, [0.0, 0.0, 0.0, 0.0, 0.0, 0])
+    for i in range(len(times)):
+        totals[i] += times[i]
+
+
+class IOTime(reportstream.ReportConsumer):
+    def __init__(self, top):
+        self.top = top
+        self.num_audited = 0
+
+        # Key = tool, Value = times list
+        self.tools = {}
+
+        # Key = file, Value = [seconds, jobs]
+        self.files = {}
+
+    def record(self, rec):
+        if rec.audit_ok:
+            self.num_audited += 1
+        if not rec.syscall_times:
+            return
+
+        add_times(self.tools, rec.tool or "(none)", job_times(rec))
+
+        for (file_name, seconds) in (rec.file_times or {}).items():
+            totals = self.files.setdefault(file_name, [0.0, 0])
+            totals[0] += seconds
+            totals[1] += 1
+
+    def finish(self):
+        if not self.tools:
+            if self.num_audited:
+                print "No jobs have syscall times; build with " \
+                        "instmake -a strace,times to record them."
+            else:
+                print "No jobs were audited; build with " \
+                        "instmake -a strace,times to record the syscall times."
+            return
+
+        totals = [0.0, 0.0, 0.0, 0.0, 0.0, 0]
+        for times in self.tools.values():
+            for i in range(len(times)):
+                totals[i] += times[i]
+
+        print "Jobs with syscall times: %d, of %d audited jobs" % \
+                (totals[JOBS], self.num_audited)
+        for (name, i) in PARTS:
+            print "%-6s %12s %5.1f%%" % (name, LOG.hms(totals[i]),
+                    percent(totals[i], totals[REAL]))
+        print "%-6s %12s" % ("real", LOG.hms(totals[REAL]))
+        print
+
+        tools = self.tools.keys()
+        tools.sort(lambda a, b: cmp(self.tools[b][REAL],
+            self.tools[a][REAL]) or cmp(a, b))
+        print "Tools, with the % of their real time:"
+        print "%12s %6s %6s %6s %6s %6s  %-6s %s" % ("REAL", "JOBS", "CPU",
+                "FILE", "SPAWN", "OTHER", "BOUND", "TOOL")
+        for tool in tools[:self.top]:
+            times = self.tools[tool]
+            print "%12s %6d %5.1f%% %5.1f%% %5.1f%% %5.1f%%  %-6s %s" % (
+                    LOG.hms(times[REAL]), times[JOBS],
+                    percent(times[CPU], times[REAL]),
+                    percent(times[FILE], times[REAL]),
+                    percent(times[SPAWN], times[REAL]),
+                    percent(times[OTHER], times[REAL]),
+                    bound(times), tool)
+        print
+
+        print "Files with the most I/O time:"
+        if self.files:
+            file_names = self.files.keys()
+            file_names.sort(lambda a, b: cmp(self.files[b][0],
+                self.files[a][0]) or cmp(a, b))
+            print "%12s %6s  %s" % ("FILE I/O", "JOBS", "FILE")
+            for file_name in file_names[:self.top]:
+                (seconds, jobs) = self.files[file_name]
+                print "%12s %6d  %s" % (LOG.hms(seconds), jobs, file_name)
+        else:
+            print "\t(none)"
+
+
+def percent(part, whole):
+    if whole <= 0:
+        return 0.0
+    return 100.0 * part / whole
+
+def bound(times):
+    """Returns the name of the largest part of a times list."""
+    (name, i) = max(PARTS, key=lambda part: times[part[1]])
+    return name
+
+
+def make_consumer(log_file_name, args):
+    top = DEFAULT_TOP
+
+    optstring = ""
+    longopts = ["top="]
+
+    try:
+        opts, args = getopt.getopt(args, optstring, longopts)
+    except getopt.GetoptError:
+        usage()
+        sys.exit(1)
+
+    for opt, arg in opts:
+        if opt == "--top":
+            try:
+                top = int(arg)
+            except ValueError:
+                sys.exit("--top accepts a number")
+            if top <= 0:
+                sys.exit("--top must be > 0")
+        else:
+            assert 0, "%s option not handled." % (opt,)
+
+    if args:
+        usage()
+        sys.exit(1)
+
+    return IOTime(top)
+
+def report(log_file_names, args):
+
+    # We only accept one log file
+    if len(log_file_names) != 1:
+        sys.exit("'iotime' report uses one log file.")
+    else:
+        log_file_name = log_file_names[0]
+
+    reportstream.run_consumer(log_file_name,
+            make_consumer(log_file_name, args))
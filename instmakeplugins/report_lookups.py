@@ -0,0 +1,249 @@
+# Copyright (c) 2012 by Cisco Systems, Inc.
+"""
+Rank the jobs, tools and directories by the number of files that were
+looked for but not found (ENOENT), from a build that was run with the
+strace audit plugin.
+
+A compiler looks for each header in each -I directory in turn, until it
+finds it, and a shell looks for each program in each directory of PATH;
+each directory before the one that has the file costs a failed lookup.
+On NFS, these add up. The report shows the -I directories that the
+failed lookups were in, with their average position in the -I order,
+and the directories in which programs were not found, which are the
+PATH entries before the one that has the program. Moving such a
+directory later in the search path, or removing it, cuts the lookups.
+"""
+
+import getopt
+import os
+import sys
+from instmakelib import reportstream
+
+description = "Rank jobs, tools and directories by failed file lookups " \
+        "(needs the strace audit)."
+
+DEFAULT_TOP = 20
+
+# The compiler options that add a directory to the header search path.
+# The directory can be in the same argument, or in the next one.
+INCLUDE_OPTIONS = [ "-I", "-isystem", "-iquote", "-idirafter" ]
+
+def usage():
+    print "lookups:", description
+    print "\t--top=N   show the top N of each list (default %d)" % \
+            (DEFAULT_TOP,)
+
+# Indices in the counts lists
+LOOKUPS = 0
+EXECS = 1
+JOBS = 2
+
+def include_dirs(args, cwd):
+    """Returns the header search directories of a command line, in
+    order, as absolute paths."""
+    dirs = []
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        i += 1
+        for option in INCLUDE_OPTIONS:
+            if not arg.startswith(option):
+                continue
+            dir_name = arg[len(option):]
+            if not dir_name and i < len(args):
+                dir_name = args[i]
+                i += 1
+            if dir_name:
+                dirs.append(os.path.normpath(os.path.join(cwd or "",
+                    dir_name)))
+            break
+    return dirs
+
+def search_dir(dir_name, dirs):
+    """Returns the index of the search directory that dir_name is in,
+    or None. The longest one wins, for nested search directories."""
+    found = None
+    for i in range(len(dirs)):
+        if dir_name == dirs[i] or dir_name.startswith(dirs[i] + "/"):
+            if found == None or len(dirs[i]) > len(dirs[found]):
+                found = i
+    return found
+
+def add_counts(table, key, lookups, execs):
+    counts = table.setdefault(key, [0, 0, 0])
+    counts[LOOKUPS] += lookups
+    counts[EXECS] += execs
+    counts[JOBS] += 1
+
+
+class Lookups(reportstream.ReportConsumer):
+    def __init__(self, top):
+        self.top = top
+        self.num_audited = 0
+
+        # (lookups, execs, pid, tool) of the jobs with failed lookups
+        self.jobs = []
+
+        # Key = tool, directory, or -I directory; Value = counts list
+        self.tools = {}
+        self.dirs = {}
+        self.include_dirs = {}
+
+        # Key = -I directory, Value = sum of its positions in the
+        # -I orders, from 1
+        self.include_positions = {}
+
+    def record(self, rec):
+        if rec.audit_ok:
+            self.num_audited += 1
+        if not rec.failed_lookups:
+            return
+
+        tool = rec.tool or "(none)"
+        job_lookups = 0
+        job_execs = 0
+        dirs = include_dirs(rec.cmdline_args or [], rec.cwd)
+        job_include_dirs = {}
+
+        for (dir_name, (lookups, execs)) in rec.failed_lookups.items():
+            job_lookups += lookups
+            job_execs += execs
+            add_counts(self.dirs, dir_name, lookups, execs)
+
+            i = search_dir(dir_name, dirs)
+            if i != None and lookups:
+                job_include_dirs[i] = job_include_dirs.get(i, 0) + lookups
+
+        # A job counts once for each -I directory
+        for (i, lookups) in job_include_dirs.items():
+            add_counts(self.include_dirs, dirs[i], lookups, 0)
+            self.include_positions[dirs[i]] = \
+                    self.include_positions.get(dirs[i], 0) + i + 1
+
+        add_counts(self.tools, tool, job_lookups, job_execs)
+        self.jobs.append((job_lookups, job_execs, rec.pid, tool))
+
+    def finish(self):
+        if not self.jobs:
+            if self.num_audited:
+                print "No failed lookups were found."
+            else:
+                print "No jobs were audited; build with " \
+                        "instmake -a strace to find the failed lookups."
+            return
+
+        total_lookups = sum([job[LOOKUPS] for job in self.jobs])
+        total_execs = sum([job[EXECS] for job in self.jobs])
+
+        print "Jobs with failed lookups: %d, of %d audited jobs" % \
+                (len(self.jobs), self.num_audited)
+        print "Files not found:          %d" % (total_lookups,)
+        print "Programs not found:       %d" % (total_execs,)
+        print
+
+        jobs = self.jobs[:]
+        jobs.sort(lambda a, b: cmp(b[LOOKUPS] + b[EXECS],
+            a[LOOKUPS] + a[EXECS]))
+        print "Jobs:"
+        print "%8s %8s  %-16s %s" % ("FILES", "PROGRAMS", "PID", "TOOL")
+        for (lookups, execs, pid, tool) in jobs[:self.top]:
+            print "%8d %8d  %-16s %s" % (lookups, execs, pid, tool)
+        print
+
+        print "Tools:"
+        print_counts(self.tools, self.top, "TOOL")
+        print
+
+        print "Directories:"
+        print_counts(self.dirs, self.top, "DIRECTORY")
+        print
+
+        print "-I directories, with the files not found in them, and"
+        print "their average position in the -I order of the jobs:"
+        if self.include_dirs:
+            names = sorted_keys(self.include_dirs, LOOKUPS)
+            print "%8s %6s %8s  %s" % ("FILES", "JOBS", "POSITION",
+                    "DIRECTORY")
+            for name in names[:self.top]:
+                counts = self.include_dirs[name]
+                print "%8d %6d %8.1f  %s" % (counts[LOOKUPS], counts[JOBS],
+                        float(self.include_positions[name]) / counts[JOBS],
+                        name)
+        else:
+            print "\t(none)"
+        print
+
+        print "Directories in which programs were not found (the PATH"
+        print "entries that were searched before the one with the program):"
+        exec_dirs = {}
+        for (name, counts) in self.dirs.items():
+            if counts[EXECS]:
+                exec_dirs[name] = counts
+        if exec_dirs:
+            names = sorted_keys(exec_dirs, EXECS)
+            print "%8s %6s  %s" % ("PROGRAMS", "JOBS", "DIRECTORY")
+            for name in names[:self.top]:
+                counts = exec_dirs[name]
+                print "%8d %6d  %s" % (counts[EXECS], counts[JOBS], name)
+        else:
+            print "\t(none)"
+
+
+def sorted_keys(table, index):
+    """Returns the keys of a table of counts lists, the largest
+    count at 'index' first."""
+    keys = table.keys()
+    keys.sort(lambda a, b: cmp(table[b][index], table[a][index]) or \
+            cmp(a, b))
+    return keys
+
+def print_counts(table, top, title):
+    keys = table.keys()
+    keys.sort(lambda a, b: cmp(table[b][LOOKUPS] + table[b][EXECS],
+        table[a][LOOKUPS] + table[a][EXECS]) or cmp(a, b))
+    print "%8s %8s %6s  %s" % ("FILES", "PROGRAMS", "JOBS", title)
+    for key in keys[:top]:
+        counts = table[key]
+        print "%8d %8d %6d  %s" % (counts[LOOKUPS], counts[EXECS],
+                counts[JOBS], key)
+
+
+def make_consumer(log_file_name, args):
+    top = DEFAULT_TOP
+
+    optstring = ""
+    longopts = ["top="]
+
+    try:
+        opts, args = getopt.getopt(args, optstring, longopts)
+    except getopt.GetoptError:
+        usage()
+        sys.exit(1)
+
+    for opt, arg in opts:
+        if opt == "--top":
+            try:
+                top = int(arg)
+            except ValueError:
+                sys.exit("--top accepts a number")
+            if top <= 0:
+                sys.exit("--top must be > 0")
+        else:
+            assert 0, "%s option not handled." % (opt,)
+
+    if args:
+        usage()
+        sys.exit(1)
+
+    return Lookups(top)
+
+def report(log_file_names, args):
+
+    # We only accept one log file
+    if len(log_file_names) != 1:
+        sys.exit("'lookups' report uses one log file.")
+    else:
+        log_file_name = log_file_names[0]
+
+    reportstream.run_consumer(log_file_name,
+            make_consumer(log_file_name, args))
@@ -0,0 +1,200 @@
+# Copyright (c) 2012 by Cisco Systems, Inc.
+"""
+Report the time that instmake itself adds to the jobs of a build,
+per tool and in total, and estimate how long the build would take
+without instmake.
+"""
+
+import getopt
+import sys
+from instmakelib import instmake_log as LOG
+from instmakelib import reportstream
+
+description = "Show the time instmake added to the jobs (log version 17)."
+
+def usage():
+    print "overhead:", description
+    print "\t--no-wrap    Don't wrap long tool names"
+
+# Field indices in our job tuples
+PID = 0
+TOOL = 1
+OVERHEAD = 2
+REAL = 3
+
+class ToolOverhead:
+    """The sum of the overhead of the jobs of one tool."""
+    def __init__(self, name):
+        self.name = name
+        self.n = 0
+        self.phases = [0.0] * len(LOG.OVERHEAD_FIELDS)
+        self.total = 0.0
+
+    def Add(self, overhead):
+        self.n += 1
+        for i in range(len(overhead)):
+            self.phases[i] += overhead[i]
+            self.total += overhead[i]
+
+class Overhead(reportstream.ReportConsumer):
+    def __init__(self, wrap):
+        self.wrap = wrap
+
+        # (pid, tool, overhead tuple, real time) for each job that
+        # has overhead. Whether a job is a 'make' job is only known
+        # at the end of the log.
+        self.jobs = []
+        self.ppids = {}
+        self.num_records = 0
+        self.top_real_time = None
+        self.top_overhead = None
+
+    def record(self, rec):
+        self.num_records += 1
+        self.ppids[rec.ppid] = None
+
+        overhead = rec.overhead
+        if overhead != None:
+            # startup is None if /proc couldn't be read.
+            overhead = tuple([overhead[name] or 0.0
+                for name in LOG.OVERHEAD_FIELDS])
+
+        if rec.ppid == None:
+            self.top_real_time = rec.diff_times[rec.REAL_TIME]
+            self.top_overhead = overhead
+        elif overhead != None:
+            self.jobs.append((rec.pid, rec.tool or "(none)", overhead,
+                rec.diff_times[rec.REAL_TIME]))
+
+    def merge(self, other):
+        self.jobs.extend(other.jobs)
+        self.ppids.update(other.ppids)
+        self.num_records += other.num_records
+        if other.top_real_time != None:
+            self.top_real_time = other.top_real_time
+            self.top_overhead = other.top_overhead
+
+    def finish(self):
+        if not self.jobs:
+            print "No records have overhead data; it is in instmake " \
+                    "logs of version 17 and later."
+            return
+
+        tools = {}
+        grand = ToolOverhead("TOTAL")
+        leaf_time = 0.0
+        for job in self.jobs:
+            tool = tools.setdefault(job[TOOL], ToolOverhead(job[TOOL]))
+            tool.Add(job[OVERHEAD])
+            grand.Add(job[OVERHEAD])
+
+            # The time that the non-make jobs held a job slot
+            if not self.ppids.has_key(job[PID]):
+                leaf_time += job[REAL] + sum(job[OVERHEAD])
+
+        stats = tools.values()
+        stats.sort(lambda a, b: cmp(b.total, a.total) or \
+                cmp(a.name, b.name))
+
+        print_table(stats, grand, self.wrap)
+        print
+        print "Records with overhead data:", len(self.jobs) + \
+                (self.top_overhead != None), "of", self.num_records
+
+        if self.top_real_time == None or self.top_real_time <= 0:
+            return
+
+        print_estimate(self.top_real_time, self.top_overhead, grand.total,
+                leaf_time)
+
+
+def print_table(stats, grand, wrap):
+    if wrap:
+        width_tool = 25
+    else:
+        width_tool = max([len(stat.name) for stat in stats] + [len("TOOL")])
+
+    columns = [name.upper() for name in LOG.OVERHEAD_FIELDS] + \
+            ["TOTAL", "MEAN"]
+    fmt = "%8s" + " %11s" * len(columns)
+    print ("%-*s " % (width_tool, "TOOL")) + \
+            (fmt % tuple(["JOBS"] + columns))
+    print ("-" * width_tool) + " " + \
+            (fmt % tuple(["-" * 8] + ["-" * 11] * len(columns)))
+
+    for stat in stats + [None, grand]:
+        if stat == None:
+            print
+            continue
+
+        if len(stat.name) > width_tool:
+            print stat.name
+            print " " * width_tool,
+        else:
+            print "%-*s" % (width_tool, stat.name),
+
+        values = [str(stat.n)] + \
+                [LOG.hms(phase) for phase in stat.phases] + \
+                [LOG.hms(stat.total), LOG.hms(stat.total / stat.n)]
+        print fmt % tuple(values)
+
+
+def print_estimate(build_time, top_overhead, jobs_overhead, leaf_time):
+    """Estimate the time of the build without instmake. The overhead
+    of the jobs is spread over the job slots that the build kept busy,
+    on average; the overhead of the top-level instmake is not."""
+    parallelism = max(leaf_time / build_time, 1.0)
+    saved = jobs_overhead / parallelism
+    if top_overhead:
+        top_total = sum(top_overhead)
+    else:
+        top_total = 0.0
+    saved += top_total
+
+    # The top-level instmake's overhead isn't in its own real time
+    instrumented = build_time + top_total
+    saved = min(saved, instrumented)
+
+    print "Build time:                      ", LOG.hms(instrumented)
+    print "Overhead of the jobs:            ", LOG.hms(jobs_overhead)
+    print "Overhead of the top instmake:    ", LOG.hms(top_total)
+    print "Average parallelism:              %.2f" % (parallelism,)
+    print "Estimated time without instmake: ", \
+            LOG.hms(instrumented - saved),
+    print "(%.1f%% faster)" % (100.0 * saved / instrumented,)
+
+
+def make_consumer(log_file_name, args):
+    wrap = 1
+
+    optstring = ""
+    longopts = ["no-wrap"]
+
+    try:
+        opts, args = getopt.getopt(args, optstring, longopts)
+    except getopt.GetoptError:
+        usage()
+        sys.exit(1)
+
+    for opt, arg in opts:
+        if opt == "--no-wrap":
+            wrap = 0
+        else:
+            assert 0, "%s option not handled." % (opt,)
+
+    if args:
+        usage()
+        sys.exit(1)
+
+    return Overhead(wrap)
+
+def report(log_file_names, args):
+
+    # We only accept one log file
+    if len(log_file_names) != 1:
+        sys.exit("'overhead' report uses one log file.")
+    else:
+        log_file_name = log_file_names[0]
+
+    reportstream.run_consumer(log_file_name,
+            make_consumer(log_file_name, args))
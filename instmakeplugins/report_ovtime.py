@@ -4,45 +4,57 @@ Report multiple makes in the same directory.
 """
 
 from instmakelib import instmake_log as LOG
+from instmakelib import reportstream
 
 description = "Over-all Build Time. Accepts multiple instmake logs."
 def usage():
     print "ovtime:", description
 
 
-def print_ovtime(log_file_name, print_filename):
-    # Open the log file
-    log = LOG.LogFile(log_file_name)
+class Ovtime(reportstream.ReportConsumer):
+    def __init__(self, log_file_name, print_filename):
+        self.log_file_name = log_file_name
+        self.print_filename = print_filename
+        self.top_rec = None
 
-    top_rec = None
-
-    # Read the log records
-    while 1:
-        try:
-            rec = log.read_record()
-        except EOFError:
-            log.close()
-            break
+        # The number of records with no PPID after the first one
+        self.num_extra_tops = 0
 
+    def record(self, rec):
         if rec.ppid == None:
-            if top_rec:
-                print "Found another record with no PPID."
-            top_rec = rec
-
-    if not top_rec:
-        print "No top-most record found."
-        return
-
-    print
-    if print_filename:
-        print "LOGFILE: ", log_file_name
-    print "CWD:     ", top_rec.cwd
-    print "CMDLINE: ", top_rec.cmdline
-    print "RETVAL:  ", top_rec.retval
-    print
-    print "real   ", LOG.hms(top_rec.diff_times[rec.TimeIndex("REAL")])
-    print "user   ", LOG.hms(top_rec.diff_times[rec.TimeIndex("USER")])
-    print "sys    ", LOG.hms(top_rec.diff_times[rec.TimeIndex("SYS")])
+            if self.top_rec:
+                self.num_extra_tops += 1
+            self.top_rec = rec
+
+    def merge(self, other):
+        self.num_extra_tops += other.num_extra_tops
+        if other.top_rec:
+            if self.top_rec:
+                self.num_extra_tops += 1
+            self.top_rec = other.top_rec
+
+    def finish(self):
+        for i in range(self.num_extra_tops):
+            print "Found another record with no PPID."
+
+        top_rec = self.top_rec
+        if not top_rec:
+            print "No top-most record found."
+            return
+
+        print
+        if self.print_filename:
+            print "LOGFILE: ", self.log_file_name
+        print "CWD:     ", top_rec.cwd
+        print "CMDLINE: ", top_rec.cmdline
+        print "RETVAL:  ", top_rec.retval
+        print
+        print "real   ", LOG.hms(top_rec.diff_times[top_rec.TimeIndex("REAL")])
+        print "user   ", LOG.hms(top_rec.diff_times[top_rec.TimeIndex("USER")])
+        print "sys    ", LOG.hms(top_rec.diff_times[top_rec.TimeIndex("SYS")])
+
+def make_consumer(log_file_name, args):
+    return Ovtime(log_file_name, 0)
 
 def report(log_file_names, args):
     print_filename = 0
@@ -51,6 +63,7 @@ def report(log_file_names, args):
         print_filename = 1
 
     for log_file_name in log_file_names:
-        print_ovtime(log_file_name, print_filename)
+        reportstream.run_consumer(log_file_name,
+                Ovtime(log_file_name, print_filename))
         print
         print
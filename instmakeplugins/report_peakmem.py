@@ -0,0 +1,274 @@
+# Copyright (c) 2012 by Cisco Systems, Inc.
+"""
+Add up the memory of the jobs that were running at the same time,
+from the samples of the jobs' processes (taken with instmake
+--job-samples), to find the peak memory of the build over its timeline,
+and the highest -j at which the largest jobs of each phase of the build
+fit in the memory of the host.
+
+Only the non-make jobs are added up. The processes of a make job include
+the processes of all its jobs, so the memory of the make processes, and
+of the instmakes, is only in the top-level record's samples.
+"""
+
+import getopt
+import sys
+import time
+from instmakelib import instmake_log as LOG
+from instmakelib import reportstream
+
+description = "Show the peak memory of the jobs running at once " \
+        "(needs --job-samples)."
+
+DEFAULT_WINDOW = 60
+
+# The number of largest jobs to show
+NUM_LARGEST = 10
+
+# A window is memory-bound when the jobs used this % of the memory.
+MEMORY_BOUND_PCT = 80.0
+
+def usage():
+    print "peakmem:", description
+    print "\t--window=SECONDS   one line per SECONDS seconds (default %d)" % \
+            (DEFAULT_WINDOW,)
+    print "\t--memory=MB        the memory of the host (default: from the"
+    print "\t                   host samples, if the build took them)"
+
+# Field indices in our job tuples
+PID = 0
+TOOL = 1
+START = 2
+END = 3
+SAMPLES = 4     # ((time, rss), ...), in real time
+
+class PeakMem(reportstream.ReportConsumer):
+    def __init__(self, log_file_name, window_length, memory):
+        self.log_file_name = log_file_name
+        self.window_length = window_length
+        self.memory = memory
+        self.memory_source = "--memory"
+
+        # The jobs that have samples. Whether a job is a 'make' job
+        # is only known at the end of the log.
+        self.jobs = []
+        self.ppids = {}
+        self.num_records = 0
+        self.top_samples = None
+        self.start = None
+        self.end = None
+
+    def record(self, rec):
+        self.num_records += 1
+        self.ppids[rec.ppid] = None
+
+        start = rec.times_start[rec.REAL_TIME]
+        end = rec.times_end[rec.REAL_TIME]
+        if self.start == None or start < self.start:
+            self.start = start
+        if self.end == None or end > self.end:
+            self.end = end
+
+        if rec.job_samples == None:
+            return
+
+        samples = tuple([(start + sample["time"], sample["rss"])
+            for sample in rec.job_samples])
+        if rec.ppid == None:
+            self.top_samples = samples
+        else:
+            self.jobs.append((rec.pid, rec.tool or "(none)", start, end,
+                samples))
+
+    def finish(self):
+        jobs = [job for job in self.jobs if not self.ppids.has_key(job[PID])]
+        if not jobs:
+            print "No jobs have samples; build with " \
+                    "instmake --job-samples=SECONDS to take them."
+            return
+
+        if self.memory == None:
+            self.memory = host_memory(self.log_file_name)
+            self.memory_source = "host samples"
+
+        windows = make_windows(jobs, self.start, self.end,
+                self.window_length)
+        peak = max(windows, key=lambda window: window.peak)
+        largest = max(jobs, key=job_peak)
+
+        print "Jobs with samples:  %d (not counting makes), of %d records" % \
+                (len(jobs), self.num_records)
+        print "Peak memory of the jobs running at once:", \
+                mb(peak.peak), "at", \
+                time.strftime("%H:%M:%S", time.localtime(peak.peak_time)), \
+                "with %d jobs running" % (peak.peak_jobs,)
+        if self.top_samples:
+            print "Peak memory of the whole build, with make and instmake:", \
+                    mb(max([rss for (t, rss) in self.top_samples]))
+        print "Largest job:", mb(job_peak(largest)), "PID", \
+                largest[PID], largest[TOOL]
+        if self.memory:
+            print "Memory of the host:", mb(self.memory), \
+                    "(from %s)" % (self.memory_source,)
+            print "Highest -j at which the largest job fits in memory:", \
+                    max_jobs(self.memory, job_peak(largest))
+        print
+
+        print_windows(windows, self.memory)
+        print
+        print_largest(jobs)
+
+
+class Window:
+    """The memory of the jobs during one line of the report."""
+    def __init__(self, start, jobs, total):
+        self.start = start
+        # The most memory, and jobs, at once
+        self.peak = total
+        self.peak_time = start
+        self.peak_jobs = jobs
+        self.max_jobs = jobs
+        # The memory of the largest job sample
+        self.largest = 0
+
+    def Update(self, t, jobs, total):
+        if total > self.peak:
+            self.peak = total
+            self.peak_time = t
+            self.peak_jobs = jobs
+        self.max_jobs = max(self.max_jobs, jobs)
+
+
+def make_windows(jobs, start, end, window_length):
+    """Returns a Window for each window_length seconds of the build.
+    The memory of a job is the memory of its last sample, from the
+    sample until the next one, or the end of the job."""
+    # (time, change in memory, change in the number of jobs)
+    events = []
+    for job in jobs:
+        events.append((job[START], 0, 1))
+        rss = 0
+        for (t, sample_rss) in job[SAMPLES]:
+            events.append((t, sample_rss - rss, 0))
+            rss = sample_rss
+        events.append((job[END], -rss, -1))
+    # At the same time, the memory that is freed goes first.
+    events.sort()
+
+    num_windows = int((end - start) / window_length) + 1
+    windows = []
+    total = 0
+    jobs_running = 0
+    for (t, rss_change, jobs_change) in events:
+        i = min(int((t - start) / window_length), num_windows - 1)
+        while len(windows) <= i:
+            windows.append(Window(start + len(windows) * window_length,
+                jobs_running, total))
+        total += rss_change
+        jobs_running += jobs_change
+        windows[i].Update(t, jobs_running, total)
+
+    while len(windows) < num_windows:
+        windows.append(Window(start + len(windows) * window_length,
+            jobs_running, total))
+
+    for job in jobs:
+        for (t, rss) in job[SAMPLES]:
+            i = min(int((t - start) / window_length), num_windows - 1)
+            windows[i].largest = max(windows[i].largest, rss)
+    return windows
+
+def job_peak(job):
+    return max([rss for (t, rss) in job[SAMPLES]] + [0])
+
+def host_memory(log_file_name):
+    """Returns the MemTotal of the host samples of the log, or None."""
+    log = LOG.LogFile(log_file_name)
+    samples = log.HostSamples()
+    log.close()
+    for sample in samples:
+        if sample["meminfo"] and sample["meminfo"].has_key("MemTotal"):
+            return sample["meminfo"]["MemTotal"]
+    return None
+
+def max_jobs(memory, job_memory):
+    if job_memory <= 0:
+        return None
+    return max(int(memory / job_memory), 1)
+
+def mb(kb):
+    return "%dM" % (kb / 1024,)
+
+def print_windows(windows, memory):
+    print "%-8s %6s %10s %11s %7s" % ("TIME", "JOBS", "PEAK MEM",
+            "LARGEST JOB", "MAX -J")
+    for window in windows:
+        max_j = "-"
+        if memory and window.largest:
+            max_j = str(max_jobs(memory, window.largest))
+        if memory and window.peak >= memory * MEMORY_BOUND_PCT / 100.0:
+            bound = "  memory-bound"
+        else:
+            bound = ""
+        print "%-8s %6d %10s %11s %7s%s" % (
+                time.strftime("%H:%M:%S", time.localtime(window.start)),
+                window.max_jobs, mb(window.peak), mb(window.largest), max_j,
+                bound)
+
+def print_largest(jobs):
+    print "Largest jobs:"
+    print "%10s %10s %-16s %s" % ("PEAK MEM", "DURATION", "PID", "TOOL")
+    jobs = jobs[:]
+    jobs.sort(lambda a, b: cmp(job_peak(b), job_peak(a)))
+    for job in jobs[:NUM_LARGEST]:
+        print "%10s %10s %-16s %s" % (mb(job_peak(job)),
+                LOG.hms(job[END] - job[START]), job[PID], job[TOOL])
+
+
+def make_consumer(log_file_name, args):
+    window_length = DEFAULT_WINDOW
+    memory = None
+
+    optstring = ""
+    longopts = ["window=", "memory="]
+
+    try:
+        opts, args = getopt.getopt(args, optstring, longopts)
+    except getopt.GetoptError:
+        usage()
+        sys.exit(1)
+
+    for opt, arg in opts:
+        if opt == "--window":
+            try:
+                window_length = float(arg)
+            except ValueError:
+                sys.exit("--window accepts a number")
+            if window_length <= 0:
+                sys.exit("--window must be > 0")
+        elif opt == "--memory":
+            try:
+                memory = float(arg) * 1024
+            except ValueError:
+                sys.exit("--memory accepts a number")
+            if memory <= 0:
+                sys.exit("--memory must be > 0")
+        else:
+            assert 0, "%s option not handled." % (opt,)
+
+    if args:
+        usage()
+        sys.exit(1)
+
+    return PeakMem(log_file_name, window_length, memory)
+
+def report(log_file_names, args):
+
+    # We only accept one log file
+    if len(log_file_names) != 1:
+        sys.exit("'peakmem' report uses one log file.")
+    else:
+        log_file_name = log_file_names[0]
+
+    reportstream.run_consumer(log_file_name,
+            make_consumer(log_file_name, args))
@@ -21,15 +21,10 @@ def report(log_file_names, args):
     # Open the log file
     log = LOG.LogFile(log_file_name)
 
-    while 1:
-        try:
-            rec = log.read_record()
-        except EOFError:
-            log.close()
-            break
+    # Find each record via the log index
+    for pid in args:
+        rec = log.seek_pid(pid)
+        if rec:
+            rec.Print()
 
-        for pid in args:
-            if rec.pid == pid:
-                rec.Print()
-                args.remove(pid)
-                break
+    log.close()
@@ -129,7 +129,9 @@ def report(log_file_names, args):
     # Open the log file
     log = LOG.LogFile(log_file_name)
 
-    ptree = pidtree.PIDTree()
+    # Only the full records need the details.
+    ptree = pidtree.CompactPIDTree(details=(output_type == OUTPUT_FULL or
+        output_type == OUTPUT_MAKE))
 
     # Read the log records
     while 1:
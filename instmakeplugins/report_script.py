@@ -45,23 +45,23 @@ def report(log_file_names, args):
     # Handle a bunch of possibly-unrelated records
     records = []
 
-    while 1:
-        try:
-            rec = log.read_record()
-        except EOFError:
-            log.close()
-            break
-
-        # Selecting on PID?
-        if pids:
-            if rec.pid in pids:
+    # Selecting on PID? Find them via the log index.
+    if pids:
+        for pid in pids:
+            rec = log.seek_pid(pid)
+            if rec:
                 records.append(rec)
-                pids.remove(rec.pid)
-                if len(pids) == 0:
-                    break
+        log.close()
+
+    # Selecting all records?
+    else:
+        while 1:
+            try:
+                rec = log.read_record()
+            except EOFError:
+                log.close()
+                break
 
-        # Selecting all records?
-        else:
             records.append(rec)
 
     if len(records) == 0:
@@ -5,7 +5,10 @@ Show the timeline
 
 # The Python libraries that we need
 import sys
+import time
 from instmakelib import concurrency
+from instmakelib import instmake_log as LOG
+from instmakelib import reportstream
 import getopt
 
 description = "Show process timeline."
@@ -13,6 +16,90 @@ def usage():
     print "timeline:", description
     print "\t[PID ...] show timeline only for listed PIDs"
     print "\t(same as 'conprocs --timeline', but doesn't require a top-most record)"
+    print "    With instmake --live, the processes that finished in the"
+    print "    last seconds are shown as bars:"
+    print "\t[--window=SECONDS] DEFAULT=%d" % (DEFAULT_WINDOW,)
+
+# For --live
+DEFAULT_WINDOW = 60
+BAR_WIDTH = 40
+CMDLINE_WIDTH = 30
+
+class LiveTimeline(reportstream.ReportConsumer):
+    """Shows the processes that finished in the last 'window' seconds
+    of a build that is running."""
+
+    def __init__(self, window, pids):
+        self.window = window
+        self.pids = pids
+
+        # (start, end, pid, cmdline) of the recent processes
+        self.recent = []
+        self.last_end = None
+
+    def record(self, rec):
+        if self.pids and rec.pid not in self.pids:
+            return
+
+        start = rec.times_start[rec.REAL_TIME]
+        end = rec.times_end[rec.REAL_TIME]
+        self.recent.append((start, end, rec.pid, rec.cmdline))
+        self.last_end = max(self.last_end, end)
+
+    def update(self):
+        if self.last_end == None:
+            print "No processes yet."
+            return
+
+        window_end = self.last_end
+        window_start = window_end - self.window
+
+        # Forget the processes that are out of the window.
+        self.recent = [job for job in self.recent if job[1] >= window_start]
+        self.recent.sort()
+
+        print "Processes that finished from %s to %s:" % (
+                time.strftime("%H:%M:%S", time.localtime(window_start)),
+                time.strftime("%H:%M:%S", time.localtime(window_end)))
+        print
+        for (start, end, pid, cmdline) in self.recent:
+            first = int(BAR_WIDTH * (start - window_start) / self.window)
+            last = int(BAR_WIDTH * (end - window_start) / self.window)
+            if start < window_start:
+                # Started before the window
+                bar = "<" + "=" * (last - 1)
+            else:
+                bar = " " * first + "=" * max(last - first, 1)
+            print "%-15s %13s |%-*s| %s" % (pid, LOG.hms(end - start),
+                    BAR_WIDTH, bar[:BAR_WIDTH], cmdline[:CMDLINE_WIDTH])
+
+    def finish(self):
+        self.update()
+
+def make_live_consumer(log_file_name, args):
+    window = DEFAULT_WINDOW
+
+    optstring = ""
+    longopts = ["window="]
+
+    try:
+        opts, args = getopt.getopt(args, optstring, longopts)
+    except getopt.GetoptError:
+        usage()
+        sys.exit(1)
+
+    for opt, arg in opts:
+        if opt == "--window":
+            try:
+                window = int(arg)
+            except ValueError:
+                sys.exit("--window accepts an integer value")
+            if window < 1:
+                sys.exit("--window must be >= 1")
+        else:
+            assert 0, "Unexpected option %s" % (opt,)
+
+    return LiveTimeline(window, args)
 
 def report(log_file_names, args):
 
@@ -9,7 +9,7 @@ import getopt
 import sys
 from instmakelib import simplestats
 from instmakelib import instmake_log as LOG
-from instmakelib import pidtree
+from instmakelib import reportstream
 
 
 description = "Show duration per tool."
@@ -26,6 +26,10 @@ def usage():
     print "\t-u|--user"
     print "\t-s|--sys"
     print "\t-c|--cpu (default, user + sys)"
+    print "    Or resource usage measured via (needs log version 16):"
+    print "\t--rusage=field  : one of:"
+    print "\t\t%s" % (", ".join(RUSAGE_REPORT_FIELDS),)
+    print "\t--maxrss        : same as --rusage=maxrss (peak RSS, in KB)"
     print "    Records:"
     print "\t--non-make [default]"
     print "\t--all"
@@ -39,14 +43,114 @@ ONLY_MAKE = 2
 JOBS_TOOLNAME = 0
 JOBS_EXECED = 1
 
-def report(log_file_names, args):
+# The rusage fields that can be reported; they are counts. The
+# times are reported with --user and --sys.
+RUSAGE_REPORT_FIELDS = [name for name in LOG.RUSAGE_FIELDS
+        if name not in ("utime", "stime")]
+
+class ToolTime(reportstream.ReportConsumer):
+    def __init__(self, ascending, time_field, sort_field, wrap, record_type,
+            job_type, rusage_field=None):
+        self.ascending = ascending
+        self.time_field = time_field
+        self.rusage_field = rusage_field
+        self.sort_field = sort_field
+        self.wrap = wrap
+        self.record_type = record_type
+        self.job_type = job_type
+
+        # The 'make' jobs are the ones that are parents of other jobs,
+        # which we don't know until the end of the log. So keep
+        # (pid, tool names, time) for each job.
+        self.jobs = []
+        self.ppids = {}
+        self.time_index = None
+
+        # The number of records with no PPID
+        self.num_tops = 0
+
+        # For --live, the stats of the jobs so far, and how many
+        # of the jobs are in them.
+        self.live_tools = {}
+        self.num_live_jobs = 0
+
+    def record(self, rec):
+        if rec.ppid != None:
+            self.ppids[rec.ppid] = None
+        elif self.record_type != ALL:
+            self.num_tops += 1
 
-    # We only accept one log file
-    if len(log_file_names) != 1:
-        sys.exit("'tooltime' report uses one log file.")
-    else:
-        log_file_name = log_file_names[0]
+        if not rec.tool:
+            return
+
+        if self.rusage_field:
+            if rec.rusage == None:
+                return
+            value = rec.rusage[self.rusage_field]
+        else:
+            if self.time_index == None:
+                self.time_index = rec.TimeIndex(self.time_field)
+            value = rec.diff_times[self.time_index]
+
+        # If we are looking at toolnames, then use that. If we are
+        # not looking at execed files and we have some execed files,
+        # then use those, otherwise reverted to toolname.
+        if self.job_type == JOBS_TOOLNAME or rec.execed_files == None or \
+            len(rec.execed_files) == 0:
+            toolnames = (rec.tool,)
+        else:
+            toolnames = rec.execed_files
+
+        self.jobs.append((rec.pid, toolnames, value))
+
+    def merge(self, other):
+        self.jobs.extend(other.jobs)
+        self.ppids.update(other.ppids)
+        self.num_tops += other.num_tops
+        if self.time_index == None:
+            self.time_index = other.time_index
+
+    def add_jobs(self, tools, jobs):
+        """Add the values of the jobs to the Stat of their tools."""
+        record_type = self.record_type
+        make_pids = self.ppids
+
+        for (pid, toolnames, value) in jobs:
+            if record_type == ONLY_MAKE:
+                if not make_pids.has_key(pid):
+                    continue
+            elif record_type == NON_MAKE:
+                if make_pids.has_key(pid):
+                    continue
+
+            # Create an object for the tool and record the time
+            for toolname in toolnames:
+                tool = tools.setdefault(toolname, simplestats.Stat(toolname))
+                tool.Add(value)
+
+    def update(self):
+        """For --live, print the report for the jobs so far. Only the
+        new jobs are added to the stats. A make's children finish before
+        it does, so whether a job is a 'make' is known by now."""
+        self.add_jobs(self.live_tools, self.jobs[self.num_live_jobs:])
+        self.num_live_jobs = len(self.jobs)
+
+        print_report(self.live_tools, self.ascending, self.time_field,
+                self.sort_field, self.wrap, self.record_type, self.job_type,
+                self.rusage_field)
+
+    def finish(self):
+        for i in range(self.num_tops - 1):
+            print "Found another PID w/o PPID."
+
+        tools = {}
+        self.add_jobs(tools, self.jobs)
 
+        print_report(tools, self.ascending, self.time_field,
+                self.sort_field, self.wrap, self.record_type, self.job_type,
+                self.rusage_field)
+
+def make_consumer(log_file_name, args):
     # Defaults
     ascending = -1
     default_ascending = 0
@@ -55,6 +159,7 @@ def report(log_file_names, args):
     wrap = 1
     record_type = NON_MAKE
     job_type = JOBS_TOOLNAME
+    rusage_field = None
 
     # We have a slew of options
     optstring = "adrusc"
@@ -62,7 +167,7 @@ def report(log_file_names, args):
         "real", "user", "sys", "cpu",
         "non-make", "all", "only-make",
         "tool", "total", "num", "min", "max", "mean", "pct", "no-wrap",
-        "execed"]
+        "execed", "rusage=", "maxrss"]
 
     try:
         opts, args = getopt.getopt(args, optstring, longopts)
@@ -108,70 +213,38 @@ def report(log_file_names, args):
             record_type = ONLY_MAKE
         elif opt == "--execed":
             job_type = JOBS_EXECED
+        elif opt == "--rusage":
+            if arg not in RUSAGE_REPORT_FIELDS:
+                sys.exit("Unknown rusage field '%s'; use one of: %s" % \
+                        (arg, ", ".join(RUSAGE_REPORT_FIELDS)))
+            rusage_field = arg
+        elif opt == "--maxrss":
+            rusage_field = "maxrss"
         else:
             assert 0, "%s option not handled." % (opt,)
 
     if ascending == -1:
         ascending = default_ascending
 
-    # If filtering record types, then read through the
-    # instmake log one time to determine record type.
-    if record_type != ALL:
-        log = LOG.LogFile(log_file_name)
-        ptree = pidtree.PIDTreeLight()
-        while 1:
-            try:
-                rec = log.read_record()
-            except EOFError:
-                log.close()
-                break
-            ptree.AddRec(rec)
-
-            make_pids = ptree.BranchPIDs()
-    else:
-        make_pids = None
-
-    # Open the log file
-    log = LOG.LogFile(log_file_name)
-    tools = {}
-    time_index = None
+    return ToolTime(ascending, time_field, sort_field, wrap, record_type,
+            job_type, rusage_field)
 
-    # Read through the records
-    while 1:
-        try:
-            rec = log.read_record()
-        except EOFError:
-            log.close()
-            break
-
-        if not rec.tool:
-            continue
+# The same report is printed as the records arrive.
+make_live_consumer = make_consumer
 
-        if record_type == ONLY_MAKE:
-            if not rec.pid in make_pids:
-                continue
-        elif record_type == NON_MAKE:
-            if rec.pid in make_pids:
-                continue
+def report(log_file_names, args):
 
-        if time_index == None:
-            time_index = rec.TimeIndex(time_field)
+    # We only accept one log file
+    if len(log_file_names) != 1:
+        sys.exit("'tooltime' report uses one log file.")
+    else:
+        log_file_name = log_file_names[0]
 
-        # Create an object for the tool and record the time
-        # If we are looking at toolnames, then use that. If we are
-        # not looking at execed files and we have some execed files,
-        # then use those, otherwise reverted to toolname.
-        if job_type == JOBS_TOOLNAME or rec.execed_files == None or \
-            len(rec.execed_files) == 0:
-            tool = tools.setdefault(rec.tool, simplestats.Stat(rec.tool))
-            time = rec.diff_times[time_index]
-            tool.Add(time)
-        else:
-            for toolname in rec.execed_files:
-                tool = tools.setdefault(toolname, simplestats.Stat(toolname))
-                time = rec.diff_times[time_index]
-                tool.Add(time)
+    reportstream.run_consumer(log_file_name,
+            make_consumer(log_file_name, args))
 
+def print_report(tools, ascending, time_field, sort_field, wrap,
+        record_type, job_type, rusage_field=None):
     # Get the stats
     stats = tools.values()
 
@@ -209,6 +282,15 @@ def report(log_file_names, args):
     TIME_FORMAT = "%13s"
     PCT_FMT = "%6.2f%%"
 
+    # The values are times, or rusage counts.
+    if rusage_field:
+        value_title = rusage_field.upper()
+        def fmt(value):
+            return "%d" % (value,)
+    else:
+        value_title = "TIME"
+        fmt = LOG.hms
+
     # Create the first line of the header, the star showing which
     # column is the sort column.
     WIDTH_N = 8
@@ -247,7 +329,10 @@ def report(log_file_names, args):
     grand_n = 0
     grand_total = 0.0
     # Print the header
-    print time_field, "TIME,",
+    if rusage_field:
+        print "RUSAGE", value_title + ",",
+    else:
+        print time_field, "TIME,",
     if record_type == ALL:
         print "Make and Non-Make Records",
     elif record_type == NON_MAKE:
@@ -267,9 +352,10 @@ def report(log_file_names, args):
     print sort_hdr,
     print """
 %s    TIMES         TOTAL   %% TOT           MIN           MAX          MEAN
-%s      RUN          TIME    TIME          TIME          TIME          TIME
+%s      RUN %13s %7s %13s %13s %13s
 %s -------- ------------- ------- ------------- ------------- -------------
-""" % (tool_spaces, tool_title, tool_dashes),
+""" % (tool_spaces, tool_title, value_title, value_title[:7], value_title,
+        value_title, value_title, tool_dashes),
 
     def print_name(name):
         if len(name) > WIDTH_TOOL:
@@ -290,11 +376,11 @@ def report(log_file_names, args):
 
         # Times and percent
         grand_total += stat.total
-        print TIME_FORMAT % (LOG.hms(stat.total),),
+        print TIME_FORMAT % (fmt(stat.total),),
         print PCT_FMT % (stat.pct,),
-        print TIME_FORMAT % (LOG.hms(stat.min),),
-        print TIME_FORMAT % (LOG.hms(stat.max),),
-        print TIME_FORMAT % (LOG.hms(stat.mean),),
+        print TIME_FORMAT % (fmt(stat.min),),
+        print TIME_FORMAT % (fmt(stat.max),),
+        print TIME_FORMAT % (fmt(stat.mean),),
 
         # Newline.
         print
@@ -303,5 +389,5 @@ def report(log_file_names, args):
     print
     print_name("TOTAL")
     print "%8d" % (grand_n,),
-    print TIME_FORMAT % (LOG.hms(grand_total),),
+    print TIME_FORMAT % (fmt(grand_total),),
     print
@@ -15,4 +15,5 @@ def first_arg_regex_cb(first_arg, argv, cwd, m):
 
 def register(manager):
     re_relative = re.compile("^\.{1,2}/")
-    manager.RegisterFirstArgumentRegex(re_relative, first_arg_regex_cb)
+    manager.RegisterFirstArgumentRegex(re_relative, first_arg_regex_cb,
+            argv_words=1, uses_cwd=True)
@@ -89,7 +89,9 @@ class Parser:
         return retval
 
 
-def first_arg_regex_cb(first_arg, argv, cwd, m):
+def find_tool(argv):
+    """Returns (new_argv, num_words), where num_words is the number
+    of words of argv that were looked at, or None if all of them were."""
     LOOKING_FOR_FIRST_ARG = 0
     SKIP_NEXT = 1
 
@@ -110,7 +112,8 @@ def first_arg_regex_cb(first_arg, argv, cwd, m):
             else:
                 # Use the 'arg' as the tool
 #                print "RETURNING", [arg] + parser.Rest().split()
-                return  [arg] + parser.Rest().split()
+                num_words = len(parser.cmdline[:parser.next_index].split())
+                return  ([arg] + parser.Rest().split(), num_words)
         elif state == SKIP_NEXT:
             state = LOOKING_FOR_FIRST_ARG
             pass
@@ -119,8 +122,15 @@ def first_arg_regex_cb(first_arg, argv, cwd, m):
 #        print "ARG", arg
 
 
-    return argv
+    return (argv, None)
+
+def first_arg_regex_cb(first_arg, argv, cwd, m):
+    return find_tool(argv)[0]
+
+def tool_words(argv):
+    return find_tool(argv)[1]
 
 def register(manager):
     re_set = re.compile("^\w+=")
-    manager.RegisterFirstArgumentRegex(re_set, first_arg_regex_cb)
+    manager.RegisterFirstArgumentRegex(re_set, first_arg_regex_cb,
+            argv_words=tool_words, uses_cwd=False)
@@ -16,8 +16,17 @@ def basename_match_cb(basename, first_arg, argv, cwd):
         else:
             return argv[i:]
 
-
+def libtool_words(argv):
+    # libtool, the --mode options, and the word after them.
+    i = 1
+    for arg in argv[1:]:
+        if len(arg) > 7 and arg[:7] == "--mode=":
+            i += 1
+        else:
+            return i + 1
+    return None
 
 
 def register(manager):
-    manager.RegisterFirstArgumentBasenameMatch("libtool", basename_match_cb)
+    manager.RegisterFirstArgumentBasenameMatch("libtool", basename_match_cb,
+            argv_words=libtool_words, uses_cwd=False)
@@ -4,7 +4,10 @@ ToolName plugin to return the name of the perl script.
 """
 
 
-def basename_match_cb(basename, first_arg, argv, cwd):
+def find_script(argv):
+    """Returns (new_argv, num_words), where num_words is the number
+    of words of argv that were looked at, or None if all of them were."""
+    first_arg = argv[0]
     LOOKING_FOR_FIRST_ARG = 0
     LOOKING_FOR_SCRIPT = 1
     END_OF_ARGS = 2
@@ -22,7 +25,7 @@ def basename_match_cb(basename, first_arg, argv, cwd):
         elif state == LOOKING_FOR_SCRIPT:
             # Is script given on command-line?
             if arg == "-e":
-                return [first_arg] + argv[1:]
+                return ([first_arg] + argv[1:], i + 1)
 
             # Explicit end of arguments?
             elif arg == "--":
@@ -36,6 +39,7 @@ def basename_match_cb(basename, first_arg, argv, cwd):
                     # Make sure the switches before the last
                     # one are also non-argument switches.
                     num_in_between_switches = 3 - len(arg)
+                    num_words = i + 1
                     i = 0
                     good = 1
                     while i < num_in_between_switches:
@@ -44,7 +48,7 @@ def basename_match_cb(basename, first_arg, argv, cwd):
                             break
 
                     if good:
-                        return [first_arg] + argv[1:]
+                        return ([first_arg] + argv[1:], num_words)
 
             # Ignore other switches
             elif arg[0] == "-":
@@ -53,17 +57,23 @@ def basename_match_cb(basename, first_arg, argv, cwd):
             # Non-switch... it must be the name of the script.
             else:
                 # Use the 'arg' as the tool
-                return [arg] + argv[i+1:]
+                return ([arg] + argv[i+1:], i + 1)
 
         elif state == END_OF_ARGS:
-            return [arg] + argv[i+1:]
+            return ([arg] + argv[i+1:], i + 1)
 
     # Didn't find a script name.
-    return argv
+    return (argv, None)
+
+def basename_match_cb(basename, first_arg, argv, cwd):
+    return find_script(argv)[0]
+
+def script_words(argv):
+    return find_script(argv)[1]
 
 
 
 def register(manager):
-    manager.RegisterFirstArgumentBasenameMatch("perl5", basename_match_cb)
-    manager.RegisterFirstArgumentBasenameMatch("perl", basename_match_cb)
-    manager.RegisterFirstArgumentBasenameMatch("perl4", basename_match_cb)
+    for name in ("perl5", "perl", "perl4"):
+        manager.RegisterFirstArgumentBasenameMatch(name, basename_match_cb,
+                argv_words=script_words, uses_cwd=False)
@@ -7,6 +7,9 @@ import json
 
 from utlib import util
 
+from instmakelib import instmake_cli
+from instmakelib import instmake_log
+
 TOP_CWD = os.getcwd()
 TEST_ROOT = os.path.join(TOP_CWD, "tmp")
 UTFILES = "utfiles"
@@ -143,3 +146,20 @@ class TestBase:
             return (None, e)
 
         return (retval, records)
+
+    def read_instmake_records(self, imlog):
+        """Read the records of a log in this process, with the default
+        print plugin, and return them as a list of LogRecords."""
+        plugins = instmake_cli.start_plugins_for_reading([])
+        instmake_log.SetPrinterPlugin(plugins.LoadPlugin(
+            instmake_cli.PRINT_PLUGIN_PREFIX, "default"))
+
+        log = instmake_log.LogFile(imlog)
+        records = []
+        while 1:
+            try:
+                records.append(log.read_record())
+            except EOFError:
+                break
+        log.close()
+        return records
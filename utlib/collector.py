@@ -0,0 +1,85 @@
+# Copyright (c) 2012 by Cisco Systems, Inc.
+
+import cStringIO
+import os
+import signal
+import sys
+import tempfile
+import time
+import unittest
+
+from instmakelib import collector
+
+class NoLock:
+    """Stands in for the jobserver client."""
+    def TakeToken(self):
+        pass
+
+    def PutToken(self):
+        pass
+
+RECORDS = [ "record %d\n" % (i,) for i in range(5) ]
+
+class collectorTests(unittest.TestCase):
+    """
+    Test that the collector writes the records it receives, and that
+    the records it does not write are reported.
+    """
+
+    def setUp(self):
+        (fd, self.log_file_name) = tempfile.mkstemp(prefix="instmake.test.")
+        os.close(fd)
+        self.flush_interval = collector.FLUSH_INTERVAL
+        self.collector = collector.Collector(self.log_file_name, NoLock())
+
+    def tearDown(self):
+        collector.FLUSH_INTERVAL = self.flush_interval
+        os.remove(self.log_file_name)
+
+    def send_records(self):
+        for record in RECORDS:
+            sock = collector.connect()
+            self.assertNotEqual(sock, None)
+            self.assertTrue(collector.send_record(sock, record))
+
+    def finish(self):
+        """Returns the collector's Finish() and what it printed."""
+        stderr = sys.stderr
+        sys.stderr = cStringIO.StringIO()
+        try:
+            num_lost = self.collector.Finish()
+            return (num_lost, sys.stderr.getvalue())
+        finally:
+            sys.stderr = stderr
+
+    def test_written(self):
+        """The records are written to the log"""
+        self.assertTrue(self.collector.Start())
+        self.send_records()
+        (num_lost, output) = self.finish()
+        self.assertEqual(num_lost, 0, output)
+        self.assertEqual(output, "")
+        self.assertEqual(open(self.log_file_name).read(), "".join(RECORDS))
+        self.assertFalse(os.path.exists(self.collector.tmp_dir))
+
+    def test_lost(self):
+        """The records of a collector that dies are reported"""
+        # Nothing is written until the collector is killed.
+        collector.FLUSH_INTERVAL = 60.0
+        self.assertTrue(self.collector.Start())
+        self.send_records()
+
+        # Wait for the collector to receive them.
+        for i in range(100):
+            if self.collector.ReadStatus() == (len(RECORDS), 0):
+                break
+            time.sleep(0.05)
+        os.kill(self.collector.pid, signal.SIGKILL)
+
+        (num_lost, output) = self.finish()
+        self.assertEqual(num_lost, len(RECORDS), output)
+        self.assertTrue("killed by signal %d" % (signal.SIGKILL,) in output,
+                output)
+        self.assertTrue("%d of the %d records" % (len(RECORDS),
+            len(RECORDS)) in output, output)
+        self.assertEqual(open(self.log_file_name).read(), "")
@@ -0,0 +1,50 @@
+# Copyright (c) 2012 by Cisco Systems, Inc.
+
+import os
+import unittest
+
+from utlib import base
+from utlib import util
+
+from instmakelib import instmake_log
+
+class compactTests(unittest.TestCase, base.TestBase):
+    """
+    Test rewriting a log as a compact log.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        """Set up the workspace and reference build for this test suite"""
+        cls.create_workspace("simple")
+        cls.imlog, cls.makelog = cls.setup_run_instmake_build()
+        cls.compact_imlog = os.path.join(cls.ws_dir, "compact.imlog")
+
+        (retval, output) = util.exec_cmdv([base.INSTMAKE, "--compact",
+            cls.imlog, cls.compact_imlog])
+        assert retval == util.SUCCESS, output
+
+    def test_version(self):
+        """--log-version shows both versions"""
+        (retval, output) = util.exec_cmdv([base.INSTMAKE, "-L",
+            self.compact_imlog, "--log-version"])
+        self.assertEqual(retval, util.SUCCESS, output)
+        self.assertTrue(instmake_log.COMPACT_VERSION_1 in output, output)
+        self.assertTrue(instmake_log.LATEST_VERSION in output, output)
+
+    def test_same_records(self):
+        """The compact log has the same records"""
+        (status, records) = self.get_instmake_records(self.imlog)
+        self.assertEqual(status, util.SUCCESS, records)
+
+        (status, compact_records) = self.get_instmake_records(
+                self.compact_imlog)
+        self.assertEqual(status, util.SUCCESS, compact_records)
+
+        self.assertEqual(compact_records, records)
+
+    def test_no_overwrite(self):
+        """The output log is not overwritten without --force"""
+        (retval, output) = util.exec_cmdv([base.INSTMAKE, "--compact",
+            self.imlog, self.compact_imlog])
+        self.assertNotEqual(retval, util.SUCCESS, output)
@@ -0,0 +1,122 @@
+# Copyright (c) 2012 by Cisco Systems, Inc.
+
+import cStringIO
+import sys
+import unittest
+
+from utlib import base
+from utlib import util
+
+from instmakelib import instmake_log
+from instmakelib import pidtree
+from instmakeplugins import report_ptree
+
+def printed(func, *args):
+    """Returns what a function prints to stdout."""
+    stdout = sys.stdout
+    sys.stdout = cStringIO.StringIO()
+    try:
+        func(*args)
+        return sys.stdout.getvalue()
+    finally:
+        sys.stdout = stdout
+
+def print_records(records, vspace=False):
+    for rec in records:
+        rec.Print(sys.stdout)
+        if vspace:
+            print
+
+class compactrecordTests(unittest.TestCase, base.TestBase):
+    """
+    Test that the reports that keep CompactRecords in memory print
+    what they printed when they kept the LogRecords.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        """Set up the workspace and reference build for this test suite"""
+        cls.create_workspace("env")
+        cls.imlog, cls.makelog = cls.setup_run_instmake_build(
+                instmake_opts=["-a", "env"])
+
+    def setUp(self):
+        self.records = self.read_instmake_records(self.imlog)
+
+    def check_report(self, report, report_opts, expected):
+        (status, output) = self.run_instmake_report(self.imlog, report,
+                report_opts=report_opts)
+        self.assertEqual(status, util.SUCCESS, output)
+        self.assertEqual(output, expected)
+
+    def log_pid_tree(self):
+        """Returns a PIDTree of the LogRecords."""
+        ptree = pidtree.PIDTree()
+        for rec in self.records:
+            ptree.AddRec(rec)
+        ptree.Finish()
+        return ptree
+
+    def test_same_fields(self):
+        """A CompactRecord prints like its LogRecord"""
+        for rec in self.records:
+            self.assertEqual(
+                    printed(print_records,
+                        [instmake_log.CompactRecord(rec, details=True)]),
+                    printed(print_records, [rec]))
+
+    def test_no_details(self):
+        """Without details, a CompactRecord drops only the heavy fields"""
+        for rec in self.records:
+            crec = instmake_log.CompactRecord(rec, details=False)
+            for name in instmake_log.COMPACT_DETAIL_FIELDS:
+                self.assertEqual(getattr(crec, name), None, name)
+            self.assertEqual(crec.pid, rec.pid)
+            self.assertEqual(crec.tool, rec.tool)
+            self.assertEqual(crec.cmdline_args, rec.cmdline_args)
+            self.assertEqual(crec.diff_times[crec.CPU_TIME],
+                    rec.diff_times[rec.CPU_TIME])
+
+    def test_default_no_details(self):
+        """By default, a CompactRecord doesn't compute the heavy fields
+        of its LogRecord"""
+        for rec in self.read_instmake_records(self.imlog):
+            crec = instmake_log.CompactRecord(rec)
+            for name in instmake_log.COMPACT_DETAIL_FIELDS:
+                self.assertEqual(getattr(crec, name), None, name)
+                if name in instmake_log.LAZY_ATTRIBUTES:
+                    self.assertFalse(rec.__dict__.has_key(name), name)
+
+    def test_dump_start(self):
+        """dump -s"""
+        records = self.records[:]
+        records.sort(key=lambda rec: rec.times_start[rec.REAL_TIME])
+        self.check_report("dump", ["-s"], printed(print_records, records))
+
+    def test_dump_reverse(self):
+        """dump -r"""
+        records = self.records[:]
+        records.reverse()
+        self.check_report("dump", ["-r"], printed(print_records, records))
+
+    def test_duration(self):
+        """duration"""
+        records = self.records[:]
+        records.sort(key=lambda rec: rec.diff_times[rec.CPU_TIME])
+        self.check_report("duration", [],
+                printed(print_records, records, True))
+
+    def test_ptree(self):
+        """ptree"""
+        self.check_report("ptree", [], printed(self.log_pid_tree().Print))
+
+    def test_ptree_full(self):
+        """ptree --full"""
+        self.check_report("ptree", ["--full"],
+                printed(self.log_pid_tree().Walk, report_ptree.print_rec))
+
+    def test_ptree_make(self):
+        """ptree --make"""
+        self.check_report("ptree", ["--make"],
+                printed(report_ptree.print_srec,
+                    self.log_pid_tree().TopSRec(), 0))
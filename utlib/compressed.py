@@ -0,0 +1,149 @@
+# Copyright (c) 2012 by Cisco Systems, Inc.
+
+import binascii
+import bz2
+import cPickle as pickle
+import cStringIO
+import gzip
+import os
+import unittest
+
+from utlib import base
+from utlib import util
+
+from instmakelib import logcodec
+
+# The size of the command-line of the large record
+LARGE_SIZE = 4 * 1024 * 1024
+
+class CountingPickle:
+    """Stands in for cPickle in logcodec, counting the loads."""
+    UnpicklingError = pickle.UnpicklingError
+
+    def __init__(self):
+        self.num_loads = 0
+
+    def load(self, fh):
+        self.num_loads += 1
+        return pickle.load(fh)
+
+class compressedTests(unittest.TestCase, base.TestBase):
+    """
+    Test reading compressed logs.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        """Set up the workspace and reference build for this test suite"""
+        cls.create_workspace("simple")
+        cls.imlog, cls.makelog = cls.setup_run_instmake_build()
+
+        fh = open(cls.imlog, "rb")
+        cls.log_data = fh.read()
+        fh.close()
+
+    def check_same_records(self, compressed_imlog):
+        (status, records) = self.get_instmake_records(self.imlog)
+        self.assertEqual(status, util.SUCCESS, records)
+
+        (status, compressed_records) = self.get_instmake_records(
+                compressed_imlog)
+        self.assertEqual(status, util.SUCCESS, compressed_records)
+
+        self.assertEqual(compressed_records, records)
+
+    def test_gzip(self):
+        """A gzipped log has the same records"""
+        gz_imlog = os.path.join(self.ws_dir, "log.gz")
+        fh = gzip.open(gz_imlog, "wb")
+        fh.write(self.log_data)
+        fh.close()
+        self.check_same_records(gz_imlog)
+
+    def test_gzip_concatenated(self):
+        """A log made of several gzip members has the same records"""
+        gz_imlog = os.path.join(self.ws_dir, "log-cat.gz")
+        half = len(self.log_data) / 2
+        for (mode, data) in (("wb", self.log_data[:half]),
+                ("ab", self.log_data[half:])):
+            fh = gzip.open(gz_imlog, mode)
+            fh.write(data)
+            fh.close()
+        self.check_same_records(gz_imlog)
+
+    def test_bzip2(self):
+        """A bzip2'ed log has the same records"""
+        bz2_imlog = os.path.join(self.ws_dir, "log.bz2")
+        fh = bz2.BZ2File(bz2_imlog, "wb")
+        fh.write(self.log_data)
+        fh.close()
+        self.check_same_records(bz2_imlog)
+
+    def large_log_data(self):
+        """Returns the log, with a command-line of LARGE_SIZE bytes in
+        its second record, which compresses about in half, and the
+        number of objects in the log."""
+        fh = cStringIO.StringIO(self.log_data)
+        objects = []
+        while 1:
+            try:
+                objects.append(pickle.load(fh))
+            except EOFError:
+                break
+
+        # The version, the header, and the records
+        rec = list(objects[3])
+        rec[6] = [rec[6][0] + " " +
+                binascii.hexlify(os.urandom(LARGE_SIZE / 2))]
+        objects[3] = tuple(rec)
+        data = "".join([pickle.dumps(obj, 1) for obj in objects])
+        return (data, len(objects))
+
+    def check_large_record(self, compressed_imlog, log_data, num_objects):
+        imlog = os.path.join(self.ws_dir, "log-large")
+        fh = open(imlog, "wb")
+        fh.write(log_data)
+        fh.close()
+
+        (status, records) = self.get_instmake_records(imlog)
+        self.assertEqual(status, util.SUCCESS, records)
+        self.assertTrue(len(records[1]["cmdline"]) > LARGE_SIZE)
+
+        (status, compressed_records) = self.get_instmake_records(
+                compressed_imlog)
+        self.assertEqual(status, util.SUCCESS, compressed_records)
+        self.assertEqual(compressed_records, records)
+
+        # The large record is not unpickled again for each chunk.
+        fh = open(compressed_imlog, "rb")
+        stream = logcodec.DecompressedStream(fh,
+                logcodec.detect_codec(fh))
+        counting = CountingPickle()
+        logcodec.pickle = counting
+        try:
+            for i in range(num_objects):
+                stream.load_pickle()
+            self.assertRaises(EOFError, stream.load_pickle)
+        finally:
+            logcodec.pickle = pickle
+            stream.close()
+        self.assertTrue(counting.num_loads < num_objects + 8,
+                counting.num_loads)
+
+    def test_gzip_large_record(self):
+        """A gzipped log with a record of several MB"""
+        (log_data, num_objects) = self.large_log_data()
+        gz_imlog = os.path.join(self.ws_dir, "log-large.gz")
+        fh = gzip.open(gz_imlog, "wb")
+        fh.write(log_data)
+        fh.close()
+        self.check_large_record(gz_imlog, log_data, num_objects)
+
+    def test_bzip2_large_record(self):
+        """A bzip2'ed log with a record of several MB"""
+        (log_data, num_objects) = self.large_log_data()
+        bz2_imlog = os.path.join(self.ws_dir, "log-large.bz2")
+        fh = bz2.BZ2File(bz2_imlog, "wb")
+        fh.write(log_data)
+        fh.close()
+        self.check_large_record(bz2_imlog, log_data, num_objects)
@@ -0,0 +1,58 @@
+# Copyright (c) 2012 by Cisco Systems, Inc.
+
+import glob
+import os
+import unittest
+
+from utlib import base
+from utlib import util
+
+from instmakelib import decodecache
+
+class decodecacheTests(unittest.TestCase, base.TestBase):
+    """
+    Test the cache of decoded log records.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        """Set up the workspace and reference build for this test suite"""
+        cls.create_workspace("simple")
+        cls.imlog, cls.makelog = cls.setup_run_instmake_build()
+        cls.cache_dir = os.path.join(cls.ws_dir, "cache")
+
+    def cache_entries(self):
+        return glob.glob(os.path.join(self.cache_dir,
+            "*" + decodecache.CACHE_SUFFIX))
+
+    def test_same_output(self):
+        """Reports print the same thing with and without the cache"""
+        (status, expected) = self.run_instmake_report(self.imlog, "dump")
+        self.assertEqual(status, util.SUCCESS, expected)
+
+        cache_opts = ["--cache-dir=" + self.cache_dir]
+        for i in range(2):
+            (status, output) = self.run_instmake_report(self.imlog, "dump",
+                    instmake_opts=cache_opts)
+            self.assertEqual(status, util.SUCCESS, output)
+            self.assertEqual(output, expected)
+            self.assertEqual(len(self.cache_entries()), 1)
+
+    def test_prune(self):
+        """--prune-cache removes the entries of logs that changed"""
+        (status, output) = self.run_instmake_report(self.imlog, "dirs",
+                instmake_opts=["--cache-dir=" + self.cache_dir])
+        self.assertEqual(status, util.SUCCESS, output)
+        self.assertEqual(len(self.cache_entries()), 1)
+
+        # Make the log look modified
+        stat_info = os.stat(self.imlog)
+        os.utime(self.imlog, (stat_info.st_atime, stat_info.st_mtime + 10))
+        try:
+            (retval, output) = util.exec_cmdv([base.INSTMAKE,
+                "--cache-dir=" + self.cache_dir, "--prune-cache"])
+        finally:
+            os.utime(self.imlog, (stat_info.st_atime, stat_info.st_mtime))
+
+        self.assertEqual(retval, util.SUCCESS, output)
+        self.assertEqual(self.cache_entries(), [])
@@ -6,6 +6,7 @@ import unittest
 
 from utlib import base
 from utlib import util
+from instmakeplugins import print_json as IMJSON
 
 MAGIC_COOKIE = "INSTMAKE_UNIT_TEST_COOKIE"
 
@@ -48,3 +49,21 @@ class envTests(unittest.TestCase, base.TestBase):
         first_line = magic_lines[0]
 
         self.assertNotEqual(first_line.find(self.magic_cookie), -1)
+
+    def test_snapshots(self):
+        """Each record gets the whole environment back from the
+        snapshots, with its own PID"""
+        (status, records) = self.get_instmake_records(self.imlog)
+        self.assertEqual(status, util.SUCCESS, records)
+
+        for rec in records:
+            env_vars = rec[IMJSON.FIELD_ENV_VARS]
+            self.assertEqual(env_vars[MAGIC_COOKIE], self.magic_cookie)
+            self.assertEqual(env_vars["INSTMAKE_PID"], rec[IMJSON.FIELD_PID])
+
+        # The records are found by PID through the index, too.
+        rec = records[len(records) / 2]
+        (status, output) = self.run_instmake_report(self.imlog, "pid",
+                report_opts=[rec[IMJSON.FIELD_PID]])
+        self.assertEqual(status, util.SUCCESS, output)
+        self.assertTrue(self.magic_cookie in output, output)
@@ -0,0 +1,73 @@
+# Copyright (c) 2012 by Cisco Systems, Inc.
+
+import os
+import unittest
+
+from utlib import base
+from utlib import util
+
+from instmakelib import instmake_log
+from instmakeplugins import print_json as IMJSON
+
+class indexTests(unittest.TestCase, base.TestBase):
+    """
+    Test the sidecar index that is written after a build.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        """Set up the workspace and reference build for this test suite"""
+        cls.create_workspace("simple")
+        cls.imlog, cls.makelog = cls.setup_run_instmake_build()
+
+    def test_index_written(self):
+        """The build writes an index next to the log"""
+        index_file = instmake_log.index_file_name(self.imlog)
+        self.assertTrue(os.path.exists(index_file), index_file)
+
+    def test_pid_report(self):
+        """The pid report finds a record via the index"""
+        (status, records) = self.get_instmake_records(self.imlog)
+        self.assertEqual(status, util.SUCCESS, records)
+
+        zip_recs = [r for r in records if r[IMJSON.FIELD_TOOL] == "zip"]
+        self.assertEqual(len(zip_recs), 1, records)
+        zip_pid = zip_recs[0][IMJSON.FIELD_PID]
+
+        (status, output) = self.run_instmake_report(self.imlog, "pid",
+                report_opts=[zip_pid])
+        self.assertEqual(status, util.SUCCESS, output)
+        self.assertEqual(output.count("PID:            " + zip_pid), 1,
+                output)
+        self.assertEqual(output.count("TOOL:           zip"), 1, output)
+
+    def test_index_option(self):
+        """--index re-creates a missing index"""
+        index_file = instmake_log.index_file_name(self.imlog)
+        os.remove(index_file)
+
+        (retval, output) = util.exec_cmdv([base.INSTMAKE, "-L", self.imlog,
+            "--index"])
+        self.assertEqual(retval, util.SUCCESS, output)
+        self.assertTrue(os.path.exists(index_file), output)
+
+    def test_seek_pids(self):
+        """seek_pids finds the records of a list of PIDs, in order"""
+        records = self.read_instmake_records(self.imlog)
+        pids = [rec.pid for rec in records]
+        pids.reverse()
+        pids.insert(1, "no-such-pid")
+
+        log = instmake_log.LogFile(self.imlog)
+        saved_batch_size = instmake_log.SEEK_BATCH_SIZE
+        instmake_log.SEEK_BATCH_SIZE = 2
+        try:
+            found = list(log.seek_pids(pids))
+        finally:
+            instmake_log.SEEK_BATCH_SIZE = saved_batch_size
+            log.close()
+
+        self.assertEqual(found[1], None)
+        del found[1]
+        del pids[1]
+        self.assertEqual([rec.pid for rec in found], pids)
@@ -0,0 +1,65 @@
+# Copyright (c) 2012 by Cisco Systems, Inc.
+
+import cPickle as pickle
+import unittest
+
+from utlib import base
+from utlib import util
+
+from instmakelib import instmake_log
+from instmakelib import shellsyntax
+
+class lazyrecordTests(unittest.TestCase, base.TestBase):
+    """
+    Test the LogRecord attributes that are computed when first used.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        """Set up the workspace and reference build for this test suite"""
+        cls.create_workspace("env")
+        cls.imlog, cls.makelog = cls.setup_run_instmake_build(
+                instmake_opts=["-a", "env"])
+
+    def test_not_computed(self):
+        """Reading a record doesn't compute the lazy attributes"""
+        records = self.read_instmake_records(self.imlog)
+        self.assertTrue(len(records) > 0)
+
+        for rec in records:
+            for name in instmake_log.LAZY_ATTRIBUTES:
+                self.assertFalse(rec.__dict__.has_key(name), name)
+
+            # Once used, the value is kept in the record.
+            tool = rec.tool
+            self.assertTrue(rec.__dict__.has_key("tool"))
+            self.assertTrue(rec.tool is tool)
+
+    def test_values(self):
+        """The lazy attributes have the values of the raw record"""
+        for rec in self.read_instmake_records(self.imlog):
+            self.assertEqual(rec.cmdline_args,
+                    shellsyntax.split_shell_cmdline(rec.cmdline, 1))
+            self.assertEqual(rec.tool, instmake_log.toolname_manager.GetTool(
+                rec.cmdline_args, rec.cwd))
+            self.assertTrue(rec.env_vars, rec.cmdline)
+
+    def test_pickled(self):
+        """A pickled record has all of its attributes computed"""
+        for rec in self.read_instmake_records(self.imlog):
+            copy = pickle.loads(pickle.dumps(rec, pickle.HIGHEST_PROTOCOL))
+            self.assertFalse(copy.__dict__.has_key("_array"))
+            for name in instmake_log.LAZY_ATTRIBUTES:
+                self.assertTrue(copy.__dict__.has_key(name), name)
+                self.assertEqual(getattr(copy, name), getattr(rec, name),
+                        name)
+
+    def test_decode_jobs(self):
+        """Records decoded by a pool of processes print the same"""
+        (status, expected) = self.run_instmake_report(self.imlog, "dump")
+        self.assertEqual(status, util.SUCCESS, expected)
+
+        (status, output) = self.run_instmake_report(self.imlog, "dump",
+                instmake_opts=["--jobs", "2"])
+        self.assertEqual(status, util.SUCCESS, output)
+        self.assertEqual(output, expected)
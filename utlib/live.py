@@ -0,0 +1,75 @@
+# Copyright (c) 2012 by Cisco Systems, Inc.
+
+import os
+import subprocess
+import time
+import unittest
+
+from utlib import base
+from utlib import util
+
+class liveTests(unittest.TestCase, base.TestBase):
+    """
+    Test running reports with --live.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        """Set up the workspace and reference build for this test suite"""
+        cls.create_workspace("simple")
+        cls.imlog, cls.makelog = cls.setup_run_instmake_build()
+
+    def test_same_output(self):
+        """The final report is the report of the whole log"""
+        (status, output) = self.run_instmake_report(self.imlog, "tooltime")
+        self.assertEqual(status, util.SUCCESS, output)
+
+        (status, live_output) = self.run_instmake_report(self.imlog,
+                "tooltime", instmake_opts=["--live"])
+        self.assertEqual(status, util.SUCCESS, live_output)
+        self.assertTrue(output in live_output, live_output)
+
+    def test_conprocs(self):
+        """conprocs finds the same concurrency as without --live"""
+        (status, output) = self.run_instmake_report(self.imlog, "conprocs")
+        self.assertEqual(status, util.SUCCESS, output)
+
+        (status, live_output) = self.run_instmake_report(self.imlog,
+                "conprocs", instmake_opts=["--live"])
+        self.assertEqual(status, util.SUCCESS, live_output)
+
+        # The last field of each -j line is the % of time
+        def pct_times(text):
+            lines = text.split("-j SLOT")[1].strip().split("\n\n")[0]
+            return [line.split()[-1] for line in lines.split("\n")[1:]]
+
+        self.assertEqual(pct_times(live_output), pct_times(output))
+
+    def test_partial_record(self):
+        """The report waits for the rest of a partly-written log"""
+        log_text = open(self.imlog, "rb").read()
+        live_imlog = os.path.join(self.ws_dir, "live.imlog")
+        fh = open(live_imlog, "wb")
+        fh.write(log_text[:len(log_text) - 50])
+        fh.close()
+
+        proc = subprocess.Popen([base.INSTMAKE, "-L", live_imlog, "--live",
+            "-s", "tooltime"], stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT)
+
+        time.sleep(2)
+        self.assertEqual(proc.poll(), None)
+
+        fh = open(live_imlog, "ab")
+        fh.write(log_text[len(log_text) - 50:])
+        fh.close()
+
+        output = proc.communicate()[0]
+        self.assertEqual(proc.returncode, util.SUCCESS, output)
+        self.assertTrue("zip" in output, output)
+
+    def test_unsupported_report(self):
+        """Only some reports can be run with --live"""
+        (status, output) = self.run_instmake_report(self.imlog, "dirs",
+                instmake_opts=["--live"])
+        self.assertNotEqual(status, util.SUCCESS, output)
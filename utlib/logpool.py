@@ -0,0 +1,121 @@
+# Copyright (c) 2012 by Cisco Systems, Inc.
+
+import cStringIO
+import gzip
+import os
+import sys
+import unittest
+
+from utlib import base
+
+from instmakelib import instmake_log
+from instmakelib import logpool
+from instmakelib import reportstream
+from instmakeplugins import report_dirs
+from instmakeplugins import report_overhead
+from instmakeplugins import report_ovtime
+from instmakeplugins import report_tooltime
+
+class PIDs(reportstream.ReportConsumer):
+    """A consumer that keeps the PIDs of the records, and counts
+    its merges."""
+    def __init__(self):
+        self.pids = []
+        self.num_merges = 0
+
+    def record(self, rec):
+        self.pids.append(rec.pid)
+
+    def merge(self, other):
+        self.pids.extend(other.pids)
+        self.num_merges += 1
+
+class logpoolTests(unittest.TestCase, base.TestBase):
+    """
+    Test decoding the records of a log in a pool of processes.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        """Set up the workspace and reference build for this test suite"""
+        cls.create_workspace("simple")
+        cls.imlog, cls.makelog = cls.setup_run_instmake_build()
+
+        fh = open(cls.imlog, "rb")
+        log_data = fh.read()
+        fh.close()
+
+        cls.gz_imlog = os.path.join(cls.ws_dir, "log.gz")
+        fh = gzip.open(cls.gz_imlog, "wb")
+        fh.write(log_data)
+        fh.close()
+
+    def setUp(self):
+        # One record per chunk, so that the simple log has many.
+        self.chunk_size = logpool.CHUNK_SIZE
+        logpool.CHUNK_SIZE = 1
+
+    def tearDown(self):
+        logpool.CHUNK_SIZE = self.chunk_size
+        instmake_log.SetDecodeJobs(1)
+
+    def run_consumer(self, imlog, consumer, num_jobs):
+        """Run a consumer with some decoding processes, and
+        return what it printed."""
+        instmake_log.SetDecodeJobs(num_jobs)
+        stdout = sys.stdout
+        sys.stdout = cStringIO.StringIO()
+        try:
+            reportstream.run_consumer(imlog, consumer)
+            output = sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+            instmake_log.SetDecodeJobs(1)
+        return output
+
+    def check_reduced(self, imlog):
+        """The records are given to copies of the consumer, which
+        are merged in log order"""
+        pids = [rec.pid for rec in self.read_instmake_records(imlog)]
+        self.assertTrue(len(pids) > 2, pids)
+
+        consumer = PIDs()
+        self.run_consumer(imlog, consumer, 2)
+        self.assertEqual(consumer.pids, pids)
+        self.assertEqual(consumer.num_merges, len(pids))
+
+    def test_reduced(self):
+        """A consumer that can merge is run in the decoding processes"""
+        self.check_reduced(self.imlog)
+
+    def test_reduced_gzip_index(self):
+        """The decoding processes read a compressed log by its index"""
+        instmake_log.WriteIndex(self.gz_imlog)
+        try:
+            log = instmake_log.LogFile(self.gz_imlog)
+            pool = logpool.RecordPool(log, 2)
+            chunks = list(pool.Chunks())
+            pool.Close()
+            log.close()
+            self.assertTrue(len(chunks) > 2, chunks)
+            for chunk in chunks:
+                self.assertEqual(chunk[0], logpool.CHUNK_OFFSETS, chunk)
+
+            self.check_reduced(self.gz_imlog)
+        finally:
+            os.remove(instmake_log.index_file_name(self.gz_imlog))
+
+    def test_reduced_gzip(self):
+        """A compressed log without an index can be reduced"""
+        self.check_reduced(self.gz_imlog)
+
+    def test_same_output(self):
+        """The reports that merge their results print the same with
+        decoding processes"""
+        for mod in (report_dirs, report_overhead, report_ovtime,
+                report_tooltime):
+            expected = self.run_consumer(self.imlog,
+                    mod.make_consumer(self.imlog, []), 1)
+            output = self.run_consumer(self.imlog,
+                    mod.make_consumer(self.imlog, []), 2)
+            self.assertEqual(output, expected, mod.__name__)
@@ -0,0 +1,164 @@
+# Copyright (c) 2012 by Cisco Systems, Inc.
+
+import cStringIO
+import sys
+import unittest
+
+from utlib import base
+from utlib import util
+
+from instmakelib import concurrency
+from instmakelib import instmake_log
+from instmakelib import reportstream
+from instmakeplugins import report_conprocs
+from instmakeplugins import report_ovtime
+from instmakeplugins import report_tooltime
+
+class FailingReport:
+    """A legacy report that reads part of the log, then fails."""
+    def __init__(self):
+        self.num_records = 0
+
+    def report(self, log_file_names, args):
+        log = instmake_log.LogFile(log_file_names[0])
+        log.read_record()
+        self.num_records += 1
+        raise ValueError("report failed")
+
+class multireportTests(unittest.TestCase, base.TestBase):
+    """
+    Test running several reports while reading the log once.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        """Set up the workspace and reference build for this test suite"""
+        cls.create_workspace("simple")
+        cls.imlog, cls.makelog = cls.setup_run_instmake_build()
+
+    def test_same_output(self):
+        """Each report prints what it prints when run by itself"""
+        (status, multi_output) = self.run_instmake_report(self.imlog,
+                "dirs,tooltime:--all,ptree")
+        self.assertEqual(status, util.SUCCESS, multi_output)
+
+        for report, report_opts in (("dirs", []), ("tooltime", ["--all"]),
+                ("ptree", [])):
+            (status, output) = self.run_instmake_report(self.imlog, report,
+                    report_opts=report_opts)
+            self.assertEqual(status, util.SUCCESS, output)
+            self.assertTrue("Report: " + report in multi_output,
+                    multi_output)
+            self.assertTrue(output in multi_output, multi_output)
+
+    def test_args_after_list(self):
+        """Report arguments must be attached to the report names"""
+        (status, output) = self.run_instmake_report(self.imlog,
+                "dirs,duration", report_opts=["-d"])
+        self.assertNotEqual(status, util.SUCCESS, output)
+
+    def test_legacy_replay(self):
+        """A legacy report gets the records that were already read,
+        and the log is read normally after it, even if it fails"""
+        records = self.read_instmake_records(self.imlog)
+
+        log = instmake_log.LogFile(self.imlog)
+        arrays = []
+        while 1:
+            try:
+                arrays.append(log.read_array())
+            except EOFError:
+                break
+
+        instmake_log.StartReplay(log, arrays)
+        try:
+            replayed = self.read_instmake_records(self.imlog)
+        finally:
+            instmake_log.StopReplay(log)
+        self.assertEqual([rec.pid for rec in replayed],
+                [rec.pid for rec in records])
+
+        failing = FailingReport()
+        legacy = reportstream.LegacyReport(failing, log, arrays, [])
+        self.assertRaises(ValueError, legacy.finish)
+        self.assertEqual(failing.num_records, 1)
+        self.assertEqual(instmake_log.log_replays, {})
+        log.close()
+
+        # Not replayed, so the records come from the log file.
+        other_log = instmake_log.LogFile(self.imlog)
+        self.assertEqual(other_log.replay, None)
+        other_log.close()
+
+    def test_ovtime_warning(self):
+        """ovtime prints its warning with the report, not while
+        the records are read"""
+        records = self.read_instmake_records(self.imlog)
+        top_recs = [rec for rec in records if rec.ppid == None]
+        self.assertEqual(len(top_recs), 1)
+
+        stdout = sys.stdout
+        sys.stdout = cStringIO.StringIO()
+        try:
+            consumer = report_ovtime.make_consumer(self.imlog, [])
+            consumer.record(top_recs[0])
+            consumer.record(top_recs[0])
+            self.assertEqual(sys.stdout.getvalue(), "")
+            consumer.finish()
+            output = sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+
+        self.assertTrue(output.startswith(
+            "Found another record with no PPID.\n"), output)
+        self.assertTrue("CMDLINE:" in output, output)
+
+    def test_tooltime_warning(self):
+        """tooltime prints its warning with the report, not while
+        the records are read"""
+        records = self.read_instmake_records(self.imlog)
+        top_recs = [rec for rec in records if rec.ppid == None]
+        self.assertEqual(len(top_recs), 1)
+
+        stdout = sys.stdout
+        sys.stdout = cStringIO.StringIO()
+        try:
+            consumer = report_tooltime.make_consumer(self.imlog, [])
+            for rec in records + top_recs:
+                consumer.record(rec)
+            self.assertEqual(sys.stdout.getvalue(), "")
+            consumer.finish()
+            output = sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+
+        self.assertTrue(output.startswith("Found another PID w/o PPID.\n"),
+                output)
+        self.assertEqual(output.count("Found another PID w/o PPID."), 1,
+                output)
+        self.assertTrue("cp" in output, output)
+
+    def test_conprocs_warning(self):
+        """The live conprocs report prints its warning after its
+        header, not while the records are read"""
+        records = self.read_instmake_records(self.imlog)
+        top_recs = [rec for rec in records if rec.ppid == None]
+        self.assertEqual(len(top_recs), 1)
+
+        stdout = sys.stdout
+        sys.stdout = cStringIO.StringIO()
+        try:
+            consumer = report_conprocs.make_live_consumer(self.imlog, [])
+            for rec in records + top_recs:
+                consumer.record(rec)
+            self.assertEqual(sys.stdout.getvalue(), "")
+            consumer.finish()
+            output = sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+
+        lines = output.splitlines()
+        self.assertEqual(lines[:2], [
+            report_conprocs.title_for_mode(concurrency.NON_MAKE),
+            "Found another record with no PPID."], output)
+        self.assertEqual(output.count("Found another record"), 1, output)
@@ -33,3 +33,83 @@ class simpleTests(unittest.TestCase, base.TestBase):
         jobs = [r for r in records if r[IMJSON.FIELD_TOOL] == "zip"]
         self.assertEqual(len(jobs), 1, records)
 
+    def test_rusage(self):
+        """Each job has its resource usage"""
+        (status, records) = self.get_instmake_records(self.imlog)
+        self.assertEqual(status, util.SUCCESS, records)
+
+        for rec in records:
+            self.assertTrue(rec.has_key(IMJSON.FIELD_RUSAGE), rec)
+            self.assertTrue(rec[IMJSON.FIELD_RUSAGE]["maxrss"] > 0, rec)
+
+    def test_overhead(self):
+        """Each job has instmake's overhead, and the report shows it"""
+        (status, records) = self.get_instmake_records(self.imlog)
+        self.assertEqual(status, util.SUCCESS, records)
+
+        for rec in records:
+            self.assertTrue(rec.has_key(IMJSON.FIELD_OVERHEAD), rec)
+            self.assertTrue(rec[IMJSON.FIELD_OVERHEAD]["setup"] >= 0, rec)
+
+        (status, output) = self.run_instmake_report(self.imlog, "overhead")
+        self.assertEqual(status, util.SUCCESS, output)
+        self.assertTrue("Estimated time without instmake" in output, output)
+
+    def test_no_collector(self):
+        """Without the collector, the instmakes write the same records"""
+        # -B, as the targets were made by the reference build
+        (retval, output, imlog, makelog) = self.run_instmake_build(
+                instmake_opts=["--no-collector"], make_opts=["-B"],
+                log_prefix="nocollector")
+        self.assertEqual(retval, util.SUCCESS, output)
+
+        (status, records) = self.get_instmake_records(self.imlog)
+        self.assertEqual(status, util.SUCCESS, records)
+
+        (status, nocollector_records) = self.get_instmake_records(imlog)
+        self.assertEqual(status, util.SUCCESS, nocollector_records)
+
+        self.assertEqual(
+                sorted([r[IMJSON.FIELD_TOOL] for r in nocollector_records]),
+                sorted([r[IMJSON.FIELD_TOOL] for r in records]))
+
+    def test_host_samples(self):
+        """The host samples are in the log, and the jobs are too"""
+        (retval, output, imlog, makelog) = self.run_instmake_build(
+                instmake_opts=["--host-samples=0.1"], make_opts=["-B"],
+                log_prefix="host")
+        self.assertEqual(retval, util.SUCCESS, output)
+
+        (status, records) = self.get_instmake_records(self.imlog)
+        self.assertEqual(status, util.SUCCESS, records)
+
+        (status, host_records) = self.get_instmake_records(imlog)
+        self.assertEqual(status, util.SUCCESS, host_records)
+        self.assertEqual(len(host_records), len(records))
+
+        (status, output) = self.run_instmake_report(imlog, "host",
+                report_opts=["--window=1"])
+        self.assertEqual(status, util.SUCCESS, output)
+        self.assertTrue("LIMITED BY" in output, output)
+
+    def test_job_samples(self):
+        """Each job has its samples, and the report adds them up"""
+        (retval, output, imlog, makelog) = self.run_instmake_build(
+                instmake_opts=["--job-samples=0.01"], make_opts=["-B"],
+                log_prefix="jobsamples")
+        self.assertEqual(retval, util.SUCCESS, output)
+
+        (status, records) = self.get_instmake_records(imlog)
+        self.assertEqual(status, util.SUCCESS, records)
+
+        # Short jobs may end before their first sample, but the
+        # top-level make doesn't.
+        for rec in records:
+            self.assertTrue(rec.has_key(IMJSON.FIELD_JOB_SAMPLES), rec)
+        top_samples = records[-1][IMJSON.FIELD_JOB_SAMPLES]
+        self.assertTrue(len(top_samples) > 0, records[-1])
+        self.assertTrue(top_samples[0]["rss"] > 0, records[-1])
+
+        (status, output) = self.run_instmake_report(imlog, "peakmem",
+                report_opts=["--memory=1024"])
+        self.assertEqual(status, util.SUCCESS, output)
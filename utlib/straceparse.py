@@ -0,0 +1,569 @@
+# Copyright (c) 2012 by Cisco Systems, Inc.
+
+import cStringIO
+import sys
+import unittest
+
+from instmakelib import straceparse
+from instmakeplugins import audit_strace
+from instmakeplugins import report_iotime
+from instmakeplugins import report_lookups
+
+def strace_text(lines):
+    return "".join([line + "\n" for line in lines])
+
+def printed(func, *args):
+    """Returns what a function prints to stdout."""
+    stdout = sys.stdout
+    sys.stdout = cStringIO.StringIO()
+    try:
+        func(*args)
+        return sys.stdout.getvalue()
+    finally:
+        sys.stdout = stdout
+
+CMD_FILE = "/tmp/instmake/cmd.100"
+
+AUDIT_OPTIONS = "|".join([audit_strace.REMOVE, audit_strace.INTERNAL_LOGS,
+    "strace", "/tmp/instmake", audit_strace.NO_TIMES])
+
+TIMED_AUDIT_OPTIONS = "|".join([audit_strace.REMOVE,
+    audit_strace.INTERNAL_LOGS, "strace", "/tmp/instmake", audit_strace.TIMES])
+
+class Record:
+    """Stands in for a LogRecord, for ParseData and the reports."""
+    USER_TIME = 0
+    SYS_TIME = 1
+    REAL_TIME = 2
+
+    input_files = None
+    output_files = None
+    execed_files = None
+    audit_ok = None
+    failed_lookups = None
+    syscall_times = None
+    file_times = None
+    stated_files = None
+    accessed_files = None
+    unlinked_files = None
+    made_dirs = None
+
+    def __init__(self, pid, cwd, cmdline_args, tool, diff_times=None):
+        self.pid = pid
+        self.cwd = cwd
+        self.cmdline_args = cmdline_args
+        self.tool = tool
+        self.diff_times = diff_times
+
+    def Audit(self, audit_data, audit_options=AUDIT_OPTIONS):
+        audit_strace.ParseData(audit_data, self, audit_options)
+        return self
+
+    def AuditFields(self):
+        return dict([(name, getattr(self, name)) for name in AUDIT_FIELDS])
+
+AUDIT_FIELDS = [ "input_files", "output_files", "execed_files", "audit_ok",
+    "failed_lookups", "syscall_times", "file_times", "stated_files",
+    "accessed_files", "unlinked_files", "made_dirs" ]
+
+# A shell that runs a compiler, with strace -ttt -T. The shell waits
+# 1.75 seconds for the compiler, which runs for 0.75 seconds of it.
+TIMED = [
+    '100 100.000 chdir("/src") = 0 <0.125>',
+    '100 100.125 open("a.c", O_RDONLY) = 3 <0.25>',
+    '100 100.375 read(3, "x", 4096) = 1 <0.5>',
+    '100 100.875 close(3) = 0 <0.125>',
+    '100 101.000 clone(child_stack=0, flags=SIGCHLD) = 101 <0.25>',
+    '100 101.250 wait4(-1,  <unfinished ...>',
+    '101 101.500 execve("/usr/bin/cc", ["cc"], [/* 2 vars */]) = 0 <0.25>',
+    '101 101.750 open("b.h", O_RDONLY) = 3 <0.25>',
+    '101 102.000 write(1, "x", 1) = 1 <0.125>',
+    '101 102.250 +++ exited with 0 +++',
+    '100 103.000 <... wait4 resumed> [{WIFEXITED(s) && WEXITSTATUS(s) == 0}], 0, NULL) = 101 <1.75>',
+    '100 103.000 --- SIGCHLD {si_signo=SIGCHLD, si_code=CLD_EXITED} ---',
+    '100 103.000 stat("c.h", 0x7ffd) = -1 ENOENT (No such file or directory) <0.125>',
+    '100 103.125 getpid() = 100 <0.0625>',
+    '100 104.000 open("d.h", O_RDONLY <unfinished ...>',
+    '100 104.500 <... open resumed> ) = 4 <0.5>',
+]
+
+TIMED_SYSCALL_TIMES = {
+    "file" : 0.25 + 0.5 + 0.125 + 0.25 + 0.125 + 0.125 + 0.5,
+    # The clone and the execve, and the wait without the compiler
+    "spawn" : 0.25 + 0.25 + (1.75 - 0.75),
+    "other" : 0.125 + 0.0625,
+}
+
+TIMED_FILE_TIMES = {
+    "/src/a.c" : 0.25 + 0.5 + 0.125,
+    "/src/b.h" : 0.25,
+    "/src/c.h" : 0.125,
+    "/src/d.h" : 0.5,
+}
+
+# A compiler looking for its headers in its -I directories, as run
+# by a shell that looks for it in its PATH.
+COMPILE = [
+    '100 open("/tmp/instmake/cmd.100", O_RDONLY) = 3',
+    '100 chdir("/src") = 0',
+    '100 execve("/usr/local/bin/cc", ["cc"], [/* 2 vars */]) = -1 ENOENT (No such file or directory)',
+    '100 execve("/opt/bin/cc", ["cc"], [/* 2 vars */]) = -1 ENOENT (No such file or directory)',
+    '100 execve("/usr/bin/cc", ["cc"], [/* 2 vars */]) = 0',
+    '100 open("a.c", O_RDONLY) = 3',
+    '100 open("inc1/a.h", O_RDONLY) = -1 ENOENT (No such file or directory)',
+    '100 open("inc2/a.h", O_RDONLY) = 4',
+    '100 stat("inc1/b.h", 0x7ffd) = -1 ENOENT (No such file or directory)',
+    '100 access("inc2/b.h", R_OK) = -1 ENOENT (No such file or directory)',
+    '100 openat(AT_FDCWD, "inc3/b.h", O_RDONLY) = 5',
+    '100 open("/root/x.h", O_RDONLY) = -1 EACCES (Permission denied)',
+    '100 open("inc1/c.h", O_RDONLY <unfinished ...>',
+    '100 <... open resumed> ) = -1 ENOENT (No such file or directory)',
+    '100 stat("inc1/d.h", 0x7ffd) = 0',
+    '100 open("a.o", O_WRONLY|O_CREAT|O_TRUNC, 0666) = 6',
+]
+
+COMPILE_ARGS = [ "cc", "-Iinc1", "-I", "inc2", "-Iinc3", "-c", "a.c" ]
+
+COMPILE_FAILED = {
+    "/src/inc1" : (3, 0),
+    "/src/inc2" : (1, 0),
+    "/usr/local/bin" : (0, 1),
+    "/opt/bin" : (0, 1),
+}
+
+# Two processes whose system calls interleave, as with strace -f.
+INTERLEAVED = [
+    '100 chdir("/src") = 0',
+    '100 clone(child_stack=0, flags=CLONE_CHILD_SETTID|SIGCHLD <unfinished ...>',
+    '101 chdir("lib") = 0',
+    '100 <... clone resumed> child_tidptr=0x7f) = 101',
+    '100 open("a.c", O_RDONLY <unfinished ...>',
+    '101 open("b.c", O_RDONLY) = 3',
+    '101 read(3, "int b;\\n", 4096) = 7',
+    '100 <... open resumed> ) = 3',
+    '101 open("b.o", O_WRONLY|O_CREAT|O_TRUNC, 0666 <unfinished ...>',
+    '100 open("a.h", O_RDONLY) = 4',
+    '101 <... open resumed> ) = 4',
+    '100 --- SIGCHLD {si_signo=SIGCHLD, si_code=CLD_EXITED} ---',
+    '101 +++ exited with 0 +++',
+]
+
+class straceparseTests(unittest.TestCase):
+    """
+    Test the parsing of strace output.
+    """
+
+    def test_unfinished(self):
+        """An unfinished system call keeps its place until it is
+        resumed"""
+        strace_data = straceparse.StraceOutput(strace_text(INTERLEAVED))
+        self.assertEqual(strace_data.get_files_read(),
+                ["/src/a.c", "/src/lib/b.c", "/src/a.h"])
+        self.assertEqual(strace_data.get_files_written(),
+                ["/src/lib/b.o"])
+
+        names = [(curr_syscall.pid, curr_syscall.name) for curr_syscall
+                in straceparse.read_syscalls(iter(INTERLEAVED))]
+        self.assertEqual(names, [("100", "chdir"), ("100", "clone"),
+            ("101", "chdir"), ("100", "open"), ("101", "open"),
+            ("101", "open"), ("100", "open")])
+
+    def test_resumed_args(self):
+        """A resumed system call has the arguments of both lines"""
+        syscalls = list(straceparse.read_syscalls(iter(INTERLEAVED)))
+        clone = syscalls[1]
+        self.assertTrue(clone.is_completed())
+        self.assertEqual(clone.get_child_pid(), "101")
+        self.assertEqual(syscalls[5].args[1].strip(),
+                "O_WRONLY|O_CREAT|O_TRUNC")
+        self.assertEqual(syscalls[5].retval, "4")
+
+    def test_never_resumed(self):
+        """A system call that is never resumed, and one that was
+        not seen unfinished, are still parsed"""
+        lines = [
+            '100 open("a.c", O_RDONLY <unfinished ...>',
+            '100 open("a.h", O_RDONLY) = 3',
+            '101 <... open resumed> ) = 4',
+        ]
+        syscalls = list(straceparse.read_syscalls(iter(lines)))
+        self.assertEqual([(curr_syscall.pid, curr_syscall.get_file_read())
+            for curr_syscall in syscalls],
+            [("100", "a.c"), ("100", "a.h"), ("101", None)])
+        self.assertTrue(syscalls[0].is_unfinished())
+        self.assertTrue(syscalls[2].is_resumed())
+
+    def test_streaming(self):
+        """The system calls are parsed a line at a time"""
+        consumed = []
+        def lines():
+            for i in range(1000):
+                consumed.append(i)
+                yield '100 open("f%d.c", O_RDONLY) = 3' % (i,)
+
+        syscalls = straceparse.read_syscalls(lines())
+        first = syscalls.next()
+        self.assertEqual(first.get_file_read(), "f0.c")
+        self.assertEqual(len(consumed), 1)
+
+        # The system calls after an unfinished one are held back.
+        lines = [
+            '100 open("a.c", O_RDONLY <unfinished ...>',
+            '101 open("b.c", O_RDONLY) = 3',
+            '101 open("c.c", O_RDONLY) = 4',
+        ]
+        consumed = []
+        def held_back():
+            for line in lines:
+                consumed.append(line)
+                yield line
+            consumed.append(None)
+            yield '100 <... open resumed> ) = 5'
+
+        syscalls = straceparse.read_syscalls(held_back())
+        self.assertEqual(syscalls.next().get_file_read(), "a.c")
+        self.assertEqual(consumed[-1], None)
+
+    def test_untracked(self):
+        """Only the system calls that have a class are parsed"""
+        lines = [
+            '100 mmap(NULL, 8192, PROT_READ|PROT_WRITE, MAP_PRIVATE, -1, 0) = 0x7f',
+            '100 read(3, "x", 1) = 1',
+            '100 brk(NULL) = 0x55',
+            '100 open("a.c", O_RDONLY) = 3',
+        ]
+        names = [curr_syscall.name
+                for curr_syscall in straceparse.read_syscalls(iter(lines))]
+        self.assertEqual(names, ["open"])
+
+    def test_file_object(self):
+        """The output can be read from a file object"""
+        strace_data = straceparse.StraceOutput(
+                cStringIO.StringIO(strace_text(INTERLEAVED)))
+        self.assertEqual(strace_data.get_files_read(),
+                ["/src/a.c", "/src/lib/b.c", "/src/a.h"])
+
+    def test_bad_line(self):
+        """A line that isn't strace output is an error"""
+        self.assertRaises(straceparse.StraceParseError,
+                straceparse.StraceOutput, "this is not strace\n")
+
+    def test_file_order(self):
+        """The files are in the order they were first seen, once"""
+        lines = [
+            '100 chdir("/src") = 0',
+            '100 open("b.h", O_RDONLY) = 3',
+            '100 open("a.h", O_RDONLY) = 3',
+            '100 open("/src/b.h", O_RDONLY) = 3',
+            '100 open("b.h", O_RDONLY) = 3',
+            '100 open("a.o", O_RDWR|O_CREAT, 0666) = 4',
+            '100 open("missing.h", O_RDONLY) = -1 ENOENT (No such file or directory)',
+            '100 rename("a.tmp", "a.out") = 0',
+            '100 execve("/usr/bin/cc", ["cc"], [/* 2 vars */]) = 0',
+            '100 execve("/usr/bin/cc", ["cc"], [/* 2 vars */]) = 0',
+        ]
+        strace_data = straceparse.StraceOutput(strace_text(lines))
+        self.assertEqual(strace_data.get_files_read(),
+                ["/src/b.h", "/src/a.h", "/src/a.o"])
+        self.assertEqual(strace_data.get_files_written(),
+                ["/src/a.o", "/src/a.out"])
+        self.assertEqual(strace_data.get_files_execed(), ["/usr/bin/cc"])
+
+    def test_ignored_files(self):
+        """The files to ignore are given by their names in the
+        system calls"""
+        lines = [
+            '100 chdir("/tmp") = 0',
+            '100 open("/tmp/cmd.1", O_RDONLY) = 3',
+            '100 open("cmd.1", O_RDONLY) = 3',
+            '100 open("/dev/tty", O_RDWR) = 4',
+            '100 open("a.c", O_RDONLY) = 5',
+        ]
+        strace_data = straceparse.StraceOutput(strace_text(lines))
+        strace_data.remove_read("/tmp/cmd.1")
+        strace_data.remove_read("/dev/tty")
+        strace_data.remove_written("/dev/tty")
+
+        # The same file, by another name, is still read.
+        self.assertEqual(strace_data.get_files_read(),
+                ["/tmp/cmd.1", "/tmp/a.c"])
+        self.assertEqual(strace_data.get_files_written(), [])
+
+    def test_openat(self):
+        """A file name relative to a directory file descriptor is
+        relative to that directory, as it was when it was opened"""
+        lines = [
+            '100 chdir("/src") = 0',
+            '100 openat(AT_FDCWD, "include", O_RDONLY|O_DIRECTORY) = 3',
+            '100 chdir("/build") = 0',
+            '100 openat(3, "a.h", O_RDONLY) = 4',
+            '100 openat(AT_FDCWD, "a.o", O_WRONLY|O_CREAT, 0666) = 5',
+            '100 clone(child_stack=0, flags=SIGCHLD) = 101',
+            '101 newfstatat(3, "b.h", {st_mode=S_IFREG|0644, ...}, 0) = 0',
+            '100 close(3) = 0',
+            '100 openat(AT_FDCWD, "gen", O_RDONLY|O_DIRECTORY) = 3',
+            '100 openat(3, "c.h", O_RDONLY) = 6',
+        ]
+        strace_data = straceparse.StraceOutput(strace_text(lines))
+
+        # A file descriptor that is reused is for its new file.
+        self.assertEqual(strace_data.get_files_read(),
+                ["/src/include", "/src/include/a.h", "/build/gen",
+                    "/build/gen/c.h"])
+        self.assertEqual(strace_data.get_files_written(), ["/build/a.o"])
+
+        # The child inherited the directory file descriptor.
+        self.assertEqual(strace_data.get_files_stated(),
+                ["/src/include/b.h"])
+
+    def test_categories(self):
+        """The files stat()ed, access()ed, unlinked and the directories
+        made are kept, if the system call succeeded"""
+        lines = [
+            '100 chdir("/src") = 0',
+            '100 stat("a.h", {st_mode=S_IFREG|0644, ...}) = 0',
+            '100 lstat("/usr/lib/libc.so", {st_mode=S_IFLNK|0777, ...}) = 0',
+            '100 statx(AT_FDCWD, "b.h", AT_STATX_SYNC_AS_STAT, STATX_ALL, {stx_mask=STATX_ALL, ...}) = 0',
+            '100 stat("c.h", 0x7ffd) = -1 ENOENT (No such file or directory)',
+            '100 newfstatat(AT_FDCWD) = -1 EFAULT (Bad address)',
+            '100 access("run.sh", X_OK) = 0',
+            '100 faccessat(AT_FDCWD, "/etc/x.conf", R_OK) = 0',
+            '100 access("d.h", R_OK) = -1 ENOENT (No such file or directory)',
+            '100 unlink("a.o") = 0',
+            '100 unlinkat(AT_FDCWD, "obj", AT_REMOVEDIR) = 0',
+            '100 unlink("b.o") = -1 ENOENT (No such file or directory)',
+            '100 mkdir("obj", 0777) = 0',
+            '100 mkdirat(AT_FDCWD, "/tmp/x", 0700) = 0',
+            '100 mkdir("/src", 0777) = -1 EEXIST (File exists)',
+            '100 creat("c.o", 0666) = 3',
+        ]
+        strace_data = straceparse.StraceOutput(strace_text(lines))
+        self.assertEqual(strace_data.get_files_stated(),
+                ["/src/a.h", "/usr/lib/libc.so", "/src/b.h"])
+        self.assertEqual(strace_data.get_files_accessed(),
+                ["/src/run.sh", "/etc/x.conf"])
+        self.assertEqual(strace_data.get_files_unlinked(),
+                ["/src/a.o", "/src/obj"])
+        self.assertEqual(strace_data.get_dirs_made(),
+                ["/src/obj", "/tmp/x"])
+        self.assertEqual(strace_data.get_files_written(), ["/src/c.o"])
+        self.assertEqual(strace_data.get_files_read(), [])
+
+    def test_vfork(self):
+        """A vfork()ed or clone3()d child starts in the parent's cwd"""
+        lines = [
+            '100 chdir("/src") = 0',
+            '100 vfork() = 101',
+            '101 open("a.c", O_RDONLY) = 3',
+            '100 clone3({flags=CLONE_VM, exit_signal=SIGCHLD, stack=0x7f, stack_size=0x9000}, 88) = 102',
+            '102 chdir("sub") = 0',
+            '102 open("b.c", O_RDONLY) = 3',
+        ]
+        strace_data = straceparse.StraceOutput(strace_text(lines))
+        self.assertEqual(strace_data.get_files_read(),
+                ["/src/a.c", "/src/sub/b.c"])
+
+    def test_failed_lookups(self):
+        """The files that were not found are counted by directory, and
+        the programs not found, too"""
+        strace_data = audit_strace.parse_strace(strace_text(COMPILE),
+                CMD_FILE)
+        self.assertEqual(strace_data.get_failed_lookups(),
+                {"/src/inc1" : 3, "/src/inc2" : 1})
+        self.assertEqual(strace_data.get_failed_execs(),
+                {"/usr/local/bin" : 1, "/opt/bin" : 1})
+        self.assertEqual(audit_strace.failed_lookups(strace_data),
+                COMPILE_FAILED)
+
+        # The failed system calls don't count as files.
+        self.assertEqual(strace_data.get_files_read(),
+                ["/src/a.c", "/src/inc2/a.h", "/src/inc3/b.h"])
+        self.assertEqual(strace_data.get_files_execed(), ["/usr/bin/cc"])
+        self.assertEqual(strace_data.get_files_stated(), ["/src/inc1/d.h"])
+        self.assertEqual(strace_data.get_files_accessed(), [])
+
+    def test_parsed_data(self):
+        """The parsed audit data, and that of older logs, has the files
+        of the strace log"""
+        raw = Record("100", "/src", COMPILE_ARGS, "cc").Audit(
+                (CMD_FILE, strace_text(COMPILE)))
+        self.assertEqual(raw.audit_ok, True)
+        self.assertEqual(raw.input_files,
+                ["/src/a.c", "/src/inc2/a.h", "/src/inc3/b.h"])
+        self.assertEqual(raw.failed_lookups, COMPILE_FAILED)
+
+        audit_data = (CMD_FILE,) + audit_strace.compact_file_lists(
+                audit_strace.parse_strace(strace_text(COMPILE), CMD_FILE))
+        parsed = Record("100", "/src", COMPILE_ARGS, "cc").Audit(audit_data)
+        self.assertEqual(parsed.AuditFields(), raw.AuditFields())
+
+        # Before the failed lookups were kept
+        older = Record("100", "/src", COMPILE_ARGS, "cc").Audit(
+                audit_data[:5])
+        self.assertEqual(older.input_files, raw.input_files)
+        self.assertEqual(older.output_files, ["/src/a.o"])
+        self.assertEqual(older.execed_files, ["/usr/bin/cc"])
+        self.assertEqual(older.failed_lookups, None)
+        self.assertEqual(older.stated_files, None)
+
+        # Before the times were kept
+        older = Record("100", "/src", COMPILE_ARGS, "cc").Audit(
+                audit_data[:6])
+        self.assertEqual(older.failed_lookups, COMPILE_FAILED)
+        self.assertEqual(older.syscall_times, None)
+        self.assertEqual(older.stated_files, None)
+
+        # A directory and a file name are stored once.
+        dirs = audit_data[1]
+        self.assertEqual(len(dirs), len(dict.fromkeys(dirs)))
+        self.assertEqual(dirs.count("/src"), 1)
+
+        # No audit data
+        self.assertEqual(Record("100", "/src", COMPILE_ARGS, "cc").Audit(
+            None).audit_ok, False)
+
+    def test_lookups_report(self):
+        """The lookups report ranks the directories and shows the -I
+        order"""
+        consumer = report_lookups.Lookups(report_lookups.DEFAULT_TOP)
+        consumer.record(Record("100", "/src", COMPILE_ARGS, "cc").Audit(
+            (CMD_FILE, strace_text(COMPILE))))
+        consumer.record(Record("101", "/src", ["true"], "true").Audit(
+            (CMD_FILE, strace_text(['101 execve("/bin/true", ["true"], '
+                '[/* 2 vars */]) = 0']))))
+        output = printed(consumer.finish)
+
+        self.assertTrue("Jobs with failed lookups: 1, of 2 audited jobs"
+                in output, output)
+        self.assertTrue("Files not found:          4" in output, output)
+        self.assertTrue("Programs not found:       2" in output, output)
+        self.assertTrue("%8d %8d  %-16s %s" % (4, 2, "100", "cc")
+                in output, output)
+        self.assertTrue("%8d %8d %6d  %s" % (3, 0, 1, "/src/inc1")
+                in output, output)
+
+        # inc1 is first in the -I order, and inc2 second.
+        self.assertTrue("%8d %6d %8.1f  %s" % (3, 1, 1.0, "/src/inc1")
+                in output, output)
+        self.assertTrue("%8d %6d %8.1f  %s" % (1, 1, 2.0, "/src/inc2")
+                in output, output)
+        self.assertTrue("%8d %6d  %s" % (1, 1, "/usr/local/bin")
+                in output, output)
+
+    def test_no_lookups(self):
+        """The lookups report of jobs without failed lookups"""
+        consumer = report_lookups.Lookups(report_lookups.DEFAULT_TOP)
+        consumer.record(Record("101", "/src", ["true"], "true").Audit(
+            (CMD_FILE, strace_text(['101 execve("/bin/true", ["true"], '
+                '[/* 2 vars */]) = 0']))))
+        self.assertEqual(printed(consumer.finish),
+                "No failed lookups were found.\n")
+
+    def test_times(self):
+        """The syscall times are summed by class and by file, and a
+        wait counts only while no child runs"""
+        strace_data = straceparse.StraceOutput(strace_text(TIMED))
+        self.assertEqual(strace_data.get_syscall_times(),
+                TIMED_SYSCALL_TIMES)
+        self.assertEqual(strace_data.get_file_times(), TIMED_FILE_TIMES)
+
+        # With times, the system calls are still found.
+        self.assertEqual(strace_data.get_files_read(),
+                ["/src/a.c", "/src/b.h", "/src/d.h"])
+        self.assertEqual(strace_data.get_files_execed(), ["/usr/bin/cc"])
+        self.assertEqual(strace_data.get_failed_lookups(), {"/src" : 1})
+
+        syscalls = list(straceparse.read_syscalls(iter(TIMED)))
+        self.assertEqual(syscalls[-1].duration, 0.5)
+        self.assertEqual(syscalls[-1].time, 104.0)
+
+    def test_no_times(self):
+        """Strace output without times has no syscall times"""
+        strace_data = straceparse.StraceOutput(strace_text(COMPILE))
+        self.assertEqual(strace_data.get_syscall_times(), None)
+        self.assertEqual(strace_data.get_file_times(), None)
+
+    def test_uncovered_time(self):
+        """The time of a wait that no child covers"""
+        self.assertEqual(straceparse.uncovered_time(0.0, 10.0, []), 10.0)
+        self.assertEqual(straceparse.uncovered_time(0.0, 10.0,
+            [[2.0, 4.0], [3.0, 5.0], [8.0, 12.0], [-1.0, 1.0]]), 4.0)
+        self.assertEqual(straceparse.uncovered_time(0.0, 10.0,
+            [[1.0, 9.0], [2.0, 3.0]]), 2.0)
+        self.assertEqual(straceparse.uncovered_time(0.0, 10.0,
+            [[-5.0, 20.0]]), 0.0)
+        self.assertEqual(straceparse.uncovered_time(0.0, 10.0,
+            [[10.0, 20.0], [-5.0, 0.0]]), 10.0)
+
+    def timed_records(self):
+        """Returns the record of TIMED, from the strace text, and from
+        the parsed audit data."""
+        raw = Record("100", "/src", ["cc", "-c", "a.c"], "cc",
+                [4.0, 2.0, 10.0, 6.0]).Audit(
+                        (CMD_FILE, strace_text(TIMED)), TIMED_AUDIT_OPTIONS)
+        audit_data = (CMD_FILE,) + audit_strace.compact_file_lists(
+                audit_strace.parse_strace(strace_text(TIMED), CMD_FILE))
+        parsed = Record("100", "/src", ["cc", "-c", "a.c"], "cc",
+                [4.0, 2.0, 10.0, 6.0]).Audit(audit_data, TIMED_AUDIT_OPTIONS)
+        return (raw, parsed, audit_data)
+
+    def test_parsed_times(self):
+        """The parsed audit data has the times of the strace log, and
+        the audit data of older logs still reads"""
+        (raw, parsed, audit_data) = self.timed_records()
+        self.assertEqual(raw.syscall_times, TIMED_SYSCALL_TIMES)
+        self.assertEqual(raw.file_times, TIMED_FILE_TIMES)
+        self.assertEqual(raw.stated_files, [])
+        self.assertEqual(parsed.AuditFields(), raw.AuditFields())
+
+        # Before the stat()ed, access()ed and unlinked files were kept
+        older = Record("100", "/src", [], "cc").Audit(audit_data[:8],
+                TIMED_AUDIT_OPTIONS)
+        self.assertEqual(older.syscall_times, TIMED_SYSCALL_TIMES)
+        self.assertEqual(older.file_times, TIMED_FILE_TIMES)
+        self.assertEqual(older.failed_lookups, raw.failed_lookups)
+        self.assertEqual(older.stated_files, None)
+
+        # Logs from before the times option have one less option.
+        older = Record("100", "/src", [], "cc").Audit(audit_data,
+                AUDIT_OPTIONS.rsplit("|", 1)[0])
+        self.assertEqual(older.AuditFields(), raw.AuditFields())
+
+    def test_iotime_report(self):
+        """The iotime report splits a tool's real time"""
+        (raw, parsed, audit_data) = self.timed_records()
+        file_time = TIMED_SYSCALL_TIMES["file"]
+        spawn_time = TIMED_SYSCALL_TIMES["spawn"]
+
+        # All of the system time is in the system calls.
+        self.assertEqual(report_iotime.job_times(parsed),
+                [10.0, 4.0, file_time, spawn_time,
+                    10.0 - 4.0 - file_time - spawn_time, 1])
+
+        consumer = report_iotime.IOTime(report_iotime.DEFAULT_TOP)
+        consumer.record(parsed)
+        consumer.record(Record("101", "/src", ["true"], "true",
+            [0.0, 0.0, 1.0, 0.0]).Audit(
+                (CMD_FILE, strace_text(COMPILE)), TIMED_AUDIT_OPTIONS))
+        output = printed(consumer.finish)
+
+        self.assertTrue("Jobs with syscall times: 1, of 2 audited jobs"
+                in output, output)
+        self.assertTrue("%6d %5.1f%% %5.1f%% %5.1f%% %5.1f%%  %-6s %s" % (
+            1, 40.0, file_time * 10, spawn_time * 10,
+            100.0 - 40.0 - (file_time + spawn_time) * 10, "cpu", "cc")
+            in output, output)
+
+        # The files, the most I/O time first
+        lines = output.splitlines()
+        i = lines.index("%12s %6s  %s" % ("FILE I/O", "JOBS", "FILE"))
+        self.assertEqual([line.split()[-1] for line in lines[i + 1:]],
+                ["/src/a.c", "/src/d.h", "/src/b.h", "/src/c.h"])
+
+    def test_iotime_no_times(self):
+        """The iotime report of jobs without times"""
+        consumer = report_iotime.IOTime(report_iotime.DEFAULT_TOP)
+        consumer.record(Record("100", "/src", COMPILE_ARGS, "cc").Audit(
+            (CMD_FILE, strace_text(COMPILE))))
+        self.assertTrue(printed(consumer.finish).startswith(
+            "No jobs have syscall times"))
@@ -0,0 +1,67 @@
+# Copyright (c) 2012 by Cisco Systems, Inc.
+
+import unittest
+
+from utlib import base
+
+from instmakelib import instmake_log
+
+class stringtableTests(unittest.TestCase, base.TestBase):
+    """
+    Test that the records of a log share their repeated strings.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        """Set up the workspace and reference build for this test suite"""
+        cls.create_workspace("simple")
+        cls.imlog, cls.makelog = cls.setup_run_instmake_build()
+
+    def check_shared(self, records):
+        """Records with equal strings have the same string objects"""
+        self.assertTrue(len(records) > 1)
+        for name in instmake_log.INTERNED_ATTRIBUTES:
+            strings = {}
+            for rec in records:
+                value = getattr(rec, name)
+                if value == None:
+                    continue
+                first = strings.setdefault(value, value)
+                self.assertTrue(value is first, (name, value))
+
+                # The value is the one in the log's string table.
+                self.assertTrue(rec._strings[value] is value, (name, value))
+
+        # All the jobs ran in the build directory.
+        cwds = [rec.cwd for rec in records if rec.ppid != None]
+        self.assertTrue(len(cwds) > 1)
+        for cwd in cwds:
+            self.assertTrue(cwd is cwds[0], cwd)
+
+    def test_shared(self):
+        """The records share their strings"""
+        self.check_shared(self.read_instmake_records(self.imlog))
+
+    def test_decode_jobs(self):
+        """Records decoded by a pool of processes share their strings"""
+        instmake_log.SetDecodeJobs(2)
+        try:
+            records = self.read_instmake_records(self.imlog)
+        finally:
+            instmake_log.SetDecodeJobs(1)
+        self.check_shared(records)
+
+    def test_compact_records(self):
+        """CompactRecords share the strings of the log's string table"""
+        records = self.read_instmake_records(self.imlog)
+        crecs = [instmake_log.CompactRecord(rec) for rec in records]
+        for (rec, crec) in zip(records, crecs):
+            for name in ("cwd", "makefile_filename", "tool"):
+                value = getattr(crec, name)
+                if value != None:
+                    self.assertTrue(rec._strings[value] is value,
+                            (name, value))
+        cwds = [crec.cwd for crec in crecs if crec.ppid != None]
+        self.assertTrue(len(cwds) > 1)
+        for cwd in cwds:
+            self.assertTrue(cwd is cwds[0], cwd)
@@ -0,0 +1,138 @@
+# Copyright (c) 2012 by Cisco Systems, Inc.
+
+import random
+import unittest
+
+from instmakelib import instmake_cli
+from instmakelib import instmake_toolnames
+
+# Command-lines that the toolname plugins rewrite, with words that
+# the answer does or does not depend on.
+COMMAND_LINES = [
+    # canonical: the answer depends on the cwd
+    "./configure --prefix=/usr",
+    "../bin/cc -c a.c",
+    "../../tools/gen.sh out.h",
+    # libtool: the answer depends on the words up to the tool
+    "libtool --mode=compile gcc -c a.c",
+    "libtool --mode=compile gcc -c b.c",
+    "libtool --mode=link --mode=install cp a b",
+    "/usr/bin/libtool --mode=compile ./cc -c a.c",
+    "libtool",
+    # perl: the answer depends on the words up to the script
+    "perl gen.pl a.h",
+    "perl gen.pl b.h",
+    "perl -w gen.pl a.h",
+    "perl -w -- gen.pl",
+    "perl -e 'print 1'",
+    "perl -ne 'print' a.txt",
+    "/usr/bin/perl5 ../scripts/gen.pl a.h",
+    "perl",
+    # envvars: the answer depends on the words up to the tool
+    "CC=gcc make all",
+    "CC=gcc make clean",
+    "A=1 B=2 ./run.sh x",
+    "A=1 export B ./run.sh y",
+    "A=1 ; gcc -c a.c",
+    "A=1 B=2",
+    "A='x y' perl gen.pl",
+    "LIBTOOL=1 libtool --mode=compile ../bin/cc -c a.c",
+    # no plugin
+    "gcc -c a.c",
+    "gcc -c b.c",
+    "/bin/sh -c 'cd x && make'",
+]
+
+CWDS = [ "/src", "/src/lib", "/src/lib/sub", "/build", None ]
+
+def random_command_lines(rand, num):
+    """Returns command-lines made of the words of COMMAND_LINES."""
+    words = " ".join(COMMAND_LINES).split()
+    prefixes = [ "", "CC=gcc", "A=1 B=2", "perl", "perl -w", "libtool",
+        "libtool --mode=compile", "./", "../" ]
+    cmdlines = []
+    for i in range(num):
+        prefix = rand.choice(prefixes)
+        rest = [rand.choice(words) for j in range(rand.randint(1, 5))]
+        if prefix.endswith("/"):
+            cmdlines.append(prefix + " ".join(rest))
+        else:
+            cmdlines.append(" ".join([prefix] + rest).strip())
+    return cmdlines
+
+class toolnamesTests(unittest.TestCase):
+    """
+    Test that the cache of ToolNameManager.GetTool gives the same
+    answers as the toolname plugins.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.plugins = instmake_cli.start_plugin_manager([])
+
+    def manager(self, cache_size):
+        return instmake_toolnames.ToolNameManager(self.plugins,
+                cache_size=cache_size)
+
+    def check_same_tools(self, manager, jobs):
+        uncached = self.manager(0)
+        for (cmdline, cwd) in jobs:
+            # A job's command-line is one string in the log.
+            self.assertEqual(manager.GetTool([cmdline], cwd),
+                    uncached.GetTool([cmdline], cwd), (cmdline, cwd))
+
+    def test_plugins(self):
+        """The plugins that declare their inputs are loaded"""
+        manager = self.manager(0)
+        self.assertEqual(manager.GetTool(["CC=gcc make all"], "/src"),
+                "make")
+        self.assertEqual(manager.GetTool(["perl -w gen.pl a.h"], "/src"),
+                "gen.pl")
+        self.assertEqual(manager.GetTool(
+            ["libtool --mode=compile gcc -c a.c"], "/src"), "gcc")
+        self.assertEqual(manager.GetTool(["../bin/cc -c a.c"], "/src/lib"),
+                "/src/bin/cc")
+
+    def test_same_tools(self):
+        """Command-lines that differ in the cwd, or after the words
+        that the plugins look at, get the right tool"""
+        jobs = [(cmdline, cwd) for cmdline in COMMAND_LINES
+                for cwd in CWDS]
+        manager = self.manager(instmake_toolnames.DEFAULT_CACHE_SIZE)
+
+        # Twice, so that the second time comes from the cache.
+        self.check_same_tools(manager, jobs)
+        self.check_same_tools(manager, jobs)
+        (hits, misses) = manager.CacheStats()
+        self.assertTrue(hits >= len(jobs), (hits, misses))
+
+    def test_random(self):
+        """Random command-lines get the same tools"""
+        rand = random.Random(1)
+        cmdlines = random_command_lines(rand, 2000)
+        jobs = [(rand.choice(cmdlines), rand.choice(CWDS))
+                for i in range(10000)]
+        self.check_same_tools(self.manager(
+            instmake_toolnames.DEFAULT_CACHE_SIZE), jobs)
+
+    def test_prune(self):
+        """Pruning the cache doesn't change the tools"""
+        rand = random.Random(2)
+        cmdlines = random_command_lines(rand, 200) + COMMAND_LINES
+        jobs = [(rand.choice(cmdlines), rand.choice(CWDS))
+                for i in range(5000)]
+
+        # A small cache is pruned all the time.
+        manager = self.manager(7)
+        self.check_same_tools(manager, jobs)
+        self.assertTrue(len(manager.cache) <= 7, len(manager.cache))
+        (hits, misses) = manager.CacheStats()
+        self.assertTrue(hits > 0, (hits, misses))
+
+        # Pruning a full cache keeps the answers of the rest.
+        manager = self.manager(instmake_toolnames.DEFAULT_CACHE_SIZE)
+        self.check_same_tools(manager, jobs)
+        num_cached = len(manager.cache)
+        manager._CachePrune()
+        self.assertEqual(len(manager.cache), num_cached - num_cached / 4)
+        self.check_same_tools(manager, jobs)
@@ -0,0 +1,36 @@
+# Copyright (c) 2012 by Cisco Systems, Inc.
+
+import sys
+import unittest
+
+from utlib import base
+from utlib import util
+
+# Modules that a job's instmake must not import, as they take longer
+# to import than a small job takes to run.
+SLOW_MODULES = [ "tempfile", "json", "socket", "random", "hashlib",
+    "instmakelib.instmake_log" ]
+
+class wrapperTests(unittest.TestCase, base.TestBase):
+    """
+    Test the cost of the instmake that make runs for each job.
+    """
+
+    def test_imports(self):
+        """The child instmake imports only what it needs"""
+        code = "import sys; from instmakelib import instmake_build; " \
+                "print ' '.join(sys.modules.keys())"
+        (retval, output) = util.exec_cmdv([sys.executable, "-c", code])
+        self.assertEqual(retval, util.SUCCESS, output)
+
+        modules = output.split()
+        for name in SLOW_MODULES:
+            self.assertFalse(name in modules, name)
+
+    def test_bench_wrapper(self):
+        """--bench-wrapper measures the jobs"""
+        (retval, output) = util.exec_cmdv([base.INSTMAKE,
+            "--bench-wrapper", "5"])
+        self.assertEqual(retval, util.SUCCESS, output)
+        self.assertTrue("Added by instmake" in output, output)
+        self.assertTrue("startup" in output, output)